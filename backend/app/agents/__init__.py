@@ -1,6 +1,6 @@
 """
 Initialize agents module
 """
-from . import llm_config, tools, resource_agent
+from . import llm_config, tools, tool_log, tool_memo, executor, intent_router, resource_agent
 
-__all__ = ['llm_config', 'tools', 'resource_agent']
+__all__ = ['llm_config', 'tools', 'tool_log', 'tool_memo', 'executor', 'intent_router', 'resource_agent']
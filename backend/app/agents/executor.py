@@ -0,0 +1,112 @@
+"""
+Agent executor that runs the tool calls of one agent step concurrently
+When the model asks for several tools at once (e.g. check_eligibility for
+three services plus get_service_details), the step costs the slowest call
+rather than the sum of all of them
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.tools import BaseTool
+from app.agents.tool_memo import current_run
+from app.config import settings
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pool and semaphore of the agent step in progress; each step gets its own,
+# so AGENT_TOOL_CONCURRENCY bounds one step's fan-out, not other conversations
+_step_pool: contextvars.ContextVar[Optional[ThreadPoolExecutor]] = contextvars.ContextVar(
+    "agent_step_pool", default=None
+)
+_step_semaphore: contextvars.ContextVar[Optional[asyncio.Semaphore]] = contextvars.ContextVar(
+    "agent_step_semaphore", default=None
+)
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor whose sync runs dispatch a step's tool calls to a thread
+    pool of their own, and whose async runs cap the calls gathered at once.
+
+    Results are handed back to the model in the order the calls were made.
+    Each call runs in a copy of the caller's context, so callbacks and
+    per-run context variables behave as in a sequential run.
+    AGENT_TOOL_CONCURRENCY bounds the calls in flight within one step; with
+    it at 1 a step's tool calls run one at a time.
+
+    A run whose tool memo (see tool_memo) detects a loop stops before the
+    next iteration.
+    """
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        """Also stop when the run's tool memo has seen the same call repeated"""
+        memo = current_run()
+        if memo is not None and memo.loop_detected:
+            if self.max_iterations is not None:
+                memo.iterations_saved = max(self.max_iterations - iterations, 0)
+            return False
+        return super()._should_continue(iterations, time_elapsed)
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Union[AgentStep, "Future[AgentStep]"]:
+        """Start the tool call in the step's pool; _iter_next_step waits for it"""
+        pool = _step_pool.get()
+        if pool is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        context = contextvars.copy_context()
+        return pool.submit(
+            context.run,
+            super()._perform_agent_action,
+            name_to_tool_map,
+            color_mapping,
+            agent_action,
+            run_manager
+        )
+
+    def _iter_next_step(self, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        if settings.AGENT_TOOL_CONCURRENCY <= 1:
+            yield from super()._iter_next_step(*args, **kwargs)
+            return
+        # Threads start on first use, so a single-tool step costs one thread
+        with ThreadPoolExecutor(max_workers=settings.AGENT_TOOL_CONCURRENCY, thread_name_prefix="agent-tool") as pool:
+            token = _step_pool.set(pool)
+            try:
+                # Draining the step first starts every tool call before waiting on any
+                items = list(super()._iter_next_step(*args, **kwargs))
+            finally:
+                _step_pool.reset(token)
+            items = [item.result() if isinstance(item, Future) else item for item in items]
+        yield from items
+
+    async def _aiter_next_step(self, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        token = _step_semaphore.set(asyncio.Semaphore(max(settings.AGENT_TOOL_CONCURRENCY, 1)))
+        try:
+            async for item in super()._aiter_next_step(*args, **kwargs):
+                yield item
+        finally:
+            _step_semaphore.reset(token)
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        # AgentExecutor already gathers a step's async tool calls; this bounds them
+        semaphore = _step_semaphore.get()
+        if semaphore is None:
+            return await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        async with semaphore:
+            return await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
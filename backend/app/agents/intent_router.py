@@ -0,0 +1,555 @@
+"""
+Deterministic fast path for simple "category + place" lookups
+Messages like "food bank in Secunderabad" are classified from keywords and
+the catalog's own place names, answered with one search_resources call and
+a templated reply, and never reach the LLM. Anything less clear-cut falls
+back to the agent
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from collections import Counter
+from langchain_core.agents import AgentAction
+from app.agents.tools import search_resources
+from app.agents.tool_log import ToolTimingHandler
+from app.geo.distance import haversine_miles
+from app.geo.locations import get_location_index
+from app.db.catalog_snapshot import catalog_snapshot
+from app.db.database import SessionLocal
+from app.db.models import SocialService
+from app.search.trigram import PLACE, get_trigram_index
+from app.config import settings
+import asyncio
+import math
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keywords per category (English, Hindi, Telugu); multi-word phrases win
+# over their parts, so "mental health" is not also "health"
+CATEGORY_KEYWORDS = {
+    "shelter": [
+        "shelter", "shelters", "homeless", "housing", "night shelter", "place to stay", "place to sleep",
+        "आश्रय", "रैन बसेरा", "ఆశ్రయం", "వసతి",
+    ],
+    "food": [
+        "food", "meal", "meals", "hungry", "food bank", "groceries", "ration", "free food",
+        "खाना", "भोजन", "राशन", "ఆహారం", "భోజనం",
+    ],
+    "health": [
+        "health", "clinic", "clinics", "doctor", "hospital", "medical", "medicine",
+        "अस्पताल", "डॉक्टर", "स्वास्थ्य", "ఆసుపత్రి", "వైద్యుడు", "ఆరోగ్యం",
+    ],
+    "employment": [
+        "job", "jobs", "employment", "work", "career", "job training",
+        "नौकरी", "रोज़गार", "ఉద్యోగం", "ఉపాధి",
+    ],
+    "mental_health": [
+        "mental health", "counseling", "counselling", "counselor", "therapy", "therapist", "depression", "anxiety",
+        "मानसिक स्वास्थ्य", "మానసిక ఆరోగ్యం",
+    ],
+    "legal": [
+        "legal", "legal aid", "lawyer", "advocate", "court",
+        "वकील", "कानूनी सहायता", "న్యాయవాది", "న్యాయ సహాయం",
+    ],
+    "substance_abuse": [
+        "rehab", "addiction", "de addiction", "alcohol", "drugs",
+        "नशा मुक्ति", "వ్యసనం",
+    ],
+    "youth": [
+        "youth", "teen", "teens", "teenager", "teenagers", "adolescent",
+        "युवा", "యువత",
+    ],
+}
+
+# Specific categories whose keywords overlap a broader one ("mental health
+# clinic"); when both match, the specific one wins
+CATEGORY_PARENTS = {"mental_health": "health", "substance_abuse": "health"}
+
+# Urgent lookups are still answered, with a line about calling ahead
+URGENT_TERMS = [
+    "urgent", "urgently", "now", "right now", "tonight", "today", "asap", "immediately",
+    "अभी", "आज रात", "తక్షణం", "ఈ రాత్రి",
+]
+
+# Crisis messages always go to the agent, which prioritizes safety
+CRISIS_TERMS = [
+    "suicide", "suicidal", "kill myself", "end my life", "self harm", "overdose",
+    "abuse", "abused", "violence", "beaten", "assault", "emergency",
+    "आत्महत्या", "हिंसा", "ఆత్మహత్య", "హింస",
+]
+
+# Anything beyond finding services needs the agent's tools and judgment
+COMPLEX_TERMS = [
+    "eligible", "eligibility", "qualify", "appointment", "book", "schedule", "apply",
+    "documents", "compare", "difference", "verify", "why",
+    "open", "opening", "hours", "timings", "when", "cost", "costs", "price", "fee", "fees",
+    "how", "allow", "allows", "allowed",
+    "पात्रता", "अपॉइंटमेंट", "అర్హత", "అపాయింట్మెంట్",
+]
+
+# Words that connect a category to a place; they are ignored when finding
+# places, and a routed message may contain nothing else
+STOPWORDS = {
+    "i", "me", "my", "we", "us", "need", "want", "looking", "for", "find", "a", "an", "the", "some", "any",
+    "in", "at", "near", "nearby", "around", "close", "to", "of", "please", "help", "with", "is", "are", "there",
+    "where", "can", "get", "show", "list", "free", "services", "service", "centre", "center", "places",
+    "में", "के", "पास", "चाहिए", "मुझे", "లో", "దగ్గర", "కావాలి", "నాకు",
+}
+
+# Named places beyond this many words are not tried
+MAX_PLACE_WORDS = 3
+
+# Minimum trigram score for a misspelled place name; one wrong vowel in a
+# short locality name ("Begampet" for Begumpet) scores about 0.58
+PLACE_MATCH_SCORE = 0.5
+
+# Search radius bounds around a named city's centroid, in miles
+MIN_CITY_RADIUS = 5.0
+MAX_CITY_RADIUS = 25.0
+
+# Results listed in a routed answer
+MAX_RESULTS = 5
+
+CATEGORY_LABELS = {
+    "en": {
+        "shelter": "shelter", "food": "food", "health": "health", "employment": "employment",
+        "mental_health": "mental health", "legal": "legal aid", "substance_abuse": "addiction recovery",
+        "youth": "youth",
+    },
+    "hi": {
+        "shelter": "आश्रय", "food": "भोजन", "health": "स्वास्थ्य", "employment": "रोज़गार",
+        "mental_health": "मानसिक स्वास्थ्य", "legal": "कानूनी सहायता", "substance_abuse": "नशा मुक्ति",
+        "youth": "युवा",
+    },
+    "te": {
+        "shelter": "ఆశ్రయ", "food": "ఆహార", "health": "ఆరోగ్య", "employment": "ఉపాధి",
+        "mental_health": "మానసిక ఆరోగ్య", "legal": "న్యాయ సహాయ", "substance_abuse": "వ్యసన విముక్తి",
+        "youth": "యువజన",
+    },
+}
+
+TEMPLATES = {
+    "en": {
+        "header": "Here are the nearest {category} services to {place}:",
+        "your_location": "you",
+        "distance": "{distance} mi",
+        "urgent": "If you need help today, call before you go so they can confirm there is space for you.",
+        "footer": "Please call ahead to confirm hours. I can also check eligibility or help you book an appointment.",
+    },
+    "hi": {
+        "header": "{place} के पास की {category} सेवाएँ:",
+        "your_location": "आपके स्थान",
+        "distance": "{distance} मील",
+        "urgent": "अगर आपको आज ही मदद चाहिए, तो जाने से पहले फ़ोन करके जगह की पुष्टि कर लें।",
+        "footer": "कृपया जाने से पहले फ़ोन करके समय की पुष्टि करें। मैं पात्रता जाँचने या अपॉइंटमेंट बुक करने में भी मदद कर सकता हूँ।",
+    },
+    "te": {
+        "header": "{place} సమీపంలోని {category} సేవలు:",
+        "your_location": "మీ ప్రదేశం",
+        "distance": "{distance} మైళ్ళు",
+        "urgent": "మీకు ఈరోజే సహాయం కావాలంటే, వెళ్ళే ముందు ఫోన్ చేసి స్థలం ఉందో లేదో నిర్ధారించుకోండి.",
+        "footer": "దయచేసి వెళ్ళే ముందు ఫోన్ చేసి సమయాలను నిర్ధారించుకోండి. అర్హత తనిఖీ లేదా అపాయింట్‌మెంట్ బుకింగ్‌లో కూడా నేను సహాయం చేయగలను.",
+    },
+}
+
+
+class Intent(NamedTuple):
+    """A lookup the router can answer on its own"""
+    category: str
+    place: Optional[str]  # City named in the message or context; None for the user's coordinates
+    latitude: float
+    longitude: float
+    radius_miles: float
+    urgent: bool
+    language: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words, keeping Indic vowel signs attached to their letters"""
+    return re.findall(r"(?:[^\W_]|[\u0900-\u0963\u0966-\u0d7f])+", text.lower())
+
+
+def _phrases(values: List[str]) -> List[Tuple[str, ...]]:
+    return sorted({tuple(tokenize(value)) for value in values}, key=len, reverse=True)
+
+
+_CATEGORY_PHRASES = [
+    (phrase, category)
+    for category, keywords in CATEGORY_KEYWORDS.items()
+    for phrase in _phrases(keywords)
+]
+_CATEGORY_PHRASES.sort(key=lambda item: len(item[0]), reverse=True)
+_URGENT_PHRASES = _phrases(URGENT_TERMS)
+_CRISIS_PHRASES = _phrases(CRISIS_TERMS)
+_COMPLEX_PHRASES = _phrases(COMPLEX_TERMS)
+
+
+def _positions(tokens: List[str], phrases: List[Tuple[str, ...]]) -> set:
+    """Positions of the tokens that form any of the phrases"""
+    positions = set()
+    for phrase in phrases:
+        size = len(phrase)
+        for start in range(len(tokens) - size + 1):
+            if tuple(tokens[start:start + size]) == phrase:
+                positions.update(range(start, start + size))
+    return positions
+
+
+def _contains(tokens: List[str], phrases: List[Tuple[str, ...]]) -> bool:
+    return bool(_positions(tokens, phrases))
+
+
+def match_categories(tokens: List[str]) -> Tuple[set, set]:
+    """
+    Categories named in a message.
+
+    Returns:
+        (categories, positions of the tokens that named them)
+    """
+    categories = set()
+    used = set()
+    for phrase, category in _CATEGORY_PHRASES:
+        size = len(phrase)
+        for start in range(len(tokens) - size + 1):
+            span = range(start, start + size)
+            if tuple(tokens[start:start + size]) == phrase and not used.intersection(span):
+                categories.add(category)
+                used.update(span)
+    for category, parent in CATEGORY_PARENTS.items():
+        if category in categories:
+            categories.discard(parent)
+    return categories, used
+
+
+def detect_language(text: str, user_context: Optional[Dict[str, Any]] = None) -> str:
+    """Reply language from the user's preference, else from the message's script"""
+    preferred = ((user_context or {}).get("language") or "").strip().lower()
+    for language, names in (("hi", ("hi", "hindi")), ("te", ("te", "telugu")), ("en", ("en", "english"))):
+        if preferred.startswith(names):
+            return language
+    if re.search(r"[\u0c00-\u0c7f]", text):
+        return "te"
+    if re.search(r"[\u0900-\u097f]", text):
+        return "hi"
+    return "en"
+
+
+def _city_radius(summary: Dict[str, Any]) -> float:
+    box = summary["bounding_box"]
+    extent = max(
+        haversine_miles(summary["latitude"], summary["longitude"], box[lat], box[lon])
+        for lat in ("min_latitude", "max_latitude")
+        for lon in ("min_longitude", "max_longitude")
+    )
+    return min(max(extent, MIN_CITY_RADIUS), MAX_CITY_RADIUS)
+
+
+def _locality_summary(name: str) -> Optional[Dict[str, Any]]:
+    """Centroid and extent of the services in a locality that is not a city (e.g. a neighborhood)"""
+    service_ids = get_trigram_index().place_services(name)
+    if not service_ids:
+        return None
+    snapshot = catalog_snapshot()
+    if snapshot is not None:
+        positions = [snapshot.position(service_id) for service_id in service_ids]
+        positions = [position for position in positions if position is not None]
+        points = list(zip(snapshot.latitudes[positions].tolist(), snapshot.longitudes[positions].tolist()))
+    else:
+        db = SessionLocal()
+        try:
+            points = (
+                db.query(SocialService.latitude, SocialService.longitude)
+                .filter(SocialService.id.in_(service_ids))
+                .all()
+            )
+        finally:
+            db.close()
+    points = [(lat, lon) for lat, lon in points if lat and lon and not math.isnan(lat) and not math.isnan(lon)]
+    if not points:
+        return None
+    lats = [lat for lat, _ in points]
+    lons = [lon for _, lon in points]
+    return {
+        "city": name,
+        "latitude": round(sum(lats) / len(lats), 6),
+        "longitude": round(sum(lons) / len(lons), 6),
+        "bounding_box": {
+            "min_latitude": min(lats),
+            "max_latitude": max(lats),
+            "min_longitude": min(lons),
+            "max_longitude": max(lons),
+        },
+    }
+
+
+def resolve_place(tokens: List[str], skip: set) -> Tuple[Optional[Dict[str, Any]], set]:
+    """
+    Place named in a message, longest span first.
+
+    Exact city names are looked up directly; otherwise the span is matched
+    against the catalog's place names (cities and localities), which also
+    tolerates misspellings.
+
+    Returns:
+        (summary with the place name as "city", its centroid and bounding
+        box, positions of the tokens that named it); (None, empty set) when
+        no place is found
+    """
+    index = get_location_index()
+    spans = []
+    for size in range(MAX_PLACE_WORDS, 0, -1):
+        for start in range(len(tokens) - size + 1):
+            span = range(start, start + size)
+            words = tokens[start:start + size]
+            if skip.intersection(span) or words[0] in STOPWORDS or words[-1] in STOPWORDS:
+                continue
+            spans.append((" ".join(words), set(span)))
+
+    for name, positions in spans:
+        summary = index.lookup(name)
+        if summary:
+            return summary, positions
+
+    trigram_index = get_trigram_index()
+    for name, positions in spans:
+        if len(name) < 4:
+            continue
+        for match in trigram_index.search(name, kind=PLACE, limit=3):
+            if match["score"] < PLACE_MATCH_SCORE:
+                break
+            summary = index.lookup(match["name"]) or _locality_summary(match["name"])
+            if summary:
+                return summary, positions
+    return None, set()
+
+
+def classify(
+    user_message: str,
+    user_context: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[Intent], str]:
+    """
+    Decide whether a message is a simple lookup.
+
+    Returns:
+        (intent, reason); intent is None when the agent should answer, with
+        reason saying why, e.g. "crisis" or "no_location"
+    """
+    tokens = tokenize(user_message)
+    if not tokens:
+        return None, "empty"
+    if len(tokens) > settings.INTENT_ROUTER_MAX_WORDS:
+        return None, "too_long"
+    if _contains(tokens, _CRISIS_PHRASES):
+        return None, "crisis"
+    if _contains(tokens, _COMPLEX_PHRASES):
+        return None, "complex"
+
+    categories, used = match_categories(tokens)
+    if not categories:
+        return None, "no_category"
+    if len(categories) > 1:
+        return None, "ambiguous_category"
+    category = categories.pop()
+
+    context = user_context or {}
+    summary, place_positions = resolve_place(tokens, used)
+    if summary is None and context.get("location"):
+        summary = get_location_index().lookup(context["location"])
+
+    if summary is not None:
+        place = summary["city"]
+        latitude, longitude = summary["latitude"], summary["longitude"]
+        radius = _city_radius(summary)
+    elif context.get("latitude") is not None and context.get("longitude") is not None:
+        place = None
+        latitude, longitude = context["latitude"], context["longitude"]
+        radius = MIN_CITY_RADIUS
+    else:
+        return None, "no_location"
+
+    # Route only when every word is accounted for; anything else (a question
+    # about hours, cost, pets, a story) needs the agent
+    urgent_positions = _positions(tokens, _URGENT_PHRASES)
+    covered = used | place_positions | urgent_positions
+    covered.update(position for position, token in enumerate(tokens) if token in STOPWORDS)
+    if len(covered) < len(tokens):
+        return None, "unrecognized"
+
+    return Intent(
+        category=category,
+        place=place,
+        latitude=latitude,
+        longitude=longitude,
+        radius_miles=radius,
+        urgent=bool(urgent_positions),
+        language=detect_language(user_message, context),
+    ), "routed"
+
+
+def render(intent: Intent, results: List[Dict[str, Any]]) -> str:
+    """Templated answer listing the services found, in the intent's language"""
+    template = TEMPLATES[intent.language]
+    lines = [template["header"].format(
+        category=CATEGORY_LABELS[intent.language].get(intent.category, intent.category),
+        place=intent.place or template["your_location"]
+    ), ""]
+    for number, result in enumerate(results, 1):
+        details = [part for part in (result.get("address"), result.get("phone")) if part]
+        if result.get("distance_miles") is not None:
+            details.append(template["distance"].format(distance=result["distance_miles"]))
+        lines.append(f"{number}. {result['name']}" + (f" - {' | '.join(details)}" if details else ""))
+    lines.append("")
+    if intent.urgent:
+        lines.append(template["urgent"])
+    lines.append(template["footer"])
+    return "\n".join(lines)
+
+
+class IntentRouter:
+    """
+    Answers simple lookups directly and keeps traffic and latency stats.
+
+    The agent reports its own latency through record_agent, so stats can
+    estimate the time saved by each routed message.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.routed = 0
+        self.routed_ms = 0.0
+        self.agent_runs = 0
+        self.agent_ms = 0.0
+        self.fallbacks: Counter = Counter()
+
+    def _plan(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]],
+        user_context: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple[Intent, Dict[str, Any]]]:
+        """Intent and search_resources arguments, or None to use the agent"""
+        if not settings.INTENT_ROUTER_ENABLED:
+            return None
+        if chat_history:
+            # Follow-ups depend on the conversation
+            intent, reason = None, "history"
+        else:
+            try:
+                intent, reason = classify(user_message, user_context)
+            except Exception as e:
+                logger.error(f"Error classifying message intent: {e}")
+                intent, reason = None, "error"
+        if intent is None:
+            self._fallback(reason)
+            return None
+        return intent, {
+            "category": intent.category,
+            "latitude": intent.latitude,
+            "longitude": intent.longitude,
+            "radius_miles": intent.radius_miles,
+        }
+
+    def _answer(
+        self,
+        intent: Intent,
+        tool_input: Dict[str, Any],
+        results: Any,
+        started: float
+    ) -> Optional[Tuple[str, List[tuple]]]:
+        if not results:
+            self._fallback("no_results")
+            return None
+        message = render(intent, results[:MAX_RESULTS])
+        with self._lock:
+            self.total += 1
+            self.routed += 1
+            self.routed_ms += (time.perf_counter() - started) * 1000
+        action = AgentAction(tool=search_resources.name, tool_input=tool_input, log="intent_router")
+        return message, [(action, results)]
+
+    def _fallback(self, reason: str):
+        with self._lock:
+            self.total += 1
+            self.fallbacks[reason] += 1
+
+    def route(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_context: Optional[Dict[str, Any]] = None,
+        timing: Optional[ToolTimingHandler] = None
+    ) -> Optional[Tuple[str, List[tuple]]]:
+        """
+        Answer a message without the agent if it is a simple lookup.
+
+        Args:
+            user_message: The user's input message
+            chat_history: Previous messages; follow-ups always go to the agent
+            user_context: User context (location, coordinates, language)
+            timing: Optional handler that times the tool call
+
+        Returns:
+            (message, intermediate steps) or None to fall back to the agent
+        """
+        started = time.perf_counter()
+        plan = self._plan(user_message, chat_history, user_context)
+        if plan is None:
+            return None
+        intent, tool_input = plan
+        results = search_resources.invoke(tool_input, config={"callbacks": [timing] if timing else []})
+        return self._answer(intent, tool_input, results, started)
+
+    async def aroute(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_context: Optional[Dict[str, Any]] = None,
+        timing: Optional[ToolTimingHandler] = None
+    ) -> Optional[Tuple[str, List[tuple]]]:
+        """Async variant of route"""
+        started = time.perf_counter()
+        # Place resolution may query the database, so keep it off the event loop
+        plan = await asyncio.to_thread(self._plan, user_message, chat_history, user_context)
+        if plan is None:
+            return None
+        intent, tool_input = plan
+        results = await search_resources.ainvoke(tool_input, config={"callbacks": [timing] if timing else []})
+        return self._answer(intent, tool_input, results, started)
+
+    def record_agent(self, duration_ms: float):
+        """Latency of one message answered by the agent"""
+        with self._lock:
+            self.agent_runs += 1
+            self.agent_ms += duration_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_routed = self.routed_ms / self.routed if self.routed else 0.0
+            avg_agent = self.agent_ms / self.agent_runs if self.agent_runs else 0.0
+            return {
+                "enabled": settings.INTENT_ROUTER_ENABLED,
+                "messages": self.total,
+                "routed": self.routed,
+                "routed_share": round(self.routed / self.total, 4) if self.total else 0.0,
+                "fallbacks": dict(self.fallbacks.most_common()),
+                "avg_routed_ms": round(avg_routed, 2),
+                "avg_agent_ms": round(avg_agent, 2),
+                # Agent time the routed messages would have taken, less the router's own time
+                "estimated_saved_ms": round(max(avg_agent - avg_routed, 0.0) * self.routed, 1),
+            }
+
+
+# Global router instance
+_intent_router_instance = None
+
+
+def get_intent_router() -> IntentRouter:
+    """Get or create the global intent router"""
+    global _intent_router_instance
+    if _intent_router_instance is None:
+        _intent_router_instance = IntentRouter()
+    return _intent_router_instance
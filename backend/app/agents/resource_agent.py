@@ -3,19 +3,33 @@ LangChain AI Agent for resource navigation
 Handles multi-turn conversations with tool integration
 """
 
-from typing import List, Dict, Any, Optional
-from langchain.agents import create_tool_calling_agent, AgentExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from langchain.agents import create_tool_calling_agent
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from app.agents.llm_config import get_llm, SYSTEM_PROMPT
 from app.agents.tools import AGENT_TOOLS
-from app.db.models import ChatMessage
-from app.db.database import SessionLocal
+from app.agents.tool_log import ToolTimingHandler, build_invocations
+from app.agents.executor import ConcurrentAgentExecutor
+from app.agents.tool_memo import ToolRunMemo, memoize_tools, tool_run
+from sqlalchemy import select
+from app.db.models import ChatMessage, ToolInvocation
+from datetime import datetime
+from app.db.database import SessionLocal, AsyncSessionLocal
+from app.db.write_behind import get_write_buffer
+from app.config import settings
+from app.cache.responses import get_response_cache
+from app.agents.intent_router import get_intent_router
+import asyncio
 import logging
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
+ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
+LOOP_MESSAGE = "I couldn't narrow this down with the information I have. Could you tell me a bit more, such as your location or the kind of help you need?"
+
 
 class ResourceAgent:
     """
@@ -26,7 +40,9 @@ class ResourceAgent:
     def __init__(self):
         """Initialize the agent with LLM and tools"""
         self.llm = get_llm()
-        self.tools = AGENT_TOOLS
+        self.tools = memoize_tools(AGENT_TOOLS)
+        self.response_cache = get_response_cache()
+        self.intent_router = get_intent_router()
         self._setup_agent()
     
     def _setup_agent(self):
@@ -47,13 +63,14 @@ class ResourceAgent:
         )
         
         # Create agent executor with memory
-        self.agent_executor = AgentExecutor(
+        self.agent_executor = ConcurrentAgentExecutor(
             agent=agent,
             tools=self.tools,
             verbose=False,
             handle_parsing_errors=True,
             max_iterations=15,
-            early_stopping_method="force"
+            early_stopping_method="force",
+            return_intermediate_steps=True
         )
     
     def process_message(
@@ -76,58 +93,305 @@ class ResourceAgent:
             Agent response with message, tools used, and recommendations
         """
         try:
-            # Build chat history for context
-            messages: List[BaseMessage] = []
-            if chat_history:
-                for msg in chat_history:
-                    if msg["role"] == "human":
-                        messages.append(HumanMessage(content=msg["content"]))
-                    else:
-                        messages.append(AIMessage(content=msg["content"]))
-            
-            # Add user context to the initial message if provided
-            input_message = user_message
-            if user_context:
-                context_str = self._format_user_context(user_context)
-                input_message = f"{context_str}\n\nUser message: {user_message}"
+            # Answer simple lookups with a direct search instead of the LLM
+            timing = ToolTimingHandler()
+            routed = self.intent_router.route(user_message, chat_history, user_context, timing)
+            if routed:
+                message, steps = routed
+                self._save_message(user_id, user_message, message, steps, timing)
+                return self._routed_result(message, steps, user_id)
+            
+            # Answer repeated questions without running the agent
+            cached = self._cache_lookup(user_message, chat_history, user_context)
+            if cached:
+                self._save_message(user_id, user_message, cached["message"], [])
+                return self._cached_result(cached, user_id)
             
             # Run the agent
-            response = self.agent_executor.invoke({
-                "input": input_message,
-                "chat_history": messages,
-                "agent_scratchpad": ""
-            })
+            started = time.perf_counter()
+            with tool_run(user_id) as memo:
+                response = self.agent_executor.invoke(
+                    self._build_agent_input(user_message, chat_history, user_context),
+                    config={"callbacks": [timing]}
+                )
+            self.intent_router.record_agent((time.perf_counter() - started) * 1000)
             
             # Extract the output
-            agent_message = response.get("output", "")
+            agent_message = self._agent_output(response, memo)
             
             # Save to database
             self._save_message(
                 user_id=user_id,
                 user_message=user_message,
                 agent_response=agent_message,
-                tools_used=response.get("intermediate_steps", [])
+                tools_used=response.get("intermediate_steps", []),
+                timing=timing
             )
             
-            return {
+            result = {
                 "success": True,
                 "message": agent_message,
                 "tools_used": self._extract_tool_names(response.get("intermediate_steps", [])),
+                "user_id": user_id,
+                "cached": False
+            }
+            if not self._loop_stopped(memo):
+                self._cache_store(user_message, chat_history, user_context, result, response)
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error processing message for user {user_id}: {e}")
+            self._save_message(user_id, user_message, ERROR_MESSAGE, [])
+            
+            return {
+                "success": False,
+                "message": ERROR_MESSAGE,
+                "error": str(e),
                 "user_id": user_id
             }
+    
+    async def aprocess_message(
+        self,
+        user_message: str,
+        user_id: str,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of process_message.
+        
+        The LLM call, tool calls and the message save are all awaited, so a
+        slow model response does not block other requests on the event loop.
+        """
+        try:
+            timing = ToolTimingHandler()
+            routed = await self.intent_router.aroute(user_message, chat_history, user_context, timing)
+            if routed:
+                message, steps = routed
+                await self._asave_message(user_id, user_message, message, steps, timing)
+                return self._routed_result(message, steps, user_id)
+            
+            cached = await asyncio.to_thread(self._cache_lookup, user_message, chat_history, user_context)
+            if cached:
+                await self._asave_message(user_id, user_message, cached["message"], [])
+                return self._cached_result(cached, user_id)
+            
+            started = time.perf_counter()
+            with tool_run(user_id) as memo:
+                response = await self.agent_executor.ainvoke(
+                    self._build_agent_input(user_message, chat_history, user_context),
+                    config={"callbacks": [timing]}
+                )
+            self.intent_router.record_agent((time.perf_counter() - started) * 1000)
+            
+            agent_message = self._agent_output(response, memo)
+            
+            await self._asave_message(
+                user_id=user_id,
+                user_message=user_message,
+                agent_response=agent_message,
+                tools_used=response.get("intermediate_steps", []),
+                timing=timing
+            )
+            
+            result = {
+                "success": True,
+                "message": agent_message,
+                "tools_used": self._extract_tool_names(response.get("intermediate_steps", [])),
+                "user_id": user_id,
+                "cached": False
+            }
+            if not self._loop_stopped(memo):
+                await asyncio.to_thread(self._cache_store, user_message, chat_history, user_context, result, response)
+            return result
         
         except Exception as e:
             logger.error(f"Error processing message for user {user_id}: {e}")
-            error_message = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
-            self._save_message(user_id, user_message, error_message, [])
+            await self._asave_message(user_id, user_message, ERROR_MESSAGE, [])
             
             return {
                 "success": False,
-                "message": error_message,
+                "message": ERROR_MESSAGE,
                 "error": str(e),
                 "user_id": user_id
             }
     
+    async def astream_message(
+        self,
+        user_message: str,
+        user_id: str,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a message and yield progress events as they happen.
+        
+        Yields dicts with a "type" of:
+        - tool_start / tool_end: a tool call began or finished
+        - token: a chunk of LLM output text
+        - done: the final message and tools used (saved to the database)
+        - error: processing failed (the apology message is saved instead)
+        
+        Routed and cached answers are returned as a single done event.
+        """
+        try:
+            timing = ToolTimingHandler()
+            routed = await self.intent_router.aroute(user_message, chat_history, user_context, timing)
+            if routed:
+                message, steps = routed
+                await self._asave_message(user_id, user_message, message, steps, timing)
+                yield {"type": "done", **self._routed_result(message, steps, user_id)}
+                return
+            
+            cached = await asyncio.to_thread(self._cache_lookup, user_message, chat_history, user_context)
+            if cached:
+                await self._asave_message(user_id, user_message, cached["message"], [])
+                yield {"type": "done", **self._cached_result(cached, user_id)}
+                return
+            
+            output = None
+            started = time.perf_counter()
+            with tool_run(user_id) as memo:
+                async for event in self.agent_executor.astream_events(
+                    self._build_agent_input(user_message, chat_history, user_context),
+                    config={"callbacks": [timing]},
+                    version="v2"
+                ):
+                    kind = event["event"]
+                    if kind == "on_tool_start":
+                        yield {"type": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+                    elif kind == "on_tool_end":
+                        yield {"type": "tool_end", "tool": event["name"]}
+                    elif kind == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        if isinstance(content, str) and content:
+                            yield {"type": "token", "content": content}
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        # End of the top-level executor run
+                        output = event["data"].get("output") or {}
+            
+            self.intent_router.record_agent((time.perf_counter() - started) * 1000)
+            output = output or {}
+            agent_message = self._agent_output(output, memo)
+            intermediate_steps = output.get("intermediate_steps", [])
+            
+            await self._asave_message(
+                user_id=user_id,
+                user_message=user_message,
+                agent_response=agent_message,
+                tools_used=intermediate_steps,
+                timing=timing
+            )
+            
+            result = {
+                "success": True,
+                "message": agent_message,
+                "tools_used": self._extract_tool_names(intermediate_steps),
+                "user_id": user_id,
+                "cached": False
+            }
+            if not self._loop_stopped(memo):
+                await asyncio.to_thread(self._cache_store, user_message, chat_history, user_context, result, output)
+            yield {"type": "done", **result}
+        
+        except Exception as e:
+            logger.error(f"Error streaming message for user {user_id}: {e}")
+            await self._asave_message(user_id, user_message, ERROR_MESSAGE, [])
+            
+            yield {
+                "type": "error",
+                "success": False,
+                "message": ERROR_MESSAGE,
+                "error": str(e),
+                "user_id": user_id
+            }
+    
+    def _cache_lookup(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]],
+        user_context: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cached answer for a standalone question (follow-ups depend on history).
+        
+        The cache may call Redis or an embedding API, so the async paths run
+        this and _cache_store in a worker thread.
+        """
+        if chat_history:
+            return None
+        return self.response_cache.lookup(user_message, user_context)
+    
+    def _cache_store(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]],
+        user_context: Optional[Dict[str, Any]],
+        result: Dict[str, Any],
+        response: Dict[str, Any]
+    ):
+        """Cache a fresh answer to a standalone question"""
+        if not chat_history and result["message"]:
+            self.response_cache.store(
+                user_message, user_context, result, response.get("intermediate_steps", [])
+            )
+    
+    def _cached_result(self, cached: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": cached["message"],
+            "tools_used": cached.get("tools_used", []),
+            "user_id": user_id,
+            "cached": True
+        }
+    
+    def _loop_stopped(self, memo: Optional[ToolRunMemo]) -> bool:
+        return memo is not None and memo.loop_detected
+    
+    def _agent_output(self, response: Dict[str, Any], memo: Optional[ToolRunMemo]) -> str:
+        """Final message, asking for more detail when the run was stopped for repeating a tool call"""
+        if self._loop_stopped(memo):
+            return LOOP_MESSAGE
+        return response.get("output", "")
+    
+    def _routed_result(self, message: str, steps: List[tuple], user_id: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": message,
+            "tools_used": self._extract_tool_names(steps),
+            "user_id": user_id,
+            "cached": False,
+            "routed": True
+        }
+    
+    def _build_agent_input(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build the executor input from the message, history and user context"""
+        # Build chat history for context
+        messages: List[BaseMessage] = []
+        if chat_history:
+            for msg in chat_history:
+                if msg["role"] == "human":
+                    messages.append(HumanMessage(content=msg["content"]))
+                else:
+                    messages.append(AIMessage(content=msg["content"]))
+        
+        # Add user context to the initial message if provided
+        input_message = user_message
+        if user_context:
+            context_str = self._format_user_context(user_context)
+            input_message = f"{context_str}\n\nUser message: {user_message}"
+        
+        return {
+            "input": input_message,
+            "chat_history": messages,
+            "agent_scratchpad": ""
+        }
+    
     def _format_user_context(self, context: Dict[str, Any]) -> str:
         """Format user context into a readable string for the agent"""
         context_parts = []
@@ -150,6 +414,9 @@ class ResourceAgent:
             accessibility = ", ".join(context["accessibility_needs"])
             context_parts.append(f"Accessibility Needs: {accessibility}")
         
+        if context.get("language"):
+            context_parts.append(f"Preferred Language: {context['language']}")
+        
         if context_parts:
             return "User Context:\n" + "\n".join(context_parts)
         return ""
@@ -167,25 +434,51 @@ class ResourceAgent:
         
         return list(set(tools_used))  # Remove duplicates
     
+    def _build_records(
+        self,
+        user_id: str,
+        user_message: str,
+        agent_response: str,
+        tools_used: List[tuple],
+        timing: Optional[ToolTimingHandler] = None
+    ) -> Tuple[ChatMessage, List[ToolInvocation]]:
+        """Unsaved chat message and tool invocation rows for one exchange"""
+        message = ChatMessage(
+            user_id=user_id,
+            message=user_message,
+            response=agent_response,
+            agent_tools_used=self._extract_tool_names(tools_used),
+            timestamp=datetime.utcnow()
+        )
+        return message, build_invocations(tools_used, user_id, timing)
+    
     def _save_message(
         self,
         user_id: str,
         user_message: str,
         agent_response: str,
-        tools_used: List[tuple]
+        tools_used: List[tuple],
+        timing: Optional[ToolTimingHandler] = None
     ):
-        """Save conversation to database for audit and learning"""
+        """
+        Save conversation and its tool calls to database for audit and learning.
+        
+        With WRITE_BEHIND_ENABLED the rows are queued and inserted in batches
+        by the write-behind buffer instead of committed here.
+        """
+        message, invocations = self._build_records(user_id, user_message, agent_response, tools_used, timing)
+        if settings.WRITE_BEHIND_ENABLED:
+            get_write_buffer().enqueue(message, invocations, link="message_id")
+            return
+        
         db = SessionLocal()
         try:
-            tool_names = self._extract_tool_names(tools_used)
-            
-            message = ChatMessage(
-                user_id=user_id,
-                message=user_message,
-                response=agent_response,
-                agent_tools_used=tool_names
-            )
             db.add(message)
+            db.flush()
+            
+            for invocation in invocations:
+                invocation.message_id = message.id
+                db.add(invocation)
             db.commit()
         except Exception as e:
             logger.error(f"Error saving message to database: {e}")
@@ -193,6 +486,33 @@ class ResourceAgent:
         finally:
             db.close()
     
+    async def _asave_message(
+        self,
+        user_id: str,
+        user_message: str,
+        agent_response: str,
+        tools_used: List[tuple],
+        timing: Optional[ToolTimingHandler] = None
+    ):
+        """Async variant of _save_message using an AsyncSession"""
+        message, invocations = self._build_records(user_id, user_message, agent_response, tools_used, timing)
+        if settings.WRITE_BEHIND_ENABLED:
+            get_write_buffer().enqueue(message, invocations, link="message_id")
+            return
+        
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add(message)
+                await db.flush()
+                
+                for invocation in invocations:
+                    invocation.message_id = message.id
+                    db.add(invocation)
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Error saving message to database: {e}")
+                await db.rollback()
+    
     def get_conversation_history(
         self,
         user_id: str,
@@ -208,6 +528,11 @@ class ResourceAgent:
         Returns:
             List of recent messages
         """
+        # Include messages still waiting in the write-behind buffer
+        buffer = get_write_buffer()
+        if buffer.has_pending(user_id):
+            buffer.flush()
+        
         db = SessionLocal()
         try:
             messages = (
@@ -234,6 +559,40 @@ class ResourceAgent:
         finally:
             db.close()
 
+    async def aget_conversation_history(
+        self,
+        user_id: str,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Async variant of get_conversation_history using an AsyncSession"""
+        buffer = get_write_buffer()
+        if buffer.has_pending(user_id):
+            await asyncio.to_thread(buffer.flush)
+        
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(
+                    select(ChatMessage)
+                    .where(ChatMessage.user_id == user_id)
+                    .order_by(ChatMessage.timestamp.desc())
+                    .limit(limit)
+                )
+                messages = result.scalars().all()
+                
+                return [
+                    {
+                        "id": msg.id,
+                        "user_message": msg.message,
+                        "agent_response": msg.response,
+                        "tools_used": msg.agent_tools_used or [],
+                        "timestamp": msg.timestamp.isoformat()
+                    }
+                    for msg in reversed(messages)  # Reverse to get chronological order
+                ]
+            except Exception as e:
+                logger.error(f"Error retrieving conversation history: {e}")
+                return []
+
 
 # Global agent instance
 _agent_instance = None
@@ -0,0 +1,99 @@
+"""
+Per-run tool call timing and the rows written to the tool_invocations table
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from app.db.models import ToolInvocation
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ToolTimingHandler(BaseCallbackHandler):
+    """
+    Callback handler that times each tool call in one agent run.
+
+    Create one per run and pass it in the run's callbacks config.
+    """
+
+    # Time calls on the event loop rather than in an executor thread
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[str, str, float]] = {}
+        self.timings: List[Tuple[str, str, float]] = []  # (tool, input, duration_ms) in completion order
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        name = (serialized or {}).get("name") or kwargs.get("name") or ""
+        self._started[run_id] = (name, input_str, time.perf_counter())
+
+    def _finish(self, run_id: UUID):
+        started = self._started.pop(run_id, None)
+        if started:
+            name, input_str, start = started
+            self.timings.append((name, input_str, (time.perf_counter() - start) * 1000))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id)
+
+    def duration_for(self, tool: str, tool_input: Any) -> Optional[float]:
+        """Take the first unclaimed timing for a tool call with these arguments"""
+        input_str = str(tool_input)
+        for index, (name, timed_input, duration) in enumerate(self.timings):
+            if name == tool and timed_input == input_str:
+                del self.timings[index]
+                return duration
+        for index, (name, _, duration) in enumerate(self.timings):
+            if name == tool:
+                del self.timings[index]
+                return duration
+        return None
+
+
+def _result_count(observation: Any) -> Optional[int]:
+    if isinstance(observation, list):
+        return len(observation)
+    if isinstance(observation, dict):
+        return 0 if "error" in observation or observation.get("success") is False else 1
+    return None
+
+
+def build_invocations(
+    intermediate_steps: List[tuple],
+    user_id: str,
+    timing: Optional[ToolTimingHandler] = None
+) -> List[ToolInvocation]:
+    """
+    Build tool_invocations rows from an agent run's intermediate steps.
+
+    Args:
+        intermediate_steps: (AgentAction, observation) pairs from the executor
+        user_id: User the run was for
+        timing: Handler that timed the run, if any
+
+    Returns:
+        Unsaved ToolInvocation rows (message_id is set by the caller)
+    """
+    invocations = []
+    for step in intermediate_steps or []:
+        try:
+            action, observation = step[0], step[1]
+            tool_input = action.tool_input if isinstance(action.tool_input, dict) else {"input": action.tool_input}
+            category = tool_input.get("category")
+            invocations.append(ToolInvocation(
+                user_id=user_id,
+                tool_name=action.tool,
+                category=category.lower() if isinstance(category, str) and category else None,
+                arguments=tool_input,
+                result_count=_result_count(observation),
+                duration_ms=timing.duration_for(action.tool, action.tool_input) if timing else None,
+            ))
+        except Exception as e:
+            logger.debug(f"Could not record tool invocation: {e}")
+    return invocations
@@ -0,0 +1,225 @@
+"""
+Per-run memoization of agent tool calls and loop detection
+Within one agent run, repeated calls with the same (normalized) arguments
+return the first call's result instead of running the tool again, and a
+call repeated AGENT_LOOP_THRESHOLD times stops the run early
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from langchain_core.tools import StructuredTool
+from app.cache.responses import UNCACHEABLE_TOOLS
+from app.config import settings
+import contextvars
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conversations whose savings are kept for the stats endpoint
+MAX_CONVERSATIONS = 10000
+
+# Coordinates are compared to about 10 meters
+COORDINATE_PRECISION = 4
+
+_current_run: contextvars.ContextVar[Optional["ToolRunMemo"]] = contextvars.ContextVar(
+    "tool_run_memo", default=None
+)
+
+
+def _normalize(value: Any) -> Hashable:
+    """Hashable form of tool arguments that ignores case, spacing and tiny float differences"""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, float):
+        return round(value, COORDINATE_PRECISION)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items() if item is not None))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+class ToolRunMemo:
+    """
+    Tool results and call counts for one agent run.
+
+    Args:
+        loop_threshold: Identical calls that count as a loop
+    """
+
+    def __init__(self, loop_threshold: int):
+        self.loop_threshold = loop_threshold
+        self._results: Dict[Hashable, Any] = {}
+        self._calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.executions_saved = 0
+        self.loop_detected = False
+        self.iterations_saved = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """Count a call and return (hit, cached result)"""
+        with self._lock:
+            self._calls[key] += 1
+            if self._calls[key] >= self.loop_threshold and not self.loop_detected:
+                self.loop_detected = True
+                logger.info(f"Agent repeated tool call {key[0]} {self._calls[key]} times; stopping the run")
+            if key in self._results:
+                self.executions_saved += 1
+                return True, self._results[key]
+            self.executions += 1
+            return False, None
+
+    def _store(self, key: Hashable, result: Any):
+        with self._lock:
+            self._results[key] = result
+
+    def call(self, key: Hashable, run: Callable[[], Any]) -> Any:
+        hit, result = self._lookup(key)
+        if hit:
+            return result
+        result = run()
+        self._store(key, result)
+        return result
+
+    async def acall(self, key: Hashable, run: Callable[[], Awaitable[Any]]) -> Any:
+        hit, result = self._lookup(key)
+        if hit:
+            return result
+        result = await run()
+        self._store(key, result)
+        return result
+
+
+def current_run() -> Optional[ToolRunMemo]:
+    """Memo of the agent run in progress, if any"""
+    return _current_run.get()
+
+
+class ToolMemoStats:
+    """Tool executions and iterations saved, in total and per conversation (user)"""
+
+    FIELDS = ("runs", "tool_executions", "executions_saved", "loops_stopped", "iterations_saved")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+        self._conversations: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+    def record(self, user_id: str, memo: ToolRunMemo):
+        values = {
+            "runs": 1,
+            "tool_executions": memo.executions,
+            "executions_saved": memo.executions_saved,
+            "loops_stopped": int(memo.loop_detected),
+            "iterations_saved": memo.iterations_saved,
+        }
+        with self._lock:
+            conversation = self._conversations.pop(user_id, None) or dict.fromkeys(self.FIELDS, 0)
+            for field, value in values.items():
+                self.totals[field] += value
+                conversation[field] += value
+            self._conversations[user_id] = conversation
+            while len(self._conversations) > MAX_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+
+    def conversation(self, user_id: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            conversation = self._conversations.get(user_id)
+            return dict(conversation) if conversation else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.totals["tool_executions"] + self.totals["executions_saved"]
+            top = sorted(
+                self._conversations.items(),
+                key=lambda item: item[1]["executions_saved"] + item[1]["iterations_saved"],
+                reverse=True
+            )[:10]
+            return {
+                "enabled": settings.AGENT_TOOL_MEMO_ENABLED,
+                **self.totals,
+                "saved_rate": round(self.totals["executions_saved"] / calls, 4) if calls else 0.0,
+                "top_conversations": [
+                    {"user_id": user_id, **conversation}
+                    for user_id, conversation in top
+                    if conversation["executions_saved"] or conversation["iterations_saved"]
+                ],
+            }
+
+
+@contextmanager
+def tool_run(user_id: str) -> Iterator[Optional[ToolRunMemo]]:
+    """
+    Memoize tool calls made within the block and record what was saved.
+
+    Yields None when AGENT_TOOL_MEMO_ENABLED is off.
+    """
+    if not settings.AGENT_TOOL_MEMO_ENABLED:
+        yield None
+        return
+    memo = ToolRunMemo(settings.AGENT_LOOP_THRESHOLD)
+    token = _current_run.set(memo)
+    try:
+        yield memo
+    finally:
+        _current_run.reset(token)
+        get_tool_memo_stats().record(user_id, memo)
+
+
+def memoize_tool(tool: StructuredTool) -> StructuredTool:
+    """
+    Copy of a tool whose calls go through the current run's memo.
+
+    Tools with side effects (see UNCACHEABLE_TOOLS) are returned unchanged.
+    Omitted arguments are filled with their defaults, so search_resources
+    with and without radius_miles=5.0 is the same call.
+    """
+    if tool.name in UNCACHEABLE_TOOLS:
+        return tool
+    defaults = {
+        name: field.default
+        for name, field in tool.args_schema.model_fields.items()
+        if not field.is_required()
+    }
+
+    def key_for(kwargs: Dict[str, Any]) -> Hashable:
+        return (tool.name, _normalize({**defaults, **kwargs}))
+
+    def run(**kwargs):
+        memo = _current_run.get()
+        if memo is None:
+            return tool.func(**kwargs)
+        return memo.call(key_for(kwargs), lambda: tool.func(**kwargs))
+
+    async def arun(**kwargs):
+        memo = _current_run.get()
+        if memo is None:
+            return await tool.coroutine(**kwargs)
+        return await memo.acall(key_for(kwargs), lambda: tool.coroutine(**kwargs))
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
+def memoize_tools(tools: List[StructuredTool]) -> List[StructuredTool]:
+    return [memoize_tool(tool) for tool in tools]
+
+
+# Global stats instance
+_tool_memo_stats_instance = None
+
+
+def get_tool_memo_stats() -> ToolMemoStats:
+    """Get or create the global tool memo stats"""
+    global _tool_memo_stats_instance
+    if _tool_memo_stats_instance is None:
+        _tool_memo_stats_instance = ToolMemoStats()
+    return _tool_memo_stats_instance
@@ -2,53 +2,117 @@
 Agent tools for resource search, eligibility checking, and service verification
 """
 
-from typing import Optional, List, Dict, Any
-from langchain_core.tools import tool
+from typing import Optional, List, Dict, Any, Callable
+from langchain_core.tools import StructuredTool
+from langchain_core.tools.base import create_schema_from_function
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from app.db.models import SocialService, UserProfile
-from app.db.database import SessionLocal
-import math
+from app.db.database import SessionLocal, AsyncSessionLocal
+from app.db.catalog_snapshot import catalog_snapshot, snapshot_for
+from app.db.eligibility import assess, candidate_positions, compile_rule, evaluate_batch
+from app.geo.distance import haversine_miles
+from app.geo.nearby import find_nearby
+from app.cache.search import get_search_cache
+from app.search.fulltext import keyword_filter
+from app.search.semantic import semantic_search
+from app.search.trigram import PLACE, SERVICE, get_trigram_index
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def db_tool(fn: Optional[Callable] = None, *, offload: bool = False):
+    """
+    Turn fn(db, **args) into an agent tool with sync and async entry points.
+    
+    The sync path runs fn with a regular Session. The async path (used by
+    AgentExecutor.ainvoke) runs it through an AsyncSession, so database I/O
+    goes through the async driver instead of blocking the event loop.
+    Tools that also make blocking network calls pass offload=True to run
+    the sync path in a worker thread instead.
+    The tool schema is inferred from fn's signature without the db argument.
+    """
+    if fn is None:
+        return lambda f: db_tool(f, offload=offload)
+    
+    def run(**kwargs):
+        db = SessionLocal()
+        try:
+            return fn(db, **kwargs)
+        finally:
+            db.close()
+    
+    async def arun(**kwargs):
+        if offload:
+            return await asyncio.to_thread(run, **kwargs)
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn, **kwargs)
+    
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=fn.__name__,
+        description=fn.__doc__,
+        args_schema=create_schema_from_function(fn.__name__, fn, filter_args=["db"]),
+    )
+
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two coordinates in miles"""
-    R = 3959  # Earth's radius in miles
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    return haversine_miles(lat1, lon1, lat2, lon2)
 
 
-@tool
-def search_resources(
+def _format_service(service: SocialService) -> Dict[str, Any]:
+    """Summary of a service as returned by the search tools"""
+    return {
+        "id": service.id,
+        "name": service.name,
+        "description": service.description,
+        "category": service.category,
+        "address": service.address,
+        "phone": service.phone,
+        "website": service.website,
+        "operating_hours": service.operating_hours,
+        "services_provided": service.services_provided,
+        "eligibility_criteria": service.eligibility_criteria,
+    }
+
+
+def _load_service(db: Session, service_id: int) -> Optional[Any]:
+    """A service from the catalog snapshot when enabled, otherwise from the database"""
+    catalog = catalog_snapshot()
+    if catalog is not None:
+        return catalog.get(service_id)
+    return db.query(SocialService).filter(SocialService.id == service_id).first()
+
+
+# Maximum number of IDs a batch tool accepts
+MAX_BATCH_IDS = 50
+
+
+def _load_services(db: Session, service_ids: List[int]) -> Dict[int, Any]:
+    """Services by ID from the catalog snapshot, or from the database in one IN query"""
+    catalog = catalog_snapshot()
+    if catalog is not None:
+        services = (catalog.get(service_id) for service_id in set(service_ids))
+        return {service.id: service for service in services if service is not None}
+    return {
+        service.id: service
+        for service in db.query(SocialService).filter(SocialService.id.in_(set(service_ids))).all()
+    }
+
+
+def _search_resources(
+    db: Session,
     category: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
     radius_miles: float = 5.0,
     keywords: Optional[str] = None
 ) -> List[Dict[str, Any]]:
-    """
-    Search for community resources by category, location, and keywords.
-    
-    Args:
-        category: Type of service (shelter, food, health, employment, mental_health, legal, substance_abuse, youth)
-        latitude: User's latitude for distance-based recommendations
-        longitude: User's longitude for distance-based recommendations
-        radius_miles: Search radius in miles (default 5.0)
-        keywords: Additional search terms
-    
-    Returns:
-        List of matching resources with details and distance
-    """
-    db = SessionLocal()
+    """Shared implementation of search_resources and get_nearby_resources"""
     try:
         query = db.query(SocialService).filter(SocialService.is_active == True)
         
@@ -56,57 +120,85 @@ def search_resources(
         if category:
             query = query.filter(SocialService.category == category.lower())
         
-        # Filter by keyword search in name or description
+        # Full-text keyword search over name, description and address,
+        # ranked by relevance
         if keywords:
-            keyword_filter = or_(
-                SocialService.name.ilike(f"%{keywords}%"),
-                SocialService.description.ilike(f"%{keywords}%"),
-                SocialService.address.ilike(f"%{keywords}%")
-            )
-            query = query.filter(keyword_filter)
+            query = keyword_filter(query, keywords)
         
-        services = query.all()
+        filters = {
+            "category": category.lower() if category else None,
+            "keywords": " ".join(keywords.lower().split()) if keywords else None,
+        }
         
-        # Format results with distance calculation
-        results = []
-        for service in services:
-            result = {
-                "id": service.id,
-                "name": service.name,
-                "description": service.description,
-                "category": service.category,
-                "address": service.address,
-                "phone": service.phone,
-                "website": service.website,
-                "operating_hours": service.operating_hours,
-                "services_provided": service.services_provided,
-                "eligibility_criteria": service.eligibility_criteria,
-            }
-            
-            # Calculate distance if coordinates provided
-            if latitude and longitude and service.latitude and service.longitude:
-                distance = calculate_distance(latitude, longitude, service.latitude, service.longitude)
-                if distance <= radius_miles:
-                    result["distance_miles"] = round(distance, 2)
-                    results.append(result)
-            else:
-                results.append(result)
+        # Keyword searches need the database's full-text index; the rest
+        # are answered from the in-memory catalog snapshot
+        catalog = None if keywords else catalog_snapshot()
+        if catalog is not None:
+            mask = catalog.mask(category=category.lower() if category else None, exact_category=True)
         
-        # Sort by distance if available
+        # Location searches only load and format the 10 nearest matches,
+        # shared across users in the same geohash cell
         if latitude and longitude:
-            results.sort(key=lambda x: x.get("distance_miles", float('inf')))
+            def compute(lat: float, lon: float, radius: float, limit: Optional[int]):
+                if catalog is not None:
+                    matches = catalog.nearby(mask, lat, lon, radius, limit=limit)
+                else:
+                    matches = find_nearby(query, lat, lon, radius, limit=limit)
+                return [
+                    (_format_service(service), service.latitude, service.longitude)
+                    for service, _ in matches
+                ]
+            
+            matches = get_search_cache().nearby(
+                "tool_search", latitude, longitude, radius_miles, filters, compute, limit=10
+            )
+            return [
+                {**result, "distance_miles": round(distance, 2)}
+                for result, distance in matches
+            ]
         
-        return results[:10]  # Return top 10 results
+        def compute_all():
+            if catalog is not None:
+                services = catalog.page(mask, 10)
+            else:
+                services = query.limit(10).all()
+            return [_format_service(service) for service in services]
+        
+        return get_search_cache().lookup("tool_search", filters, compute_all)  # Top 10 results
     
     except Exception as e:
         logger.error(f"Error searching resources: {e}")
         return []
-    finally:
-        db.close()
 
 
-@tool
+@db_tool(offload=True)  # The search cache may call Redis
+def search_resources(
+    db: Session,
+    category: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_miles: float = 5.0,
+    keywords: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Search for community resources by category, location, and keywords.
+    
+    Args:
+        category: Type of service (shelter, food, health, employment, mental_health, legal, substance_abuse, youth)
+        latitude: User's latitude for distance-based recommendations
+        longitude: User's longitude for distance-based recommendations
+        radius_miles: Search radius in miles (default 5.0)
+        keywords: Additional search terms
+    
+    Returns:
+        List of matching resources with details and distance
+    """
+    return _search_resources(db, category, latitude, longitude, radius_miles, keywords)
+
+
+@db_tool
 def check_eligibility(
+    db: Session,
     service_id: int,
     income_level: Optional[str] = None,
     family_size: Optional[int] = None,
@@ -128,9 +220,8 @@ def check_eligibility(
     Returns:
         Eligibility assessment with requirements and barriers
     """
-    db = SessionLocal()
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = _load_service(db, service_id)
         if not service:
             return {"error": f"Service with ID {service_id} not found"}
         
@@ -145,34 +236,10 @@ def check_eligibility(
             "notes": ""
         }
         
-        # Check age
-        if "age_minimum" in eligibility and age:
-            if age < eligibility["age_minimum"]:
-                assessment["eligible"] = False
-                assessment["barriers"].append(f"Minimum age requirement: {eligibility['age_minimum']}")
-        
-        if "age_maximum" in eligibility and age:
-            if age > eligibility["age_maximum"]:
-                assessment["eligible"] = False
-                assessment["barriers"].append(f"Maximum age requirement: {eligibility['age_maximum']}")
-        
-        # Check income (simplified logic)
-        if "income_limit" in eligibility and income_level:
-            income_mapping = {
-                "very_low": 1,
-                "low": 2,
-                "moderate": 3,
-                "medium": 3,
-                "moderate_high": 4,
-                "high": 5
-            }
-            if income_mapping.get(income_level, 3) > 3:  # If income above moderate
-                assessment["barriers"].append(f"Income limit: {eligibility['income_limit']}")
-        
-        # Check residency
-        if "residency" in eligibility and residency:
-            if eligibility["residency"] != "Any" and residency != eligibility["residency"]:
-                assessment["barriers"].append(f"Residency requirement: {eligibility['residency']}")
+        # Age, income and residency rules, parsed from the free-form criteria
+        assessment["eligible"], assessment["barriers"] = assess(
+            compile_rule(eligibility), age=age, income_level=income_level, residency=residency
+        )
         
         # Add practical advice
         if assessment["eligible"]:
@@ -185,12 +252,92 @@ def check_eligibility(
     except Exception as e:
         logger.error(f"Error checking eligibility: {e}")
         return {"error": f"Error checking eligibility: {str(e)}"}
-    finally:
-        db.close()
 
 
-@tool
-def get_service_details(service_id: int) -> Dict[str, Any]:
+@db_tool
+def check_eligibility_batch(
+    db: Session,
+    age: Optional[int] = None,
+    income_level: Optional[str] = None,
+    residency: Optional[str] = None,
+    category: Optional[str] = None,
+    service_ids: Optional[List[int]] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_miles: float = 10.0,
+    only_eligible: bool = False,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Check the user's eligibility for many services in one call.
+    Prefer this over calling check_eligibility service by service.
+    
+    Args:
+        age: User's age
+        income_level: User's income level (very_low, low, moderate, medium, moderate_high, high)
+        residency: Residency status
+        category: Only services in this category (shelter, food, health, etc.)
+        service_ids: Only these services
+        latitude: User's latitude, to only check nearby services
+        longitude: User's longitude, to only check nearby services
+        radius_miles: Search radius in miles when a location is given (default 10)
+        only_eligible: Leave out services the user is not eligible for
+        limit: Maximum number of services in the results (default 20)
+    
+    Returns:
+        Counts of services checked and eligible, and per-service eligibility
+        with barriers, services without barriers first
+    """
+    try:
+        criteria = [SocialService.is_active == True]
+        if category:
+            criteria.append(SocialService.category == category.lower())
+        if service_ids:
+            criteria.append(SocialService.id.in_(service_ids))
+        catalog = snapshot_for(db, *criteria)
+        
+        located = latitude is not None and longitude is not None
+        positions = candidate_positions(
+            catalog,
+            service_ids=service_ids,
+            category=category.lower() if category else None,
+            exact_category=True,
+            latitude=latitude if located else None,
+            longitude=longitude if located else None,
+            radius_miles=radius_miles
+        )
+        return evaluate_batch(
+            catalog, positions, age=age, income_level=income_level, residency=residency,
+            only_eligible=only_eligible, limit=min(limit, 50)
+        )
+    
+    except Exception as e:
+        logger.error(f"Error checking eligibility in batch: {e}")
+        return {"error": f"Error checking eligibility: {str(e)}"}
+
+
+def _service_details(service: SocialService) -> Dict[str, Any]:
+    """Complete information about a service as returned by the detail tools"""
+    return {
+        "id": service.id,
+        "name": service.name,
+        "description": service.description,
+        "category": service.category,
+        "address": service.address,
+        "latitude": service.latitude,
+        "longitude": service.longitude,
+        "phone": service.phone,
+        "website": service.website,
+        "operating_hours": service.operating_hours,
+        "services_provided": service.services_provided,
+        "eligibility_criteria": service.eligibility_criteria,
+        "is_active": service.is_active,
+        "last_verified": service.last_verified.isoformat() if service.last_verified else None,
+    }
+
+
+@db_tool
+def get_service_details(db: Session, service_id: int) -> Dict[str, Any]:
     """
     Get detailed information about a specific service.
     
@@ -200,38 +347,71 @@ def get_service_details(service_id: int) -> Dict[str, Any]:
     Returns:
         Complete service information
     """
-    db = SessionLocal()
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = _load_service(db, service_id)
         if not service:
             return {"error": f"Service with ID {service_id} not found"}
         
-        return {
-            "id": service.id,
-            "name": service.name,
-            "description": service.description,
-            "category": service.category,
-            "address": service.address,
-            "latitude": service.latitude,
-            "longitude": service.longitude,
-            "phone": service.phone,
-            "website": service.website,
-            "operating_hours": service.operating_hours,
-            "services_provided": service.services_provided,
-            "eligibility_criteria": service.eligibility_criteria,
-            "is_active": service.is_active,
-            "last_verified": service.last_verified.isoformat() if service.last_verified else None,
-        }
+        return _service_details(service)
     
     except Exception as e:
         logger.error(f"Error getting service details: {e}")
         return {"error": f"Error: {str(e)}"}
-    finally:
-        db.close()
 
 
-@tool
+@db_tool
+def get_services_details(db: Session, service_ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Get detailed information about several services in one call.
+    Prefer this over calling get_service_details once per service.
+    
+    Args:
+        service_ids: IDs of the services (up to 50)
+    
+    Returns:
+        Complete service information for each ID, in the order given
+    """
+    try:
+        service_ids = service_ids[:MAX_BATCH_IDS]
+        services = _load_services(db, service_ids)
+        return [
+            _service_details(services[service_id]) if service_id in services
+            else {"error": f"Service with ID {service_id} not found"}
+            for service_id in service_ids
+        ]
+    
+    except Exception as e:
+        logger.error(f"Error getting service details: {e}")
+        return [{"error": f"Error: {str(e)}"}]
+
+
+def _appointment_response(service: SocialService, preferred_date: Optional[str], contact_method: str) -> Dict[str, Any]:
+    """Contact instructions for one service as returned by the scheduling tools"""
+    response = {
+        "service_name": service.name,
+        "service_id": service.id,
+        "contact_method": contact_method,
+    }
+    
+    if contact_method == "phone":
+        response["instructions"] = f"Call {service.phone} to schedule an appointment. Ask about availability for {preferred_date or 'your preferred date'}."
+        response["hours"] = service.operating_hours
+    elif contact_method == "in_person":
+        response["address"] = service.address
+        response["hours"] = service.operating_hours
+        response["instructions"] = f"Visit {service.address} during operating hours. Bring a valid ID and proof of address."
+    elif contact_method == "online":
+        response["website"] = service.website
+        response["instructions"] = f"Visit {service.website} to schedule or call {service.phone} for more information."
+    
+    response["confirmation_message"] = f"Request for {service.name} has been recorded."
+    
+    return response
+
+
+@db_tool
 def schedule_appointment(
+    db: Session,
     service_id: int,
     user_id: str,
     preferred_date: Optional[str] = None,
@@ -251,42 +431,59 @@ def schedule_appointment(
     Returns:
         Appointment booking information or instructions
     """
-    db = SessionLocal()
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = _load_service(db, service_id)
         if not service:
             return {"error": f"Service with ID {service_id} not found"}
         
-        response = {
-            "service_name": service.name,
-            "service_id": service_id,
-            "contact_method": contact_method,
-        }
-        
-        if contact_method == "phone":
-            response["instructions"] = f"Call {service.phone} to schedule an appointment. Ask about availability for {preferred_date or 'your preferred date'}."
-            response["hours"] = service.operating_hours
-        elif contact_method == "in_person":
-            response["address"] = service.address
-            response["hours"] = service.operating_hours
-            response["instructions"] = f"Visit {service.address} during operating hours. Bring a valid ID and proof of address."
-        elif contact_method == "online":
-            response["website"] = service.website
-            response["instructions"] = f"Visit {service.website} to schedule or call {service.phone} for more information."
-        
-        response["confirmation_message"] = f"Request for {service.name} has been recorded."
-        
-        return response
+        return _appointment_response(service, preferred_date, contact_method)
     
     except Exception as e:
         logger.error(f"Error scheduling appointment: {e}")
         return {"error": f"Error: {str(e)}"}
-    finally:
-        db.close()
 
 
-@tool
+@db_tool
+def schedule_appointments(
+    db: Session,
+    service_ids: List[int],
+    user_id: str,
+    preferred_date: Optional[str] = None,
+    preferred_time: Optional[str] = None,
+    contact_method: str = "phone"
+) -> List[Dict[str, Any]]:
+    """
+    Schedule or get contact instructions for several services in one call.
+    Prefer this over calling schedule_appointment once per service.
+    
+    Args:
+        service_ids: IDs of the services (up to 50)
+        user_id: User's identifier
+        preferred_date: Preferred appointment date (YYYY-MM-DD)
+        preferred_time: Preferred time slot
+        contact_method: How to contact (phone, in_person, online)
+    
+    Returns:
+        Appointment booking information or instructions for each ID, in the order given
+    """
+    try:
+        service_ids = service_ids[:MAX_BATCH_IDS]
+        services = _load_services(db, service_ids)
+        return [
+            _appointment_response(services[service_id], preferred_date, contact_method)
+            if service_id in services
+            else {"error": f"Service with ID {service_id} not found"}
+            for service_id in service_ids
+        ]
+    
+    except Exception as e:
+        logger.error(f"Error scheduling appointments: {e}")
+        return [{"error": f"Error: {str(e)}"}]
+
+
+@db_tool(offload=True)  # The search cache may call Redis
 def get_nearby_resources(
+    db: Session,
     latitude: float,
     longitude: float,
     radius_miles: float = 5.0,
@@ -304,7 +501,8 @@ def get_nearby_resources(
     Returns:
         List of nearby resources sorted by distance
     """
-    return search_resources(
+    return _search_resources(
+        db,
         category=category,
         latitude=latitude,
         longitude=longitude,
@@ -312,11 +510,88 @@ def get_nearby_resources(
     )
 
 
+@db_tool(offload=True)  # Embedding the query may call a remote API
+def semantic_search_resources(
+    db: Session,
+    need: str,
+    category: Optional[str] = None,
+    limit: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Find resources that match a need described in the user's own words.
+    Prefer this over guessing categories or keywords for open-ended requests.
+    
+    Args:
+        need: Natural-language description, e.g. "somewhere to sleep tonight with my kids"
+        category: Optional category filter (shelter, food, health, employment, etc.)
+        limit: Maximum number of results (default 5)
+    
+    Returns:
+        List of the most relevant resources with a relevance score
+    """
+    try:
+        query = db.query(SocialService).filter(SocialService.is_active == True)
+        if category:
+            query = query.filter(SocialService.category == category.lower())
+        
+        results = []
+        for service, similarity in semantic_search(db, query, need, limit=min(limit, 10)):
+            result = _format_service(service)
+            result["relevance"] = round(similarity, 3)
+            results.append(result)
+        
+        return results
+    
+    except Exception as e:
+        logger.error(f"Error in semantic resource search: {e}")
+        return []
+
+
+@db_tool
+def fuzzy_search_resources(db: Session, name: str, limit: int = 5) -> Dict[str, Any]:
+    """
+    Find services or places by a name that may be misspelled or transliterated
+    (e.g. "Secundrabad", "Begampet"). Use this when the user names a specific
+    organization or neighborhood.
+    
+    Args:
+        name: Service or place name as the user wrote it
+        limit: Maximum number of services and of places (default 5)
+    
+    Returns:
+        Matching services and places with a 0-1 match score
+    """
+    try:
+        index = get_trigram_index()
+        matches = index.search(name, kind=SERVICE, limit=min(limit, 10))
+        services_by_id = _load_services(db, [match["id"] for match in matches])
+        services = [
+            {**_format_service(services_by_id[match["id"]]), "match_score": match["score"]}
+            for match in matches
+            if match["id"] in services_by_id
+        ]
+        
+        places = [
+            {"name": match["name"], "service_count": match["service_count"], "match_score": match["score"]}
+            for match in index.search(name, kind=PLACE, limit=min(limit, 10))
+        ]
+        return {"services": services, "places": places}
+    
+    except Exception as e:
+        logger.error(f"Error in fuzzy resource search: {e}")
+        return {"services": [], "places": []}
+
+
 # Aggregate all tools
 AGENT_TOOLS = [
     search_resources,
+    semantic_search_resources,
+    fuzzy_search_resources,
     check_eligibility,
+    check_eligibility_batch,
     get_service_details,
+    get_services_details,
     schedule_appointment,
+    schedule_appointments,
     get_nearby_resources,
 ]
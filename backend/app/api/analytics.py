@@ -5,15 +5,75 @@ Analytics API endpoints for impact metrics and dashboard data
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.db.models import ChatMessage, ServiceAccess, SocialService, UserProfile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
+from app.db.models import AnalyticsRollup, ServiceAccess, ToolInvocation
+from app.db.rollups import DAY, HOUR, truncate
+from app.db.write_behind import get_write_buffer
+from app.db.catalog_snapshot import get_catalog
+from app.agents.intent_router import get_intent_router
+from app.agents.tool_memo import get_tool_memo_stats
+from app.config import settings
 from pydantic import BaseModel
 
 router = APIRouter()
 
 
+def _window_start(days: int, granularity: str = DAY) -> datetime:
+    """Start of the last `days` whole days (or their hours), including the current one"""
+    if granularity == HOUR:
+        return truncate(datetime.utcnow(), HOUR) - timedelta(hours=24 * days - 1)
+    return truncate(datetime.utcnow(), DAY) - timedelta(days=days - 1)
+
+
+def _window(metric: str, start_date: datetime, granularity: str = DAY) -> list:
+    """Filters selecting a metric's rollup buckets from start_date onwards"""
+    return [
+        AnalyticsRollup.metric == metric,
+        AnalyticsRollup.granularity == granularity,
+        AnalyticsRollup.bucket >= truncate(start_date, granularity),
+    ]
+
+
+async def _rollup_total(db: AsyncSession, metric: str, start_date: datetime) -> int:
+    """Sum of a counter over the window"""
+    return await db.scalar(
+        select(func.coalesce(func.sum(AnalyticsRollup.value), 0))
+        .where(*_window(metric, start_date))
+    ) or 0
+
+
+async def _rollup_distinct(db: AsyncSession, metric: str, start_date: datetime) -> int:
+    """Number of distinct dim1 values (users, services) seen in the window"""
+    return await db.scalar(
+        select(func.count(func.distinct(AnalyticsRollup.dim1)))
+        .where(*_window(metric, start_date))
+    ) or 0
+
+
+async def _rollup_breakdown(db: AsyncSession, metric: str, start_date: datetime, column=AnalyticsRollup.dim1) -> list:
+    """(dimension, total) pairs over the window, largest first"""
+    total = func.sum(AnalyticsRollup.value)
+    return (await db.execute(
+        select(column, total)
+        .where(*_window(metric, start_date))
+        .group_by(column)
+        .order_by(total.desc())
+    )).all()
+
+
+async def _rollup_series(db: AsyncSession, metric: str, start_date: datetime, granularity: str = DAY, value=None) -> list:
+    """(bucket, value) pairs over the window in time order; value defaults to the summed counter"""
+    value = func.sum(AnalyticsRollup.value) if value is None else value
+    return (await db.execute(
+        select(AnalyticsRollup.bucket, value)
+        .where(*_window(metric, start_date, granularity))
+        .group_by(AnalyticsRollup.bucket)
+        .order_by(AnalyticsRollup.bucket)
+    )).all()
+
+
 class MetricResponse(BaseModel):
     """Schema for metric response"""
     metric: str
@@ -36,36 +96,30 @@ class DashboardStats(BaseModel):
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get overall dashboard statistics and impact metrics.
     
+    Reads the daily rollups, so the window covers whole days (today included).
+    
     Args:
         days: Number of recent days to analyze (default 30)
     """
     try:
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = _window_start(days)
         
         # Total unique users
-        total_users = db.query(func.count(func.distinct(ChatMessage.user_id))).filter(
-            ChatMessage.timestamp >= start_date
-        ).scalar() or 0
+        total_users = await _rollup_distinct(db, "active_user", start_date)
         
         # Total conversations
-        total_conversations = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.timestamp >= start_date
-        ).scalar() or 0
+        total_conversations = await _rollup_total(db, "messages", start_date)
         
         # Total service accesses
-        total_accesses = db.query(func.count(ServiceAccess.id)).filter(
-            ServiceAccess.access_date >= start_date
-        ).scalar() or 0
+        total_accesses = await _rollup_total(db, "accesses", start_date)
         
         # Unique services used
-        unique_services = db.query(func.count(func.distinct(ServiceAccess.service_id))).filter(
-            ServiceAccess.access_date >= start_date
-        ).scalar() or 0
+        unique_services = await _rollup_distinct(db, "access_by_service", start_date)
         
         # Average messages per user
         avg_messages = 0.0
@@ -73,52 +127,35 @@ async def get_dashboard_stats(
             avg_messages = total_conversations / total_users
         
         # Most accessed services
-        most_accessed = (
-            db.query(
-                ServiceAccess.service_name,
-                func.count(ServiceAccess.id).label("count")
-            )
-            .filter(ServiceAccess.access_date >= start_date)
-            .group_by(ServiceAccess.service_name)
-            .order_by(func.count(ServiceAccess.id).desc())
-            .limit(10)
-            .all()
-        )
+        most_accessed = (await _rollup_breakdown(
+            db, "access_by_service", start_date, column=AnalyticsRollup.dim2
+        ))[:10]
         
         most_accessed_services = [
             {"service": service, "count": count}
             for service, count in most_accessed
         ]
         
-        # Most requested categories
-        most_requested = (
-            db.query(
-                SocialService.category,
-                func.count(ChatMessage.id).label("count")
+        # Most requested categories, from the category argument of tool calls
+        most_requested = (await db.execute(
+            select(
+                ToolInvocation.category,
+                func.count(ToolInvocation.id).label("count")
             )
-            .join(ChatMessage, ChatMessage.agent_tools_used.contains(SocialService.category))
-            .filter(ChatMessage.timestamp >= start_date)
-            .group_by(SocialService.category)
-            .order_by(func.count(ChatMessage.id).desc())
+            .where(ToolInvocation.created_at >= start_date, ToolInvocation.category != None)
+            .group_by(ToolInvocation.category)
+            .order_by(func.count(ToolInvocation.id).desc())
             .limit(10)
-            .all()
-        )
+        )).all()
         
         most_requested_categories = [
             {"category": category, "count": count}
             for category, count in most_requested
-        ] if most_requested else []
+        ]
         
         # Helpful response rate
-        total_feedback = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.helpful != None,
-            ChatMessage.timestamp >= start_date
-        ).scalar() or 0
-        
-        helpful_count = db.query(func.count(ChatMessage.id)).filter(
-            ChatMessage.helpful == True,
-            ChatMessage.timestamp >= start_date
-        ).scalar() or 0
+        total_feedback = await _rollup_total(db, "feedback", start_date)
+        helpful_count = await _rollup_total(db, "helpful", start_date)
         
         helpful_rate = (helpful_count / total_feedback * 100) if total_feedback > 0 else 0.0
         
@@ -143,46 +180,30 @@ async def get_dashboard_stats(
 @router.get("/impact/users")
 async def get_user_impact(
     days: int = Query(30, ge=1, le=365),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user engagement and impact metrics.
     """
     try:
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = _window_start(days)
         
-        # Daily active users
-        daily_users = (
-            db.query(
-                func.date(ChatMessage.timestamp).label("date"),
-                func.count(func.distinct(ChatMessage.user_id)).label("users")
-            )
-            .filter(ChatMessage.timestamp >= start_date)
-            .group_by(func.date(ChatMessage.timestamp))
-            .order_by(func.date(ChatMessage.timestamp))
-            .all()
+        # Daily active users (one active_user row per user per day)
+        daily_users = await _rollup_series(
+            db, "active_user", start_date, value=func.count(AnalyticsRollup.id)
         )
         
         # New users per day
-        new_users = (
-            db.query(
-                func.date(UserProfile.created_at).label("date"),
-                func.count(UserProfile.id).label("count")
-            )
-            .filter(UserProfile.created_at >= start_date)
-            .group_by(func.date(UserProfile.created_at))
-            .order_by(func.date(UserProfile.created_at))
-            .all()
-        )
+        new_users = await _rollup_series(db, "new_users", start_date)
         
         return {
             "daily_active_users": [
-                {"date": str(date), "users": users}
-                for date, users in daily_users
+                {"date": str(bucket.date()), "users": users}
+                for bucket, users in daily_users
             ],
             "new_users_daily": [
-                {"date": str(date), "count": count}
-                for date, count in new_users
+                {"date": str(bucket.date()), "count": count}
+                for bucket, count in new_users
             ]
         }
     
@@ -196,52 +217,27 @@ async def get_user_impact(
 @router.get("/impact/services")
 async def get_service_impact(
     days: int = Query(30, ge=1, le=365),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get service utilization and impact metrics.
     """
     try:
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = _window_start(days)
         
         # Services accessed per day
-        daily_services = (
-            db.query(
-                func.date(ServiceAccess.access_date).label("date"),
-                func.count(ServiceAccess.id).label("count")
-            )
-            .filter(ServiceAccess.access_date >= start_date)
-            .group_by(func.date(ServiceAccess.access_date))
-            .order_by(func.date(ServiceAccess.access_date))
-            .all()
-        )
+        daily_services = await _rollup_series(db, "accesses", start_date)
         
         # Service outcomes
-        outcomes = (
-            db.query(
-                ServiceAccess.outcome,
-                func.count(ServiceAccess.id).label("count")
-            )
-            .filter(ServiceAccess.access_date >= start_date)
-            .group_by(ServiceAccess.outcome)
-            .all()
-        )
+        outcomes = await _rollup_breakdown(db, "access_by_outcome", start_date)
         
         # Contact method breakdown
-        contact_methods = (
-            db.query(
-                ServiceAccess.contact_method,
-                func.count(ServiceAccess.id).label("count")
-            )
-            .filter(ServiceAccess.access_date >= start_date)
-            .group_by(ServiceAccess.contact_method)
-            .all()
-        )
+        contact_methods = await _rollup_breakdown(db, "access_by_contact_method", start_date)
         
         return {
             "daily_service_accesses": [
-                {"date": str(date), "count": count}
-                for date, count in daily_services
+                {"date": str(bucket.date()), "count": count}
+                for bucket, count in daily_services
             ],
             "outcomes": [
                 {"outcome": outcome or "unknown", "count": count}
@@ -263,36 +259,32 @@ async def get_service_impact(
 @router.get("/impact/categories")
 async def get_category_impact(
     days: int = Query(30, ge=1, le=365),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get impact metrics by service category.
     """
     try:
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = _window_start(days)
         
         # Services accessed by category
-        category_access = (
-            db.query(
-                SocialService.category,
-                func.count(ServiceAccess.id).label("access_count"),
-                func.count(func.distinct(ServiceAccess.user_id)).label("unique_users")
-            )
-            .join(ServiceAccess, ServiceAccess.service_id == SocialService.id)
-            .filter(ServiceAccess.access_date >= start_date)
-            .group_by(SocialService.category)
-            .order_by(func.count(ServiceAccess.id).desc())
-            .all()
-        )
+        category_access = await _rollup_breakdown(db, "access_by_category", start_date)
+        
+        # Distinct users per category (one category_user row per user, category and day)
+        unique_users = dict((await db.execute(
+            select(AnalyticsRollup.dim1, func.count(func.distinct(AnalyticsRollup.dim2)))
+            .where(*_window("category_user", start_date))
+            .group_by(AnalyticsRollup.dim1)
+        )).all())
         
         return {
             "categories": [
                 {
                     "category": category,
                     "total_accesses": access_count,
-                    "unique_users_served": unique_users
+                    "unique_users_served": unique_users.get(category, 0)
                 }
-                for category, access_count, unique_users in category_access
+                for category, access_count in category_access
             ]
         }
     
@@ -303,6 +295,83 @@ async def get_category_impact(
         )
 
 
+@router.get("/impact/tools")
+async def get_tool_impact(
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get agent tool usage: call counts, latency and result sizes.
+    """
+    try:
+        start_date = _window_start(days)
+        
+        tool_usage = (await db.execute(
+            select(
+                ToolInvocation.tool_name,
+                func.count(ToolInvocation.id).label("calls"),
+                func.avg(ToolInvocation.duration_ms).label("avg_duration_ms"),
+                func.avg(ToolInvocation.result_count).label("avg_results")
+            )
+            .where(ToolInvocation.created_at >= start_date)
+            .group_by(ToolInvocation.tool_name)
+            .order_by(func.count(ToolInvocation.id).desc())
+        )).all()
+        
+        return {
+            "tools": [
+                {
+                    "tool": tool_name,
+                    "calls": calls,
+                    "avg_duration_ms": round(avg_duration_ms, 2) if avg_duration_ms is not None else None,
+                    "avg_results": round(avg_results, 2) if avg_results is not None else None
+                }
+                for tool_name, calls, avg_duration_ms, avg_results in tool_usage
+            ]
+        }
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving tool impact: {str(e)}"
+        )
+
+
+@router.get("/timeseries")
+async def get_timeseries(
+    metric: str = Query("messages", pattern="^(messages|feedback|helpful|accesses)$"),
+    granularity: str = Query(HOUR, pattern="^(day|hour)$"),
+    days: int = Query(2, ge=1, le=365),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a headline counter per day or hour.
+    
+    Args:
+        metric: messages, feedback, helpful or accesses
+        granularity: day or hour
+        days: Number of recent days to include
+    """
+    try:
+        start_date = _window_start(days, granularity)
+        series = await _rollup_series(db, metric, start_date, granularity)
+        
+        return {
+            "metric": metric,
+            "granularity": granularity,
+            "points": [
+                {"bucket": bucket.isoformat(), "value": value}
+                for bucket, value in series
+            ]
+        }
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving timeseries: {str(e)}"
+        )
+
+
 @router.post("/service-access")
 async def log_service_access(
     user_id: str,
@@ -311,12 +380,14 @@ async def log_service_access(
     contact_method: str,
     outcome: Optional[str] = None,
     notes: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Log that a user accessed a service.
     
-    This tracks successful resource connections for impact metrics.
+    This tracks successful resource connections for impact metrics. With
+    WRITE_BEHIND_ENABLED the record is queued for a batched insert, so no
+    access_id is returned.
     
     Args:
         user_id: User identifier
@@ -335,8 +406,16 @@ async def log_service_access(
             outcome=outcome,
             notes=notes
         )
+        if settings.WRITE_BEHIND_ENABLED:
+            get_write_buffer().enqueue(access)
+            return {
+                "success": True,
+                "message": "Service access queued",
+                "access_id": None
+            }
+        
         db.add(access)
-        db.commit()
+        await db.commit()
         
         return {
             "success": True,
@@ -345,13 +424,54 @@ async def log_service_access(
         }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error logging service access: {str(e)}"
         )
 
 
+@router.get("/write-buffer")
+async def get_write_buffer_stats():
+    """
+    Get write-behind buffer queue depth and flush latency.
+    """
+    return get_write_buffer().stats()
+
+
+@router.get("/catalog-snapshot")
+async def get_catalog_snapshot_stats():
+    """
+    Get the in-memory catalog snapshot's version, size and memory use.
+    """
+    return get_catalog().stats()
+
+
+@router.get("/intent-router")
+async def get_intent_router_stats():
+    """
+    Get the share of chat messages answered without the LLM and the latency saved.
+    """
+    return get_intent_router().stats()
+
+
+@router.get("/tool-memo")
+async def get_tool_memo_stats_endpoint(user_id: Optional[str] = Query(None)):
+    """
+    Get agent tool executions and iterations saved by per-run memoization.
+    
+    Args:
+        user_id: Only this user's conversation
+    """
+    stats = get_tool_memo_stats()
+    if user_id is None:
+        return stats.stats()
+    conversation = stats.conversation(user_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="No agent runs recorded for this user")
+    return {"user_id": user_id, **conversation}
+
+
 @router.get("/health")
 async def analytics_health():
     """Health check for analytics API"""
@@ -362,6 +482,12 @@ async def analytics_health():
             "dashboard": "/api/analytics/stats",
             "user_impact": "/api/analytics/impact/users",
             "service_impact": "/api/analytics/impact/services",
-            "category_impact": "/api/analytics/impact/categories"
+            "category_impact": "/api/analytics/impact/categories",
+            "tool_impact": "/api/analytics/impact/tools",
+            "timeseries": "/api/analytics/timeseries",
+            "write_buffer": "/api/analytics/write-buffer",
+            "catalog_snapshot": "/api/analytics/catalog-snapshot",
+            "intent_router": "/api/analytics/intent-router",
+            "tool_memo": "/api/analytics/tool-memo"
         }
     }
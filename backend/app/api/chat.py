@@ -2,13 +2,21 @@
 Chat API endpoints for the AI agent
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
+from app.db.models import ChatMessage
+from app.db.write_behind import get_write_buffer
+from app.db.rollups import retract_messages
 from app.agents.resource_agent import get_agent
 from datetime import datetime
+import asyncio
+import json
 
 router = APIRouter()
 
@@ -31,6 +39,7 @@ class UserContext(BaseModel):
     longitude: Optional[float] = None
     eligibility_info: Optional[Dict[str, Any]] = None
     accessibility_needs: Optional[List[str]] = None
+    language: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
@@ -48,6 +57,8 @@ class ChatResponse(BaseModel):
     user_id: str
     tools_used: List[str] = []
     error: Optional[str] = None
+    cached: bool = False
+    routed: bool = False  # Answered by the intent router without the LLM
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -76,8 +87,8 @@ async def send_message(request: ChatRequest):
         if request.user_context:
             user_context = request.user_context.model_dump(exclude_none=True)
         
-        # Process the message
-        result = agent.process_message(
+        # Process the message without blocking the event loop
+        result = await agent.aprocess_message(
             user_message=request.message,
             user_id=request.user_id,
             user_context=user_context
@@ -88,7 +99,9 @@ async def send_message(request: ChatRequest):
             message=result["message"],
             user_id=result["user_id"],
             tools_used=result.get("tools_used", []),
-            error=result.get("error")
+            error=result.get("error"),
+            cached=result.get("cached", False),
+            routed=result.get("routed", False)
         )
     
     except Exception as e:
@@ -98,11 +111,68 @@ async def send_message(request: ChatRequest):
         )
 
 
+def _stream_events(request: ChatRequest):
+    """Agent progress events for a chat request"""
+    user_context = None
+    if request.user_context:
+        user_context = request.user_context.model_dump(exclude_none=True)
+    
+    return get_agent().astream_message(
+        user_message=request.message,
+        user_id=request.user_id,
+        user_context=user_context
+    )
+
+
+@router.post("/stream")
+async def stream_message(request: ChatRequest):
+    """
+    Send a message to the AI agent and stream the response as Server-Sent Events.
+    
+    Emits `tool_start`/`tool_end` events while the agent works, `token`
+    events as the reply is generated, and a final `done` (or `error`) event
+    carrying the same fields as /send. The final message is saved to history.
+    """
+    async def event_source():
+        async for event in _stream_events(request):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+        }
+    )
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    WebSocket chat: send ChatRequest JSON objects, receive the same events
+    as /stream as JSON messages. The connection stays open across turns.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_text()
+            try:
+                request = ChatRequest.model_validate_json(payload)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "success": False, "error": str(e)})
+                continue
+            
+            async for event in _stream_events(request):
+                await websocket.send_text(json.dumps(event, default=str))
+    except WebSocketDisconnect:
+        pass
+
+
 @router.get("/history/{user_id}", response_model=List[ConversationMessage])
 async def get_chat_history(
     user_id: str,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    limit: int = 10
 ):
     """
     Retrieve conversation history for a user.
@@ -121,7 +191,7 @@ async def get_chat_history(
     
     try:
         agent = get_agent()
-        history = agent.get_conversation_history(user_id, limit)
+        history = await agent.aget_conversation_history(user_id, limit)
         
         return [
             ConversationMessage(**msg)
@@ -138,7 +208,7 @@ async def get_chat_history(
 @router.delete("/history/{user_id}")
 async def clear_chat_history(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Clear chat history for a user.
@@ -150,14 +220,17 @@ async def clear_chat_history(
         Confirmation message
     """
     try:
-        from app.db.models import ChatMessage
+        # Queued messages would otherwise be inserted after the delete
+        buffer = get_write_buffer()
+        if buffer.has_pending(user_id):
+            await asyncio.to_thread(buffer.flush)
         
-        deleted_count = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.user_id == user_id)
-            .delete()
+        await db.run_sync(retract_messages, ChatMessage.user_id == user_id)
+        result = await db.execute(
+            delete(ChatMessage).where(ChatMessage.user_id == user_id)
         )
-        db.commit()
+        await db.commit()
+        deleted_count = result.rowcount
         
         return {
             "success": True,
@@ -165,7 +238,7 @@ async def clear_chat_history(
         }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error clearing history: {str(e)}"
@@ -177,7 +250,7 @@ async def submit_feedback(
     message_id: int,
     helpful: bool,
     feedback_text: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Submit feedback on a specific message from the agent.
@@ -191,14 +264,12 @@ async def submit_feedback(
         Confirmation of feedback submission
     """
     try:
-        from app.db.models import ChatMessage
-        
-        message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+        message = await db.get(ChatMessage, message_id)
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
         
         message.helpful = helpful
-        db.commit()
+        await db.commit()
         
         return {
             "success": True,
@@ -209,7 +280,7 @@ async def submit_feedback(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error submitting feedback: {str(e)}"
@@ -225,6 +296,8 @@ async def test_chat():
         "status": "Chat API is running",
         "endpoints": {
             "send_message": "POST /api/chat/send",
+            "stream_message": "POST /api/chat/stream",
+            "websocket": "WS /api/chat/ws",
             "get_history": "GET /api/chat/history/{user_id}",
             "clear_history": "DELETE /api/chat/history/{user_id}",
             "submit_feedback": "POST /api/chat/feedback/{message_id}"
@@ -2,13 +2,31 @@
 Resources API endpoints for CRUD operations on community services
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_async_db, AsyncSessionLocal, SessionLocal
 from app.db.models import SocialService
+from app.geo.nearby import find_nearby
+from app.geo.locations import get_location_index
+from app.search.trigram import PLACE, SERVICE, get_trigram_index
+from app.db.catalog_sync import on_service_saved, on_service_removed
+from app.db.catalog_snapshot import CatalogSnapshot, catalog_snapshot, snapshot_for
+from app.db.eligibility import candidate_positions, evaluate_batch
+from app.cache.search import get_search_cache
+from app.cache.serialized import dumps, get_service_encoder, service_dict
+from app.db.bulk_import import FORMATS, detect_format, import_services
 from datetime import datetime
+import asyncio
+import base64
+import binascii
+import csv
+import io
+import json
 
 router = APIRouter()
 
@@ -64,10 +82,24 @@ class ServiceResponse(BaseModel):
     created_at: Optional[datetime]
 
 
+class EligibilityBatchRequest(BaseModel):
+    """Schema for checking one user against many services"""
+    age: Optional[int] = Field(None, ge=0, le=130)
+    income_level: Optional[str] = None
+    residency: Optional[str] = None
+    category: Optional[str] = None
+    service_ids: Optional[List[int]] = Field(None, max_length=1000)
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_miles: float = Field(10.0, ge=0.1, le=50)
+    only_eligible: bool = False
+    limit: int = Field(50, ge=1, le=500)
+
+
 @router.post("/", response_model=ServiceResponse)
 async def create_service(
     service: ServiceCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new community service resource.
@@ -81,25 +113,208 @@ async def create_service(
     try:
         new_service = SocialService(**service.model_dump())
         db.add(new_service)
-        db.commit()
-        db.refresh(new_service)
+        await db.commit()
+        await db.refresh(new_service)
+        await asyncio.to_thread(on_service_saved, new_service)
         return new_service
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail=f"Error creating service: {str(e)}"
         )
 
 
+@router.post("/import")
+async def bulk_import_services(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or ndjson (defaults to the file extension)"),
+    dry_run: bool = False
+):
+    """
+    Bulk import services from a CSV or NDJSON file.
+    
+    Rows are validated like POST /, upserted on (name, address) in
+    chunks (an imported row replaces the matching service's fields), and
+    the search indexes are rebuilt once at the end. CSV
+    columns operating_hours, eligibility_criteria and services_provided
+    hold JSON (services_provided may also be a ";"-separated list).
+    
+    Returns:
+        Counts of processed, inserted, updated and invalid rows, with the
+        first validation errors by line number
+    """
+    fmt = format or detect_format(file.filename)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    
+    try:
+        # The upload is spooled to disk; parse it incrementally off the event loop
+        source = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        return await asyncio.to_thread(import_services, source, fmt, dry_run=dry_run)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error importing services: {str(e)}"
+        )
+    finally:
+        await file.close()
+
+
+def _encode_cursor(service_id: int) -> str:
+    """Opaque pagination cursor pointing just past a service ID"""
+    return base64.urlsafe_b64encode(json.dumps({"id": service_id}).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _paginate(query, skip: int, limit: int, cursor: Optional[str]):
+    """
+    Apply keyset pagination when a cursor is given, offset pagination otherwise.
+    Both page in ID order, so clients can switch from skip to cursor mid-way.
+    """
+    query = query.order_by(SocialService.id)
+    if cursor:
+        return query.where(SocialService.id > _decode_cursor(cursor)).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def _service_page(services: List[SocialService], limit: int) -> Response:
+    """
+    Encode a page of services, bypassing response_model validation.
+    
+    Full pages advertise the next page's cursor in the X-Next-Cursor header.
+    """
+    headers = {}
+    if len(services) == limit:
+        headers["X-Next-Cursor"] = _encode_cursor(services[-1].id)
+    return Response(
+        content=get_service_encoder().encode_list(services),
+        media_type="application/json",
+        headers=headers
+    )
+
+
+# Rows fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = 500
+
+
+def _export_chunk(services: List[SocialService], fmt: str, header: bool) -> bytes:
+    """Serialize a batch of services as NDJSON lines or CSV rows"""
+    if fmt == "ndjson":
+        return b"".join(dumps(service_dict(service)) + b"\n" for service in services)
+    
+    records = [
+        ServiceResponse.model_validate(service, from_attributes=True).model_dump(mode="json")
+        for service in services
+    ]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(ServiceResponse.model_fields))
+    if header:
+        writer.writeheader()
+    for record in records:
+        # Nested values as JSON, the same encoding bulk import reads
+        writer.writerow({
+            key: json.dumps(value) if isinstance(value, (dict, list)) else value
+            for key, value in record.items()
+        })
+    return buffer.getvalue().encode("utf-8")
+
+
+@router.get("/export")
+async def export_services(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    active_only: bool = Query(True, description="Only export active services")
+):
+    """
+    Stream the service catalog as NDJSON or CSV.
+    
+    Rows are read through a server-side cursor in batches and written as
+    they arrive (the session only holds weak references to loaded rows),
+    so memory use does not grow with the catalog. The CSV
+    output can be fed back into POST /import.
+    """
+    query = select(SocialService).order_by(SocialService.id)
+    if active_only:
+        query = query.where(SocialService.is_active == True)
+    if category:
+        query = query.where(SocialService.category.ilike(f"%{category}%"))
+    
+    async def rows():
+        # A dedicated session, since the response outlives request dependencies
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            header = True
+            async for services in result.partitions():
+                yield _export_chunk(services, format, header)
+                header = False
+            if header and format == "csv":
+                yield _export_chunk([], format, header)
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=services.{format}"}
+    )
+
+
+# Maximum number of IDs accepted by the batch lookup
+MAX_BATCH_IDS = 100
+
+
+@router.get("/batch", response_model=List[ServiceResponse])
+async def get_services_batch(
+    ids: List[str] = Query(..., description="Service IDs, repeated (ids=1&ids=2) or comma-separated (ids=1,2)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get several services in one request.
+    
+    Services are returned in the order requested; unknown IDs are left out.
+    """
+    try:
+        service_ids = list(dict.fromkeys(
+            int(value) for part in ids for value in part.split(",") if value.strip()
+        ))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    if len(service_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    
+    try:
+        catalog = catalog_snapshot()
+        if catalog is not None:
+            services_by_id = {service_id: catalog.get(service_id) for service_id in service_ids}
+        else:
+            result = await db.execute(select(SocialService).where(SocialService.id.in_(service_ids)))
+            services_by_id = {service.id: service for service in result.scalars().all()}
+        
+        services = [services_by_id[service_id] for service_id in service_ids if services_by_id.get(service_id)]
+        return Response(content=get_service_encoder().encode_list(services), media_type="application/json")
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error retrieving services: {str(e)}"
+        )
+
+
 @router.get("/", response_model=List[ServiceResponse])
 async def list_services(
     category: Optional[str] = Query(None, description="Filter by category"),
     active_only: bool = Query(True, description="Only show active services"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     List all community services with optional filters.
@@ -107,21 +322,36 @@ async def list_services(
     Query Parameters:
     - category: Filter by service category (shelter, food, health, employment, etc.)
     - active_only: Show only active services (default: true)
-    - skip: Number of results to skip (pagination)
+    - skip: Number of results to skip (offset pagination)
     - limit: Number of results to return (max 100)
+    - cursor: Keyset pagination cursor; takes precedence over skip
+    
+    Full pages carry an X-Next-Cursor header for fetching the next page.
     """
     try:
-        query = db.query(SocialService)
+        catalog = catalog_snapshot()
+        if catalog is not None:
+            services = catalog.page(
+                catalog.mask(active_only=active_only, category=category),
+                limit,
+                skip=skip,
+                after_id=_decode_cursor(cursor) if cursor else None
+            )
+            return _service_page(services, limit)
+        
+        query = select(SocialService)
         
         if active_only:
-            query = query.filter(SocialService.is_active == True)
+            query = query.where(SocialService.is_active == True)
         
         if category:
-            query = query.filter(SocialService.category.ilike(f"%{category}%"))
+            query = query.where(SocialService.category.ilike(f"%{category}%"))
         
-        services = query.offset(skip).limit(limit).all()
-        return services
+        result = await db.execute(_paginate(query, skip, limit, cursor))
+        return _service_page(result.scalars().all(), limit)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -132,7 +362,7 @@ async def list_services(
 @router.get("/{service_id}", response_model=ServiceResponse)
 async def get_service(
     service_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get detailed information about a specific service.
@@ -141,10 +371,14 @@ async def get_service(
         service_id: The ID of the service
     """
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        catalog = catalog_snapshot()
+        if catalog is not None:
+            service = catalog.get(service_id)
+        else:
+            service = await db.get(SocialService, service_id)
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
-        return service
+        return Response(content=get_service_encoder().encode(service), media_type="application/json")
     
     except HTTPException:
         raise
@@ -159,7 +393,7 @@ async def get_service(
 async def update_service(
     service_id: int,
     service_update: ServiceUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update a community service resource.
@@ -169,23 +403,25 @@ async def update_service(
         service_update: Fields to update
     """
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = await db.get(SocialService, service_id)
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
         
+        previous_location = (service.latitude, service.longitude)
         update_data = service_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(service, field, value)
         
         service.last_verified = datetime.utcnow()
-        db.commit()
-        db.refresh(service)
+        await db.commit()
+        await db.refresh(service)
+        await asyncio.to_thread(on_service_saved, service, previous_location)
         return service
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail=f"Error updating service: {str(e)}"
@@ -195,7 +431,7 @@ async def update_service(
 @router.delete("/{service_id}")
 async def delete_service(
     service_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete a service (soft delete - marks as inactive).
@@ -204,19 +440,20 @@ async def delete_service(
         service_id: The ID of the service to delete
     """
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = await db.get(SocialService, service_id)
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
         
         service.is_active = False
-        db.commit()
+        await db.commit()
+        await asyncio.to_thread(on_service_removed, service)
         
         return {"success": True, "message": f"Service {service_id} marked as inactive"}
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail=f"Error deleting service: {str(e)}"
@@ -228,7 +465,8 @@ async def get_services_by_category(
     category_name: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all services in a specific category.
@@ -242,26 +480,35 @@ async def get_services_by_category(
     - legal
     - substance_abuse
     - youth
+    
+    Pages with skip or, for deep pages, with the X-Next-Cursor cursor.
     """
     try:
-        services = (
-            db.query(SocialService)
-            .filter(
+        catalog = catalog_snapshot()
+        if catalog is not None:
+            services = catalog.page(
+                catalog.mask(category=category_name),
+                limit,
+                skip=skip,
+                after_id=_decode_cursor(cursor) if cursor else None
+            )
+        else:
+            query = select(SocialService).where(
                 (SocialService.category.ilike(f"%{category_name}%")) &
                 (SocialService.is_active == True)
             )
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+            result = await db.execute(_paginate(query, skip, limit, cursor))
+            services = result.scalars().all()
         
-        if not services:
+        # An empty first page means the category has no services; an empty
+        # later page is just the end of the category
+        if not services and not skip and not cursor:
             raise HTTPException(
                 status_code=404,
                 detail=f"No services found in category: {category_name}"
             )
         
-        return services
+        return _service_page(services, limit)
     
     except HTTPException:
         raise
@@ -275,7 +522,7 @@ async def get_services_by_category(
 @router.post("/{service_id}/verify")
 async def verify_service(
     service_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Mark a service as recently verified/updated.
@@ -284,12 +531,13 @@ async def verify_service(
         service_id: The ID of the service
     """
     try:
-        service = db.query(SocialService).filter(SocialService.id == service_id).first()
+        service = await db.get(SocialService, service_id)
         if not service:
             raise HTTPException(status_code=404, detail="Service not found")
         
         service.last_verified = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        await asyncio.to_thread(on_service_saved, service)
         
         return {
             "success": True,
@@ -300,7 +548,7 @@ async def verify_service(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail=f"Error verifying service: {str(e)}"
@@ -312,8 +560,7 @@ async def search_nearby(
     latitude: float = Query(...),
     longitude: float = Query(...),
     radius_miles: float = Query(5.0, ge=0.1, le=50),
-    category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    category: Optional[str] = None
 ):
     """
     Search for services near a specific location.
@@ -325,82 +572,179 @@ async def search_nearby(
         category: Optional category filter
     """
     try:
-        # Get all active services
-        query = db.query(SocialService).filter(SocialService.is_active == True)
+        def nearby_services(catalog: Optional[CatalogSnapshot], session: Optional[Session]) -> List[Dict[str, Any]]:
+            def compute(lat: float, lon: float, radius: float, limit: Optional[int]):
+                if catalog is not None:
+                    matches = catalog.nearby(catalog.mask(category=category), lat, lon, radius, limit=limit)
+                else:
+                    query = session.query(SocialService).filter(SocialService.is_active == True)
+                    
+                    if category:
+                        query = query.filter(SocialService.category.ilike(f"%{category}%"))
+                    
+                    matches = find_nearby(query, lat, lon, radius, limit=limit)
+                
+                return [
+                    (ServiceResponse.model_validate(service, from_attributes=True).model_dump(mode="json"),
+                     service.latitude, service.longitude)
+                    for service, _ in matches
+                ]
+            
+            # Shared with other requests from the same geohash cell, re-ranked for this origin
+            hits = get_search_cache().nearby(
+                "api_nearby", latitude, longitude, radius_miles,
+                {"category": category}, compute
+            )
+            return [payload for payload, _ in hits]
         
-        if category:
-            query = query.filter(SocialService.category.ilike(f"%{category}%"))
+        def nearby_services_sync() -> List[Dict[str, Any]]:
+            catalog = catalog_snapshot()
+            if catalog is not None:
+                return nearby_services(catalog, None)
+            # The geo helpers work on ORM queries, so use a sync session
+            session = SessionLocal()
+            try:
+                return nearby_services(None, session)
+            finally:
+                session.close()
         
-        services = query.all()
+        # The search cache may call Redis, so keep it off the event loop
+        payloads = await asyncio.to_thread(nearby_services_sync)
+        # Payloads were built from ServiceResponse, so skip re-validating them
+        return Response(content=dumps(payloads), media_type="application/json")
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error searching nearby services: {str(e)}"
+        )
+
+
+@router.post("/eligibility")
+async def check_eligibility_batch(
+    request: EligibilityBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Check a user's eligibility for many services in one pass.
+    
+    Candidates are the active services matching the optional category,
+    service_ids and location filters. Rules come precompiled from each
+    service's eligibility criteria and are evaluated together.
+    
+    Returns:
+        Counts of services evaluated and eligible, and per-service results
+        (eligible, barriers), services without barriers first
+    """
+    try:
+        def evaluate(session: Session) -> Dict[str, Any]:
+            criteria = [SocialService.is_active == True]
+            if request.category:
+                criteria.append(SocialService.category.ilike(f"%{request.category}%"))
+            if request.service_ids:
+                criteria.append(SocialService.id.in_(request.service_ids))
+            catalog = snapshot_for(session, *criteria)
+            
+            located = request.latitude is not None and request.longitude is not None
+            positions = candidate_positions(
+                catalog,
+                service_ids=request.service_ids,
+                category=request.category,
+                latitude=request.latitude if located else None,
+                longitude=request.longitude if located else None,
+                radius_miles=request.radius_miles
+            )
+            return evaluate_batch(
+                catalog, positions,
+                age=request.age,
+                income_level=request.income_level,
+                residency=request.residency,
+                only_eligible=request.only_eligible,
+                limit=request.limit
+            )
         
-        # Calculate distances and filter
-        import math
-        nearby = []
+        if catalog_snapshot() is not None:
+            return evaluate(None)
+        return await db.run_sync(evaluate)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error checking eligibility: {str(e)}"
+        )
+
+
+@router.get("/search/fuzzy")
+async def fuzzy_search(
+    query: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Typo-tolerant search over service names and place names.
+    
+    Matches misspellings and alternate transliterations (e.g. "Secundrabad",
+    "Begampet") using the in-memory trigram index.
+    
+    Args:
+        query: Service or place name as typed
+        limit: Maximum number of services and of places to return
+    
+    Returns:
+        Matching services and places, best match first, with a 0-1 score
+    """
+    try:
+        index = get_trigram_index()
+        service_matches = index.search(query, kind=SERVICE, limit=limit)
+        places = index.search(query, kind=PLACE, limit=limit)
         
-        for service in services:
-            if service.latitude and service.longitude:
-                # Haversine formula
-                lat1_rad = math.radians(latitude)
-                lat2_rad = math.radians(service.latitude)
-                delta_lat = math.radians(service.latitude - latitude)
-                delta_lon = math.radians(service.longitude - longitude)
-                
-                a = math.sin(delta_lat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2)**2
-                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-                distance_miles = 3959 * c  # Earth's radius in miles
-                
-                if distance_miles <= radius_miles:
-                    nearby.append((service, distance_miles))
+        ids = [match["id"] for match in service_matches]
+        catalog = catalog_snapshot()
+        if catalog is not None:
+            services_by_id = {service_id: catalog.get(service_id) for service_id in ids}
+        else:
+            result = await db.execute(select(SocialService).where(SocialService.id.in_(ids)))
+            services_by_id = {service.id: service for service in result.scalars().all()}
         
-        # Sort by distance
-        nearby.sort(key=lambda x: x[1])
+        services = []
+        for match in service_matches:
+            service = services_by_id.get(match["id"])
+            if service is not None:
+                services.append({
+                    **ServiceResponse.model_validate(service, from_attributes=True).model_dump(mode="json"),
+                    "score": match["score"]
+                })
         
-        return [service for service, _ in nearby]
+        return {"services": services, "places": places}
     
     except Exception as e:
         raise HTTPException(
             status_code=400,
-            detail=f"Error searching nearby services: {str(e)}"
+            detail=f"Error in fuzzy search: {str(e)}"
         )
 
 
 @router.get("/search/locations")
 async def search_locations(
     query: str = Query(..., min_length=1, max_length=100),
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100)
 ):
     """
     Search for available locations (cities) where services are available.
     
+    Served from the precomputed location index, so it is cheap enough to
+    call on every keystroke.
+    
     Args:
         query: Search query (e.g., "Hyderabad", "Delhi")
+        limit: Maximum number of locations to return
     
     Returns:
-        List of available cities/locations with coordinates
+        List of available cities/locations with centroid coordinates,
+        bounding box and service counts per category
     """
     try:
-        # Extract unique cities/locations from service addresses
-        services = db.query(SocialService).filter(SocialService.is_active == True).all()
-        
-        locations = {}
-        for service in services:
-            if service.address and service.latitude and service.longitude:
-                # Extract city from address (simplified - usually after the last comma)
-                address_parts = service.address.split(',')
-                city = address_parts[-2].strip() if len(address_parts) > 1 else address_parts[0].strip()
-                
-                # Check if query matches city name (case insensitive)
-                if query.lower() in city.lower():
-                    if city not in locations:
-                        locations[city] = {
-                            "city": city,
-                            "latitude": service.latitude,
-                            "longitude": service.longitude,
-                            "service_count": 0
-                        }
-                    locations[city]["service_count"] += 1
-        
-        result = list(locations.values())
+        result = get_location_index().search(query, limit=limit)
         return result if result else [{"message": "No locations found matching your search"}]
     
     except Exception as e:
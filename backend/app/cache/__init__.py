@@ -0,0 +1,6 @@
+"""
+Initialize cache module
+"""
+from . import backend, responses, search, serialized
+
+__all__ = ['backend', 'responses', 'search', 'serialized']
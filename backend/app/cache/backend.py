@@ -0,0 +1,222 @@
+"""
+Key-value cache backends: Redis when reachable, in-process memory otherwise
+"""
+
+from typing import Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+from app.config import settings
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Minimal cache interface used by the response and search caches.
+
+    Values are strings; sets are used as invalidation tags and capped lists
+    as small per-bucket indexes.
+    """
+
+    name = "base"
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: str, ttl: int):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def add_to_set(self, key: str, members: Iterable[str], ttl: int):
+        raise NotImplementedError
+
+    def set_members(self, key: str) -> Set[str]:
+        raise NotImplementedError
+
+    def push_capped(self, key: str, value: str, max_length: int, ttl: int):
+        """Prepend to a list, keeping only the newest max_length items"""
+        raise NotImplementedError
+
+    def list_items(self, key: str) -> List[str]:
+        raise NotImplementedError
+
+    def clear(self, prefix: str):
+        """Delete every key starting with prefix"""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    Thread-safe in-process cache with per-key expiry (used in tests and without Redis).
+
+    Expired keys are dropped when read and by a sweep at most every
+    SWEEP_INTERVAL_SECONDS on writes; past max_entries the least recently
+    used keys are evicted, so per-query keys cannot grow without bound.
+
+    Args:
+        max_entries: Keys kept at most
+    """
+
+    name = "memory"
+
+    SWEEP_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, max_entries: int = settings.MEMORY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value: object, ttl: int):
+        """Write a key as most recently used, then sweep and evict as needed (lock held)"""
+        now = time.monotonic()
+        self._data[key] = (now + ttl, value)
+        self._data.move_to_end(key)
+        if now - self._swept_at >= self.SWEEP_INTERVAL_SECONDS:
+            self._swept_at = now
+            for expired in [stale for stale, (expires_at, _) in self._data.items() if expires_at < now]:
+                del self._data[expired]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._live(key)
+            return value if isinstance(value, str) else None
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def add_to_set(self, key: str, members: Iterable[str], ttl: int):
+        with self._lock:
+            current = self._live(key)
+            current = set(current) if isinstance(current, set) else set()
+            current.update(members)
+            self._store(key, current, ttl)
+
+    def set_members(self, key: str) -> Set[str]:
+        with self._lock:
+            value = self._live(key)
+            return set(value) if isinstance(value, set) else set()
+
+    def push_capped(self, key: str, value: str, max_length: int, ttl: int):
+        with self._lock:
+            current = self._live(key)
+            items = [value] + (current if isinstance(current, list) else [])
+            self._store(key, items[:max_length], ttl)
+
+    def list_items(self, key: str) -> List[str]:
+        with self._lock:
+            value = self._live(key)
+            return list(value) if isinstance(value, list) else []
+
+    def clear(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+
+class RedisCache(CacheBackend):
+    """Redis-backed cache shared by all workers"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return self.client.mget(keys) if keys else []
+
+    def set(self, key: str, value: str, ttl: int):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+    def add_to_set(self, key: str, members: Iterable[str], ttl: int):
+        members = list(members)
+        if not members:
+            return
+        pipe = self.client.pipeline()
+        pipe.sadd(key, *members)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def set_members(self, key: str) -> Set[str]:
+        return self.client.smembers(key)
+
+    def push_capped(self, key: str, value: str, max_length: int, ttl: int):
+        pipe = self.client.pipeline()
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, max_length - 1)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def list_items(self, key: str) -> List[str]:
+        return self.client.lrange(key, 0, -1)
+
+    def clear(self, prefix: str):
+        keys = list(self.client.scan_iter(match=f"{prefix}*", count=500))
+        for start in range(0, len(keys), 500):
+            self.client.delete(*keys[start:start + 500])
+
+
+def _create_backend() -> CacheBackend:
+    """Pick a backend per CACHE_BACKEND ("redis", "memory" or "auto")"""
+    if settings.CACHE_BACKEND in ("redis", "auto"):
+        try:
+            backend = RedisCache(settings.REDIS_URL)
+            backend.client.ping()
+            logger.info("Using Redis cache backend")
+            return backend
+        except Exception as e:
+            if settings.CACHE_BACKEND == "redis":
+                raise
+            logger.warning(f"Redis unavailable, using in-process cache: {e}")
+    return MemoryCache()
+
+
+# Global cache backend instance
+_cache_instance = None
+
+
+def get_cache() -> CacheBackend:
+    """Get or create the global cache backend"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = _create_backend()
+    return _cache_instance
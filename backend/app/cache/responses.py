@@ -0,0 +1,226 @@
+"""
+Response cache for repeated chat questions
+Entries are keyed on the normalized message plus the salient user context
+and are dropped when a service they mention changes
+"""
+
+from typing import Any, Dict, List, Optional, Set
+from app.cache.backend import CacheBackend, get_cache
+from app.config import settings
+import base64
+import hashlib
+import json
+import re
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "chat:resp:"
+
+# Tools whose results are user-specific or have side effects
+UNCACHEABLE_TOOLS = {"schedule_appointment", "schedule_appointments"}
+
+# Recent entries per context kept for similarity matching
+SIMILARITY_BUCKET_SIZE = 100
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[^\W_]+", message.lower()))
+
+
+def referenced_service_ids(intermediate_steps: List[tuple]) -> Set[int]:
+    """Collect service IDs that appear in tool results"""
+    ids = set()
+
+    def collect(value: Any):
+        if isinstance(value, dict):
+            for key in ("id", "service_id"):
+                if isinstance(value.get(key), int):
+                    ids.add(value[key])
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    for step in intermediate_steps or []:
+        if len(step) > 1:
+            collect(step[1])
+    return ids
+
+
+class ResponseCache:
+    """
+    Cache of agent answers shared by all users with the same context.
+
+    Lookups first try an exact key. When RESPONSE_CACHE_SIMILARITY is set,
+    a miss falls back to comparing the message embedding against recent
+    entries for the same context.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold: float = settings.RESPONSE_CACHE_SIMILARITY
+    ):
+        self._cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._embedding_backend = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self) -> CacheBackend:
+        if self._cache is None:
+            self._cache = get_cache()
+        return self._cache
+
+    def context_key(self, user_context: Optional[Dict[str, Any]]) -> str:
+        """Hash of the context fields that change the answer"""
+        context = user_context or {}
+        if context.get("latitude") is not None and context.get("longitude") is not None:
+            # ~1 km cell, so neighbours share entries
+            location = f"{round(context['latitude'], 2)},{round(context['longitude'], 2)}"
+        else:
+            location = normalize_message(context.get("location") or "")
+
+        salient = [
+            location,
+            sorted(normalize_message(need) for need in context.get("needs") or []),
+            (context.get("language") or "en").lower(),
+            context.get("eligibility_info") or {},
+            sorted(context.get("accessibility_needs") or []),
+        ]
+        encoded = json.dumps(salient, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+    def _entry_key(self, context_key: str, normalized: str) -> str:
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:24]
+        return f"{PREFIX}{context_key}:{digest}"
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        if self._embedding_backend is None:
+            from app.search.embeddings import get_embedding_backend
+            self._embedding_backend = get_embedding_backend()
+        vector = np.asarray(self._embedding_backend.embed_query(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, message: str, user_context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached result for the message, or None on a miss.
+
+        Cache errors are logged and treated as misses.
+        """
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        try:
+            context_key = self.context_key(user_context)
+            normalized = normalize_message(message)
+            raw = self.cache.get(self._entry_key(context_key, normalized))
+
+            if raw is None and self.similarity_threshold > 0:
+                raw = self._lookup_similar(context_key, normalized)
+
+            if raw is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+
+    def _lookup_similar(self, context_key: str, normalized: str) -> Optional[str]:
+        bucket = self.cache.list_items(f"{PREFIX}bucket:{context_key}")
+        if not bucket:
+            return None
+
+        entries = [json.loads(item) for item in bucket]
+        vectors = np.stack([
+            np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float16).astype(np.float32)
+            for entry in entries
+        ])
+        scores = vectors @ self._embed(normalized)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self.cache.get(entries[best]["key"])
+
+    def store(
+        self,
+        message: str,
+        user_context: Optional[Dict[str, Any]],
+        result: Dict[str, Any],
+        intermediate_steps: List[tuple]
+    ):
+        """Cache a successful agent result, tagged with the services it mentions"""
+        if not settings.RESPONSE_CACHE_ENABLED or not result.get("success"):
+            return
+        if UNCACHEABLE_TOOLS & set(result.get("tools_used") or []):
+            return
+        try:
+            context_key = self.context_key(user_context)
+            normalized = normalize_message(message)
+            key = self._entry_key(context_key, normalized)
+            service_ids = referenced_service_ids(intermediate_steps)
+
+            self.cache.set(key, json.dumps({
+                "message": result["message"],
+                "tools_used": result.get("tools_used", []),
+                "service_ids": sorted(service_ids),
+            }), self.ttl_seconds)
+
+            for service_id in service_ids:
+                self.cache.add_to_set(f"{PREFIX}svc:{service_id}", [key], self.ttl_seconds)
+
+            if self.similarity_threshold > 0:
+                vector = self._embed(normalized).astype(np.float16).tobytes()
+                self.cache.push_capped(
+                    f"{PREFIX}bucket:{context_key}",
+                    json.dumps({"key": key, "vector": base64.b64encode(vector).decode("ascii")}),
+                    SIMILARITY_BUCKET_SIZE,
+                    self.ttl_seconds
+                )
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    def invalidate_service(self, service_id: int):
+        """Drop every cached response that mentioned the service"""
+        try:
+            tag = f"{PREFIX}svc:{service_id}"
+            keys = self.cache.set_members(tag)
+            self.cache.delete(tag, *keys)
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed for service {service_id}: {e}")
+
+    def clear(self):
+        """Drop all cached responses (e.g. after a bulk catalog change)"""
+        try:
+            self.cache.clear(PREFIX)
+        except Exception as e:
+            logger.warning(f"Response cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.cache.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Global response cache instance
+_response_cache_instance = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the global response cache"""
+    global _response_cache_instance
+    if _response_cache_instance is None:
+        _response_cache_instance = ResponseCache()
+    return _response_cache_instance
@@ -0,0 +1,260 @@
+"""
+Result cache for nearby and category searches
+Nearby searches are quantized to geohash cells so users a few hundred meters
+apart share an entry; each request then re-ranks the entry by its own distance
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.cache.backend import CacheBackend, get_cache
+from app.config import settings
+from app.geo import geohash
+from app.geo.distance import bounding_box, haversine_miles
+import bisect
+import hashlib
+import json
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "search:"
+
+# Searches are computed for the next radius up this ladder
+RADIUS_BUCKETS = [0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0]
+
+# Entries are tagged with these coarse cells (~24 x 12 miles) for invalidation
+TAG_PRECISION = 4
+MAX_TAG_CELLS = 256
+GLOBAL_TAG = f"{PREFIX}tag:all"
+
+# Candidates kept per entry; beyond this the entry only covers the nearest ones
+MAX_CANDIDATES = 300
+
+# (payload, latitude, longitude) for each candidate, nearest to the origin first
+Candidate = Tuple[Dict[str, Any], float, float]
+NearbyCompute = Callable[[float, float, float, Optional[int]], List[Candidate]]
+
+
+def radius_bucket(radius_miles: float) -> float:
+    """Smallest ladder radius that is at least radius_miles"""
+    index = bisect.bisect_left(RADIUS_BUCKETS, radius_miles)
+    if index < len(RADIUS_BUCKETS):
+        return RADIUS_BUCKETS[index]
+    return float(np.ceil(radius_miles / 50.0) * 50.0)
+
+
+def cell_precision(radius_miles: float) -> int:
+    """Geohash precision whose cells are small next to the search radius"""
+    if radius_miles <= 1.0:
+        return 7  # ~0.1 mile cells
+    if radius_miles <= 5.0:
+        return 6  # ~0.75 x 0.4 mile cells
+    if radius_miles <= 25.0:
+        return 5  # ~3 mile cells
+    return 4
+
+
+class SearchResultCache:
+    """
+    Shared cache of search results with location-based invalidation.
+
+    A nearby entry holds every match within the bucketed radius plus the
+    cell's half-diagonal of the cell center, which is a superset of the
+    matches for any origin inside the cell.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        ttl_seconds: int = settings.SEARCH_CACHE_TTL_SECONDS
+    ):
+        self._cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self) -> CacheBackend:
+        if self._cache is None:
+            self._cache = get_cache()
+        return self._cache
+
+    def _key(self, namespace: str, parts: List[Any]) -> str:
+        encoded = json.dumps(parts, sort_keys=True, default=str)
+        return f"{PREFIX}{namespace}:{hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:24]}"
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"Search cache lookup failed: {e}")
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def _write(self, key: str, entry: Dict[str, Any], tags: List[str]):
+        try:
+            self.cache.set(key, json.dumps(entry, default=str), self.ttl_seconds)
+            for tag in tags:
+                self.cache.add_to_set(tag, [key], self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Search cache store failed: {e}")
+
+    def nearby(
+        self,
+        namespace: str,
+        latitude: float,
+        longitude: float,
+        radius_miles: float,
+        filters: Dict[str, Any],
+        compute: NearbyCompute,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Cached radius search, nearest first.
+
+        Args:
+            namespace: Separates callers whose payloads differ
+            latitude: Search origin latitude
+            longitude: Search origin longitude
+            radius_miles: Search radius in miles
+            filters: Other parameters that change the result (category, keywords)
+            compute: Runs the search as compute(lat, lon, radius, limit) and
+                returns candidates nearest first
+            limit: Maximum number of results
+
+        Returns:
+            (payload, distance_miles) pairs for the given origin
+        """
+        if not settings.SEARCH_CACHE_ENABLED:
+            return self._rank(compute(latitude, longitude, radius_miles, limit), latitude, longitude, radius_miles, limit)
+
+        bucket = radius_bucket(radius_miles)
+        cell = geohash.encode(latitude, longitude, cell_precision(bucket))
+        key = self._key(namespace, [cell, bucket, filters])
+
+        entry = self._read(key)
+        if entry is None:
+            center_lat, center_lon = geohash.center(cell)
+            covered_radius = bucket + geohash.half_diagonal_miles(cell)
+            candidates = compute(center_lat, center_lon, covered_radius, MAX_CANDIDATES + 1)
+
+            entry = {"center": [center_lat, center_lon], "covered_radius": covered_radius, "candidates": candidates}
+            if len(candidates) > MAX_CANDIDATES:
+                # Truncated: only the nearest MAX_CANDIDATES to the center are known
+                candidates = candidates[:MAX_CANDIDATES]
+                entry["candidates"] = candidates
+                entry["covered_radius"] = haversine_miles(center_lat, center_lon, candidates[-1][1], candidates[-1][2])
+            self._write(key, entry, self._tags(center_lat, center_lon, covered_radius))
+
+        results = self._rank(entry["candidates"], latitude, longitude, radius_miles, limit)
+        if self._complete(entry, results, latitude, longitude, radius_miles, limit):
+            return results
+
+        return self._rank(compute(latitude, longitude, radius_miles, limit), latitude, longitude, radius_miles, limit)
+
+    def _rank(
+        self,
+        candidates: List[Candidate],
+        latitude: float,
+        longitude: float,
+        radius_miles: float,
+        limit: Optional[int]
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        if not candidates:
+            return []
+        lats = np.array([candidate[1] for candidate in candidates], dtype=np.float64)
+        lons = np.array([candidate[2] for candidate in candidates], dtype=np.float64)
+        distances = haversine_miles(latitude, longitude, lats, lons)
+        order = [int(i) for i in np.argsort(distances, kind="stable") if distances[i] <= radius_miles]
+        if limit is not None:
+            order = order[:limit]
+        return [(candidates[i][0], float(distances[i])) for i in order]
+
+    def _complete(
+        self,
+        entry: Dict[str, Any],
+        results: List[Tuple[Dict[str, Any], float]],
+        latitude: float,
+        longitude: float,
+        radius_miles: float,
+        limit: Optional[int]
+    ) -> bool:
+        """Whether the entry is guaranteed to contain every result for this origin"""
+        center_lat, center_lon = entry["center"]
+        offset = haversine_miles(center_lat, center_lon, latitude, longitude)
+        # Anything within reach of the origin is within covered_radius of the center
+        if radius_miles + offset <= entry["covered_radius"]:
+            return True
+        # A truncated entry still suffices if the limit is met close enough to the origin
+        return (
+            limit is not None
+            and len(results) == limit
+            and results[-1][1] + offset <= entry["covered_radius"]
+        )
+
+    def _tags(self, latitude: float, longitude: float, radius_miles: float) -> List[str]:
+        cells = geohash.covering(bounding_box(latitude, longitude, radius_miles), TAG_PRECISION, MAX_TAG_CELLS)
+        if not cells:
+            return [GLOBAL_TAG]
+        return [f"{PREFIX}tag:{cell}" for cell in cells]
+
+    def lookup(
+        self,
+        namespace: str,
+        filters: Dict[str, Any],
+        compute: Callable[[], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Cached search without a location; dropped on any catalog write"""
+        if not settings.SEARCH_CACHE_ENABLED:
+            return compute()
+
+        key = self._key(namespace, [filters])
+        entry = self._read(key)
+        if entry is None:
+            entry = {"results": compute()}
+            self._write(key, entry, [GLOBAL_TAG])
+        return entry["results"]
+
+    def invalidate_location(self, latitude: Optional[float], longitude: Optional[float]):
+        """Drop entries that could include a service at this location"""
+        tags = [GLOBAL_TAG]
+        if latitude is not None and longitude is not None:
+            tags.append(f"{PREFIX}tag:{geohash.encode(latitude, longitude, TAG_PRECISION)}")
+        try:
+            for tag in tags:
+                keys = self.cache.set_members(tag)
+                self.cache.delete(tag, *keys)
+        except Exception as e:
+            logger.warning(f"Search cache invalidation failed: {e}")
+
+    def clear(self):
+        """Drop all cached search results"""
+        try:
+            self.cache.clear(PREFIX)
+        except Exception as e:
+            logger.warning(f"Search cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.cache.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Global search cache instance
+_search_cache_instance = None
+
+
+def get_search_cache() -> SearchResultCache:
+    """Get or create the global search result cache"""
+    global _search_cache_instance
+    if _search_cache_instance is None:
+        _search_cache_instance = SearchResultCache()
+    return _search_cache_instance
@@ -0,0 +1,121 @@
+"""
+Pre-serialized JSON for service responses
+Services loaded from the database are trusted, so they are projected straight
+to JSON without pydantic validation. Each service's encoded bytes are kept
+in-process until the service changes.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+from app.config import settings
+from app.db.models import SocialService
+import json
+import threading
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Same fields, in the same order, as the ServiceResponse API schema
+SERVICE_FIELDS = (
+    "id", "name", "description", "category", "address", "latitude", "longitude",
+    "phone", "website", "operating_hours", "eligibility_criteria", "services_provided",
+    "is_active", "last_verified", "created_at",
+)
+
+# Every write to a service sets last_verified or is_active, so this pair
+# identifies a version even in workers that missed the invalidation
+Version = Tuple[Optional[datetime], Optional[bool]]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Encode to compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def service_dict(service: SocialService) -> Dict[str, Any]:
+    """Project a service row to the ServiceResponse shape"""
+    return {field: getattr(service, field) for field in SERVICE_FIELDS}
+
+
+class ServiceEncoder:
+    """
+    LRU cache of each service's encoded ServiceResponse JSON.
+
+    Args:
+        max_entries: Services kept before the least recently used is dropped
+    """
+
+    def __init__(self, max_entries: int = settings.SERIALIZED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[Version, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, service: SocialService) -> bytes:
+        """JSON bytes for one service"""
+        version = (service.last_verified, service.is_active)
+        with self._lock:
+            entry = self._entries.get(service.id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(service.id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        encoded = dumps(service_dict(service))
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[service.id] = (version, encoded)
+                self._entries.move_to_end(service.id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return encoded
+
+    def encode_list(self, services: Iterable[SocialService]) -> bytes:
+        """JSON array bytes for a page of services"""
+        return b"[" + b",".join(self.encode(service) for service in services) + b"]"
+
+    def invalidate(self, service_id: int):
+        with self._lock:
+            self._entries.pop(service_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "encoder": "orjson" if orjson is not None else "json",
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Global service encoder instance
+_encoder_instance = None
+
+
+def get_service_encoder() -> ServiceEncoder:
+    """Get or create the global service encoder"""
+    global _encoder_instance
+    if _encoder_instance is None:
+        _encoder_instance = ServiceEncoder()
+    return _encoder_instance
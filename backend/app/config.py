@@ -13,11 +13,29 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///community_resources.db"
+    ASYNC_DATABASE_URL: str = ""  # Derived from DATABASE_URL when empty
+    # File-based SQLite: seconds a writer waits for another connection's lock
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 30.0
+    
+    # Nearby search: "memory" uses the in-process spatial index,
+    # "sql" pushes a bounding-box filter down to the database
+    GEO_SEARCH_MODE: str = "memory"
     
     # AI/LLM - Google Gemini
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-3-flash-preview"
     
+    # Embeddings for semantic search: "gemini", "local", or empty to pick
+    # Gemini when an API key is set
+    EMBEDDING_BACKEND: str = ""
+    EMBEDDING_DIMENSIONS: int = 768
+    
+    # Write-behind buffer for chat messages and service access logs
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_BATCH_SIZE: int = 100
+    WRITE_BEHIND_FLUSH_SECONDS: float = 1.0
+    WRITE_BEHIND_MAX_QUEUE: int = 10000
+    
     # Services
     GOOGLE_MAPS_API_KEY: str = ""
     TWILIO_ACCOUNT_SID: str = ""
@@ -26,6 +44,39 @@ class Settings(BaseSettings):
     
     # Cache
     REDIS_URL: str = "redis://redis:6379/0"
+    CACHE_BACKEND: str = "auto"  # "redis", "memory", or "auto" (Redis if reachable)
+    # In-process cache only: least recently used keys beyond this are evicted
+    MEMORY_CACHE_MAX_ENTRIES: int = 100000
+    
+    # Chat response cache; similarity matching is off when the threshold is 0
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_SIMILARITY: float = 0.0
+    
+    # Nearby/category search result cache
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL_SECONDS: int = 600
+    
+    # Services whose encoded JSON is kept in memory per worker (0 disables)
+    SERIALIZED_CACHE_SIZE: int = 5000
+    
+    # Columnar in-memory catalog snapshot serving service reads; a watcher
+    # thread checks the shared catalog version this often and rebuilds when it moves
+    CATALOG_SNAPSHOT_ENABLED: bool = True
+    CATALOG_VERSION_CHECK_SECONDS: float = 1.0
+    CATALOG_SNAPSHOT_MAX_AGE_SECONDS: float = 300.0
+    
+    # Answer simple "category + place" lookups without the LLM
+    INTENT_ROUTER_ENABLED: bool = True
+    INTENT_ROUTER_MAX_WORDS: int = 12
+    
+    # Tool calls from one agent step run concurrently, at most this many at once
+    AGENT_TOOL_CONCURRENCY: int = 4
+    
+    # Repeated tool calls within one agent run reuse the first result; a call
+    # made this many times is treated as a loop and ends the run
+    AGENT_TOOL_MEMO_ENABLED: bool = True
+    AGENT_LOOP_THRESHOLD: int = 3
     
     # CORS
     ALLOWED_ORIGINS: list = ["http://localhost:3000", "http://localhost:8000"]
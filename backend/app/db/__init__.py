@@ -1,6 +1,6 @@
 """
 Initialize database module
 """
-from . import models, database, seed_data
+from . import models, database, seed_data, catalog_sync, catalog_snapshot, catalog_version, eligibility, rollups, write_behind, bulk_import
 
-__all__ = ['models', 'database', 'seed_data']
+__all__ = ['models', 'database', 'seed_data', 'catalog_sync', 'catalog_snapshot', 'catalog_version', 'eligibility', 'rollups', 'write_behind', 'bulk_import']
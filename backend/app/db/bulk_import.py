@@ -0,0 +1,239 @@
+"""
+Streaming bulk import of services from CSV or NDJSON
+Rows are parsed one at a time, validated with ServiceCreate and upserted in
+chunks on the (name, address) natural key; derived indexes are rebuilt once
+at the end. Run `python -m app.db.bulk_import services.csv` from the CLI.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from datetime import datetime
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+from app.db.models import SocialService
+from app.db.database import SessionLocal
+import argparse
+import csv
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+# Rows written per executemany batch
+CHUNK_SIZE = 1000
+
+# Errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# CSV columns holding JSON values
+JSON_COLUMNS = ("operating_hours", "eligibility_criteria", "services_provided")
+
+_table = SocialService.__table__
+
+
+def detect_format(filename: str) -> str:
+    """Guess the format from a file name ("csv" unless it looks like NDJSON)"""
+    lowered = (filename or "").lower()
+    if lowered.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+def _parse_csv_value(column: str, value: Optional[str]) -> Any:
+    if value is None:
+        return None
+    value = value.strip()
+    if value == "":
+        return None
+    if column in JSON_COLUMNS:
+        if value[0] in "[{":
+            return json.loads(value)
+        if column == "services_provided":
+            # Also accept "counseling; meals; showers"
+            return [item.strip() for item in value.split(";") if item.strip()]
+    return value
+
+
+def parse_records(source: TextIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line_number, record) pairs from a text stream without reading it all.
+
+    A record is a dict, or the exception raised while decoding that line.
+    """
+    if fmt == "ndjson":
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+    elif fmt == "csv":
+        reader = csv.DictReader(source)
+        for row in reader:
+            try:
+                yield reader.line_num, {
+                    column: _parse_csv_value(column, value)
+                    for column, value in row.items()
+                    if column
+                }
+            except ValueError as e:
+                yield reader.line_num, e
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _upsert_chunk(db: Session, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Insert or update one chunk of validated rows; returns (inserted, updated)"""
+    # Later rows win when a chunk repeats a key
+    by_key = {(row["name"], row["address"]): row for row in rows}
+
+    existing = dict(
+        ((name, address), service_id)
+        for service_id, name, address in db.execute(
+            select(_table.c.id, _table.c.name, _table.c.address)
+            .where(tuple_(_table.c.name, _table.c.address).in_(list(by_key)))
+        )
+    )
+
+    now = datetime.utcnow()
+    inserts = []
+    updates = []
+    for key, row in by_key.items():
+        row = {**row, "last_verified": now}
+        if key in existing:
+            # Bind names must not collide with column names in an UPDATE
+            update_row = {f"new_{column}": value for column, value in row.items()}
+            update_row["_id"] = existing[key]
+            updates.append(update_row)
+        else:
+            inserts.append({**row, "created_at": now})
+
+    if inserts:
+        db.execute(insert(_table), inserts)
+    if updates:
+        columns = {name[len("new_"):]: bindparam(name) for name in updates[0] if name != "_id"}
+        db.execute(
+            update(_table).where(_table.c.id == bindparam("_id")).values(columns),
+            updates
+        )
+    return len(inserts), len(updates)
+
+
+def import_services(
+    source: TextIO,
+    fmt: str = "csv",
+    chunk_size: int = CHUNK_SIZE,
+    dry_run: bool = False,
+    db: Optional[Session] = None
+) -> Dict[str, Any]:
+    """
+    Import services from a CSV or NDJSON text stream.
+
+    Each chunk is committed on its own, so a failure part-way keeps the
+    chunks already written. Invalid rows are skipped and reported.
+
+    Args:
+        source: Text stream positioned at the start of the data
+        fmt: "csv" or "ndjson"
+        chunk_size: Rows per executemany batch
+        dry_run: Validate only, without writing
+        db: Optional session; a new one is opened if omitted
+
+    Returns:
+        Counts of processed, inserted, updated and invalid rows, plus errors
+    """
+    # Imported here to avoid a circular import with the API package
+    from app.api.resources import ServiceCreate
+
+    report = {"processed": 0, "inserted": 0, "updated": 0, "invalid": 0, "errors": []}
+
+    def reject(line_number: int, error: Any):
+        report["invalid"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "error": str(error)})
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        chunk: List[Dict[str, Any]] = []
+
+        def write_chunk():
+            if not dry_run and chunk:
+                inserted, updated = _upsert_chunk(db, chunk)
+                db.commit()
+                report["inserted"] += inserted
+                report["updated"] += updated
+            chunk.clear()
+
+        for line_number, record in parse_records(source, fmt):
+            report["processed"] += 1
+            if isinstance(record, Exception):
+                reject(line_number, record)
+                continue
+            try:
+                service = ServiceCreate.model_validate(record)
+            except ValueError as e:
+                reject(line_number, e)
+                continue
+
+            row = service.model_dump()
+            row["category"] = row["category"].lower()
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                write_chunk()
+
+        write_chunk()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Bulk import failed after {report['processed']} rows: {e}")
+        raise
+    finally:
+        if own_session:
+            db.close()
+        # Rebuild once, covering any chunks committed before a failure
+        if not dry_run and (report["inserted"] or report["updated"]):
+            _refresh_derived_indexes()
+
+    logger.info(
+        f"Bulk import: {report['inserted']} inserted, {report['updated']} updated, "
+        f"{report['invalid']} invalid of {report['processed']} rows"
+    )
+    return report
+
+
+def _refresh_derived_indexes():
+    """Rebuild in-memory indexes and drop caches after a bulk change"""
+    from app.db.catalog_sync import on_catalog_reloaded
+    on_catalog_reloaded()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk import services from CSV or NDJSON")
+    parser.add_argument("path", help="File to import")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Validate without writing")
+    args = parser.parse_args(argv)
+
+    from app.db.database import init_db
+    init_db()
+
+    with open(args.path, encoding="utf-8-sig", newline="") as source:
+        report = import_services(
+            source,
+            fmt=args.format or detect_format(args.path),
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run
+        )
+    print(json.dumps(report, indent=2))
+    if report["inserted"] or report["updated"]:
+        print("Run `python -m app.search.semantic` to embed the imported services.")
+        print("Running API workers rebuild their in-memory spatial index on restart.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
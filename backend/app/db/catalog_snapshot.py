@@ -0,0 +1,514 @@
+"""
+Columnar in-memory snapshot of the service catalog for read paths
+Coordinates, category codes and flags are NumPy arrays; the other columns are
+plain lists. A snapshot is never modified in place: writes publish a patched
+copy and bump a catalog version shared through the cache backend, and workers
+holding an older version rebuild theirs in the background
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.cache.serialized import SERVICE_FIELDS
+from app.db.models import SocialService
+from app.db.database import SessionLocal
+from app.db.catalog_version import CatalogVersion, get_catalog_version
+from app.db.eligibility import EligibilityColumns
+from app.geo.distance import within_radius
+import numpy as np
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reloads attempted when local writes keep landing during a background load
+MAX_REFRESH_ATTEMPTS = 3
+
+# Short, often repeated columns are interned so equal values share one object
+INTERNED_COLUMNS = ("name", "address", "phone", "website")
+
+# Columns kept as lists, one entry per service
+LIST_COLUMNS = tuple(
+    field for field in SERVICE_FIELDS
+    if field not in ("id", "latitude", "longitude", "category", "is_active")
+)
+
+
+class ServiceRecord:
+    """Read-only view of one service with the same attributes as SocialService"""
+
+    __slots__ = SERVICE_FIELDS
+
+    def __init__(self, **values: Any):
+        for field in SERVICE_FIELDS:
+            setattr(self, field, values.get(field))
+
+    def __repr__(self) -> str:
+        return f"<ServiceRecord id={self.id} name={self.name!r}>"
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _deep_size(value: Any, seen: set) -> int:
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item, seen) for item in value)
+    return size
+
+
+class CatalogSnapshot:
+    """
+    Immutable columnar copy of every service, ordered by ID.
+
+    Args:
+        ids: Sorted service IDs
+        latitudes: Latitudes (NaN when unknown)
+        longitudes: Longitudes (NaN when unknown)
+        category_codes: Index into categories for each service
+        categories: Distinct category values
+        active: is_active flags
+        columns: Remaining columns, one list entry per service
+        version: Catalog version this snapshot reflects
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[Optional[str]],
+        active: np.ndarray,
+        columns: Dict[str, List[Any]],
+        version: str
+    ):
+        self.ids = ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.category_codes = category_codes
+        self.categories = categories
+        self.active = active
+        self.columns = columns
+        self.version = version
+        self.built_at = time.time()
+        self._eligibility: Optional[EligibilityColumns] = None
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], version: str) -> "CatalogSnapshot":
+        """Build from dicts holding every SERVICE_FIELDS value"""
+        rows = sorted(rows, key=lambda row: row["id"])
+        categories: List[Optional[str]] = []
+        codes: Dict[Optional[str], int] = {}
+        for row in rows:
+            if row["category"] not in codes:
+                codes[row["category"]] = len(categories)
+                categories.append(_intern(row["category"]))
+
+        def coordinate(value: Optional[float]) -> float:
+            return np.nan if value is None else value
+
+        return cls(
+            ids=np.fromiter((row["id"] for row in rows), dtype=np.int64, count=len(rows)),
+            latitudes=np.fromiter((coordinate(row["latitude"]) for row in rows), dtype=np.float64, count=len(rows)),
+            longitudes=np.fromiter((coordinate(row["longitude"]) for row in rows), dtype=np.float64, count=len(rows)),
+            category_codes=np.fromiter((codes[row["category"]] for row in rows), dtype=np.int32, count=len(rows)),
+            categories=categories,
+            active=np.fromiter((bool(row["is_active"]) for row in rows), dtype=bool, count=len(rows)),
+            columns={
+                column: [
+                    _intern(row[column]) if column in INTERNED_COLUMNS else row[column]
+                    for row in rows
+                ]
+                for column in LIST_COLUMNS
+            },
+            version=version
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def eligibility(self) -> EligibilityColumns:
+        """Compiled eligibility rules, parsed on first use"""
+        if self._eligibility is None:
+            self._eligibility = EligibilityColumns.from_criteria(self.columns["eligibility_criteria"])
+        return self._eligibility
+
+    def position(self, service_id: int) -> Optional[int]:
+        """Row position of a service, or None if it is not in the snapshot"""
+        position = int(np.searchsorted(self.ids, service_id))
+        if position < len(self.ids) and self.ids[position] == service_id:
+            return position
+        return None
+
+    def record(self, position: int) -> ServiceRecord:
+        latitude = self.latitudes[position]
+        longitude = self.longitudes[position]
+        return ServiceRecord(
+            id=int(self.ids[position]),
+            latitude=None if np.isnan(latitude) else float(latitude),
+            longitude=None if np.isnan(longitude) else float(longitude),
+            category=self.categories[self.category_codes[position]],
+            is_active=bool(self.active[position]),
+            **{column: values[position] for column, values in self.columns.items()}
+        )
+
+    def get(self, service_id: int) -> Optional[ServiceRecord]:
+        position = self.position(service_id)
+        return None if position is None else self.record(position)
+
+    def mask(
+        self,
+        active_only: bool = True,
+        category: Optional[str] = None,
+        exact_category: bool = False
+    ) -> np.ndarray:
+        """
+        Boolean mask of services passing the common filters.
+
+        Args:
+            active_only: Only active services
+            category: Category filter
+            exact_category: Match category exactly; otherwise a case-insensitive
+                substring match, like the API's ilike filter
+        """
+        mask = self.active.copy() if active_only else np.ones(len(self), dtype=bool)
+        if category:
+            needle = category.lower()
+            matching = [
+                code for code, value in enumerate(self.categories)
+                if value is not None and (value == category if exact_category else needle in value.lower())
+            ]
+            mask &= np.isin(self.category_codes, matching)
+        return mask
+
+    def page(
+        self,
+        mask: np.ndarray,
+        limit: int,
+        skip: int = 0,
+        after_id: Optional[int] = None
+    ) -> List[ServiceRecord]:
+        """Services passing mask in ID order, after a cursor or offset"""
+        positions = np.flatnonzero(mask)
+        if after_id is not None:
+            positions = positions[self.ids[positions] > after_id]
+        else:
+            positions = positions[skip:]
+        return [self.record(position) for position in positions[:limit].tolist()]
+
+    def nearby(
+        self,
+        mask: np.ndarray,
+        latitude: float,
+        longitude: float,
+        radius_miles: float,
+        limit: Optional[int] = None
+    ) -> List[Tuple[ServiceRecord, float]]:
+        """(service, distance_miles) pairs passing mask within a radius, nearest first"""
+        positions, distances = self.nearby_positions(mask, latitude, longitude, radius_miles)
+        if limit is not None:
+            positions, distances = positions[:limit], distances[:limit]
+        return [
+            (self.record(position), distance)
+            for position, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def nearby_positions(
+        self,
+        mask: np.ndarray,
+        latitude: float,
+        longitude: float,
+        radius_miles: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, distances) of rows passing mask within a radius, nearest first"""
+        positions = np.flatnonzero(mask & ~np.isnan(self.latitudes) & ~np.isnan(self.longitudes))
+        indices, distances = within_radius(
+            latitude, longitude, self.latitudes[positions], self.longitudes[positions], radius_miles
+        )
+        return positions[indices], distances
+
+    def with_service(self, service: Any, version: str) -> "CatalogSnapshot":
+        """Copy of this snapshot with one service inserted or replaced"""
+        categories = self.categories
+        if service.category in categories:
+            code = categories.index(service.category)
+        else:
+            code = len(categories)
+            categories = categories + [_intern(service.category)]
+
+        latitude = np.nan if service.latitude is None else service.latitude
+        longitude = np.nan if service.longitude is None else service.longitude
+        values = {
+            column: _intern(getattr(service, column)) if column in INTERNED_COLUMNS else getattr(service, column)
+            for column in LIST_COLUMNS
+        }
+
+        position = self.position(service.id)
+        if position is not None:
+            inserted = False
+            ids = self.ids
+            latitudes, longitudes = self.latitudes.copy(), self.longitudes.copy()
+            category_codes, active = self.category_codes.copy(), self.active.copy()
+            latitudes[position], longitudes[position] = latitude, longitude
+            category_codes[position] = code
+            active[position] = bool(service.is_active)
+            columns = {}
+            for column, column_values in self.columns.items():
+                column_values = list(column_values)
+                column_values[position] = values[column]
+                columns[column] = column_values
+        else:
+            inserted = True
+            position = int(np.searchsorted(self.ids, service.id))
+            ids = np.insert(self.ids, position, service.id)
+            latitudes = np.insert(self.latitudes, position, latitude)
+            longitudes = np.insert(self.longitudes, position, longitude)
+            category_codes = np.insert(self.category_codes, position, code)
+            active = np.insert(self.active, position, bool(service.is_active))
+            columns = {}
+            for column, column_values in self.columns.items():
+                column_values = list(column_values)
+                column_values.insert(position, values[column])
+                columns[column] = column_values
+
+        snapshot = CatalogSnapshot(ids, latitudes, longitudes, category_codes, categories, active, columns, version)
+        # Age counts from the last full load, which patches do not replace
+        snapshot.built_at = self.built_at
+        if self._eligibility is not None:
+            snapshot._eligibility = self._eligibility.with_criteria(
+                position, service.eligibility_criteria, insert=inserted
+            )
+        return snapshot
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the snapshot, counting shared objects once"""
+        seen: set = set()
+        size = sum(array.nbytes for array in (
+            self.ids, self.latitudes, self.longitudes, self.category_codes, self.active
+        ))
+        size += _deep_size(self.categories, seen)
+        for column_values in self.columns.values():
+            size += _deep_size(column_values, seen)
+        return size
+
+
+def load_rows(db: Session, *criteria: Any) -> List[Dict[str, Any]]:
+    """Every SERVICE_FIELDS value for services matching the optional filters"""
+    columns = [getattr(SocialService, field) for field in SERVICE_FIELDS]
+    return [dict(row._mapping) for row in db.execute(select(*columns).where(*criteria))]
+
+
+class CatalogStore:
+    """
+    Holds the current snapshot and keeps it in step with the catalog version.
+
+    Readers never wait for a rebuild once a first snapshot exists: a stale
+    snapshot is served while a background thread loads its replacement.
+    Changes made by other processes arrive through the catalog version
+    watcher (see catalog_version), so reads do no I/O.
+
+    Args:
+        versions: Shared catalog version
+        max_age: Rebuild snapshots older than this many seconds
+    """
+
+    def __init__(
+        self,
+        versions: Optional[CatalogVersion] = None,
+        max_age: float = settings.CATALOG_SNAPSHOT_MAX_AGE_SECONDS
+    ):
+        self._versions = versions
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()  # Serializes builds and patches
+        self._generation = 0  # Bumped by every local patch
+        self._refresh_lock = threading.Lock()  # Guards the two flags below, never held during a load
+        self._refreshing = False
+        self._refresh_again = False
+
+        self.builds = 0
+        self.patches = 0
+        self.last_build_ms = 0.0
+
+    @property
+    def versions(self) -> CatalogVersion:
+        if self._versions is None:
+            self._versions = get_catalog_version()
+        return self._versions
+
+    def _load(self, db: Optional[Session] = None) -> List[Dict[str, Any]]:
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            return load_rows(db)
+        finally:
+            if own_session:
+                db.close()
+
+    def build(self, db: Optional[Session] = None) -> CatalogSnapshot:
+        """
+        Load a fresh snapshot from the database.
+
+        Args:
+            db: Optional session to read from; a new one is opened if omitted
+        """
+        with self._lock:
+            started = time.perf_counter()
+            version = self.versions.current()
+            snapshot = CatalogSnapshot.from_rows(self._load(db), version)
+            self._snapshot = snapshot
+            self._record_build(started, snapshot)
+            return snapshot
+
+    def _record_build(self, started: float, snapshot: CatalogSnapshot):
+        self.builds += 1
+        self.last_build_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Catalog snapshot built with {len(snapshot)} services in {self.last_build_ms:.0f} ms")
+
+    def current(self) -> CatalogSnapshot:
+        """
+        The snapshot to read from, building the first one if needed.
+
+        The build is a blocking load, so async code should use ready() instead.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.build()
+        return snapshot
+
+    def ready(self) -> Optional[CatalogSnapshot]:
+        """
+        The snapshot to read from, or None until the first build finishes.
+
+        Never blocks: without a snapshot, or with one older than max_age, a
+        build starts in the background. Callers read from the database
+        while there is no snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or time.time() - snapshot.built_at > self.max_age:
+            # Nothing changed since a running load started, so don't queue another
+            if not self._refreshing:
+                self.refresh()
+        return snapshot
+
+    def refresh(self):
+        """Load a new snapshot in a background thread; readers keep the current one meanwhile"""
+        with self._refresh_lock:
+            if self._refreshing:
+                # Load again once the running refresh ends; it may predate the change
+                self._refresh_again = True
+                return
+            self._refreshing = True
+            self._refresh_again = False
+        threading.Thread(target=self._refresh, name="catalog-snapshot", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            attempts = 0
+            while attempts < MAX_REFRESH_ATTEMPTS:
+                attempts += 1
+                started = time.perf_counter()
+                generation = self._generation
+                version = self.versions.current()
+                snapshot = CatalogSnapshot.from_rows(self._load(), version)
+                with self._lock:
+                    # A local write landed mid-load; load again so it is not lost
+                    if generation != self._generation:
+                        continue
+                    self._snapshot = snapshot
+                    self._record_build(started, snapshot)
+                with self._refresh_lock:
+                    if not self._refresh_again:
+                        return
+                    self._refresh_again = False
+            logger.warning("Catalog snapshot refresh gave up; writes kept arriving during the load")
+        except Exception as e:
+            logger.error(f"Catalog snapshot refresh failed: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
+
+    def apply(self, service: Any, version: str):
+        """
+        Publish a copy of the snapshot with a committed service written into it.
+
+        Args:
+            service: The committed service
+            version: Catalog version published for the write
+        """
+        with self._lock:
+            if self._snapshot is None:
+                return
+            self._snapshot = self._snapshot.with_service(service, version)
+            self._generation += 1
+            self.patches += 1
+
+    def reload(self):
+        """After a bulk change: rebuild if a snapshot is in use"""
+        if self._snapshot is not None:
+            self.build()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"enabled": settings.CATALOG_SNAPSHOT_ENABLED, "built": False}
+        memory = snapshot.memory_bytes()
+        return {
+            "enabled": settings.CATALOG_SNAPSHOT_ENABLED,
+            "built": True,
+            "version": snapshot.version,
+            "services": len(snapshot),
+            "active_services": int(snapshot.active.sum()),
+            "categories": len(snapshot.categories),
+            "age_seconds": round(time.time() - snapshot.built_at, 1),
+            "builds": self.builds,
+            "patches": self.patches,
+            "last_build_ms": round(self.last_build_ms, 2),
+            "memory_bytes": memory,
+            "memory_mb_per_100k_services": round(memory / len(snapshot) * 100_000 / 2**20, 1) if len(snapshot) else 0.0,
+        }
+
+
+def snapshot_for(db: Session, *criteria: Any) -> CatalogSnapshot:
+    """
+    The shared snapshot when enabled and built, otherwise a throwaway one
+    built from the services matching criteria.
+    """
+    catalog = catalog_snapshot()
+    if catalog is not None:
+        return catalog
+    return CatalogSnapshot.from_rows(load_rows(db, *criteria), version="")
+
+
+def catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    The shared snapshot when enabled and built, otherwise None (read from
+    the database). Safe to call on the event loop.
+    """
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        return get_catalog().ready()
+    return None
+
+
+# Global catalog store instance
+_store_instance = None
+
+
+def get_catalog() -> CatalogStore:
+    """Get or create the global catalog snapshot store"""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = CatalogStore()
+    return _store_instance
@@ -0,0 +1,96 @@
+"""
+Keeps derived indexes and caches in step with writes to the service catalog
+Call the on_* hooks after the write has been committed; watch_catalog keeps
+this process in step with writes made by other processes
+"""
+
+from typing import Optional, Tuple
+from app.db.models import SocialService
+from app.geo.spatial_index import get_spatial_index
+from app.geo.locations import get_location_index
+from app.search.trigram import get_trigram_index
+from app.cache.responses import get_response_cache
+from app.cache.search import get_search_cache
+from app.cache.serialized import get_service_encoder
+from app.config import settings
+from app.db.catalog_snapshot import get_catalog
+from app.db.catalog_version import get_catalog_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def on_service_saved(service: SocialService, previous_location: Optional[Tuple[float, float]] = None):
+    """
+    A service was created, updated or verified.
+
+    Args:
+        service: The committed service
+        previous_location: (latitude, longitude) before the update, if it moved
+    """
+    get_spatial_index().upsert(service)
+    get_location_index().upsert(service)
+    get_trigram_index().upsert(service)
+    version = get_catalog_version().publish()
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        get_catalog().apply(service, version)
+    get_response_cache().invalidate_service(service.id)
+    get_service_encoder().invalidate(service.id)
+
+    search_cache = get_search_cache()
+    search_cache.invalidate_location(service.latitude, service.longitude)
+    if previous_location and previous_location != (service.latitude, service.longitude):
+        search_cache.invalidate_location(*previous_location)
+
+
+def on_service_removed(service: SocialService):
+    """A service was deactivated or deleted"""
+    get_spatial_index().remove(service.id)
+    get_location_index().remove(service.id)
+    get_trigram_index().remove(service.id)
+    version = get_catalog_version().publish()
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        get_catalog().apply(service, version)
+    get_response_cache().invalidate_service(service.id)
+    get_service_encoder().invalidate(service.id)
+    get_search_cache().invalidate_location(service.latitude, service.longitude)
+
+
+def on_catalog_reloaded():
+    """Many services changed at once (seeding, bulk loads)"""
+    get_catalog_version().publish()
+    get_spatial_index().build()
+    get_location_index().build()
+    get_trigram_index().build()
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        get_catalog().reload()
+    get_response_cache().clear()
+    get_search_cache().clear()
+    get_service_encoder().clear()
+    logger.info("Catalog indexes and caches refreshed")
+
+
+def on_catalog_changed():
+    """
+    Another process (worker, bulk import) changed the catalog: rebuild the
+    indexes this process has built and reload its snapshot.
+    """
+    spatial_index = get_spatial_index()
+    if spatial_index.is_built:
+        spatial_index.build()
+    location_index = get_location_index()
+    if location_index.is_built:
+        location_index.build()
+    trigram_index = get_trigram_index()
+    if trigram_index.is_built:
+        trigram_index.build()
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        get_catalog().refresh()
+
+
+def watch_catalog():
+    """Start applying other processes' catalog writes to this process (idempotent)"""
+    versions = get_catalog_version()
+    if not versions.is_watching:
+        versions.subscribe(on_catalog_changed)
+        versions.start()
@@ -0,0 +1,135 @@
+"""
+Shared catalog version and a watcher for catalog changes made elsewhere
+Every committed catalog write publishes a new version through the cache
+backend. Each worker polls it and, when another process (another uvicorn
+worker, a bulk import) moved it, tells its in-process indexes to rebuild
+"""
+
+from typing import Callable, List, Optional
+from app.cache.backend import CacheBackend, get_cache
+from app.config import settings
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog:version"
+VERSION_TTL_SECONDS = 30 * 24 * 3600
+
+
+class CatalogVersion:
+    """
+    The catalog version shared by all processes, and the version this
+    process last caught up with.
+
+    Args:
+        cache: Backend holding the shared version
+        check_interval: Seconds between checks of the shared version
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        check_interval: float = settings.CATALOG_VERSION_CHECK_SECONDS
+    ):
+        self._cache = cache
+        self.check_interval = check_interval
+        self._known: Optional[str] = None
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.changes_seen = 0
+
+    @property
+    def cache(self) -> CacheBackend:
+        if self._cache is None:
+            self._cache = get_cache()
+        return self._cache
+
+    def shared(self) -> Optional[str]:
+        """The version last published by any process, if it can be read"""
+        try:
+            return self.cache.get(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read catalog version: {e}")
+            return None
+
+    def current(self) -> str:
+        """The shared version, publishing a first one if there is none"""
+        return self.shared() or self.publish()
+
+    def publish(self) -> str:
+        """
+        Publish a new version after a committed write.
+
+        Returns:
+            The new version
+        """
+        previous = self.shared()
+        version = uuid.uuid4().hex
+        try:
+            self.cache.set(VERSION_KEY, version, VERSION_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not publish catalog version: {e}")
+        with self._lock:
+            # If another process wrote since the last check, stay behind so
+            # the watcher still rebuilds; this write alone would hide theirs
+            if previous in (None, self._known):
+                self._known = version
+        return version
+
+    def subscribe(self, listener: Callable[[], None]):
+        """Call listener (from the watcher thread) whenever another process changes the catalog"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    @property
+    def is_watching(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Start watching the shared version (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self._known is None:
+                self._known = self.shared()
+            self._thread = threading.Thread(target=self._watch, name="catalog-version", daemon=True)
+            self._thread.start()
+
+    def check(self) -> bool:
+        """Compare with the shared version once; returns whether listeners were called"""
+        shared = self.shared()
+        with self._lock:
+            if shared is None or shared == self._known:
+                return False
+            self._known = shared
+            self.changes_seen += 1
+            listeners = list(self._listeners)
+        logger.info("Catalog changed in another process; rebuilding in-process indexes")
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Catalog change listener failed: {e}")
+        return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.check()
+
+
+# Global catalog version instance
+_version_instance = None
+
+
+def get_catalog_version() -> CatalogVersion:
+    """Get or create the global catalog version"""
+    global _version_instance
+    if _version_instance is None:
+        _version_instance = CatalogVersion()
+    return _version_instance
@@ -2,33 +2,91 @@
 Database initialization and utilities
 """
 
-from sqlalchemy import create_engine, text
+from typing import Any, Dict
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from app.config import settings
-from app.db.models import Base, SocialService, UserProfile, ChatMessage, ServiceAccess
+from app.db.models import Base, SocialService, UserProfile, ChatMessage, ServiceAccess, Vector
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    """
+    Pooling options for a database URL.
+
+    An in-memory SQLite database only exists on its one connection, so it
+    keeps StaticPool. File-based SQLite gets a connection per session like
+    other databases, since request threads, the write-behind flusher, agent
+    tool threads and snapshot refreshes all use sessions at the same time;
+    writers wait up to SQLITE_BUSY_TIMEOUT_SECONDS for each other's locks.
+    """
+    if make_url(url).get_backend_name() != "sqlite":
+        return {}
+    connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_SECONDS}
+    if not _is_sqlite_file(url):
+        return {"poolclass": StaticPool, "connect_args": connect_args}
+    return {"connect_args": connect_args}
+
+
 # Create engine
 engine = create_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
-    poolclass=StaticPool if settings.DATABASE_URL.startswith("sqlite") else None,
+    **_engine_options(settings.DATABASE_URL),
 )
 
+
+if _is_sqlite_file(settings.DATABASE_URL):
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, connection_record):
+        """Let readers on other connections proceed while a batch is being written"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+
+# Async engine for the chat path and async routes
+_async_url = settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    echo=settings.DEBUG,
+    **_engine_options(_async_url),
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Set by init_db when the PostgreSQL earthdistance GiST index is available
+earthdistance_enabled = False
+
+
 def init_db():
     """Initialize database tables"""
     try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
-        
-        # Try to enable pgvector extension if using PostgreSQL
+        # Try to enable pgvector extension if using PostgreSQL; it must exist
+        # before create_all builds the vector embedding column
         if "postgresql" in settings.DATABASE_URL:
             try:
                 with engine.connect() as conn:
@@ -37,11 +95,62 @@ def init_db():
                     logger.info("pgvector extension enabled")
             except Exception as e:
                 logger.warning(f"Could not enable pgvector extension: {e}")
+        
+        # Create all tables
+        Base.metadata.create_all(bind=engine)
+        logger.info("Database tables created successfully")
+        
+        # create_all skips indexes on tables that already exist
+        for index in SocialService.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        
+        # Imported here to avoid a circular import with the models module
+        from app.search.fulltext import setup_fulltext
+        from app.db.rollups import backfill_if_empty
+        setup_fulltext(engine)
+        backfill_if_empty()
+        
+        if "postgresql" in settings.DATABASE_URL:
+            _enable_earthdistance()
+            if Vector is not None:
+                _create_embedding_index()
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
 
 
+def _enable_earthdistance():
+    """Enable earthdistance and a GiST index over service coordinates (PostgreSQL only)"""
+    global earthdistance_enabled
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS cube"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS earthdistance"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_social_services_earth "
+                "ON social_services USING gist (ll_to_earth(latitude, longitude))"
+            ))
+            conn.commit()
+        earthdistance_enabled = True
+        logger.info("earthdistance extension and GiST index enabled")
+    except Exception as e:
+        logger.warning(f"Could not enable earthdistance extension: {e}")
+
+
+def _create_embedding_index():
+    """Create an HNSW ANN index over service embeddings (PostgreSQL + pgvector only)"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_service_embeddings_hnsw "
+                "ON service_embeddings USING hnsw (embedding vector_cosine_ops)"
+            ))
+            conn.commit()
+        logger.info("HNSW index on service embeddings enabled")
+    except Exception as e:
+        logger.warning(f"Could not create embedding ANN index: {e}")
+
+
 def get_db():
     """Dependency for FastAPI endpoints"""
     db = SessionLocal()
@@ -51,6 +160,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Async dependency for FastAPI endpoints"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def drop_all_tables():
     """Drop all tables (use with caution - for development/testing only)"""
     Base.metadata.drop_all(bind=engine)
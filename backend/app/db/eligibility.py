@@ -0,0 +1,277 @@
+"""
+Eligibility rules compiled from free-form eligibility_criteria
+Each service's criteria are parsed once into typed columns (age bounds,
+income limit, residency) so a user can be checked against hundreds of
+services in one vectorized pass
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+INCOME_RANKS = {
+    "very_low": 1,
+    "low": 2,
+    "moderate": 3,
+    "medium": 3,
+    "moderate_high": 4,
+    "high": 5
+}
+DEFAULT_INCOME_RANK = 3
+
+# Income limits apply to users above this rank
+INCOME_LIMIT_RANK = 3
+
+# Criteria values meaning "no restriction"
+UNRESTRICTED = {"", "any", "none", "no limit", "not required", "all", "all ages", "n/a"}
+
+
+class EligibilityRule(NamedTuple):
+    """Typed form of one service's eligibility_criteria"""
+    age_min: Optional[float]
+    age_max: Optional[float]
+    income_limit: Optional[str]  # Display text; None when there is no limit
+    residency: Optional[str]  # Required residency; None when any is accepted
+
+
+def _unrestricted(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip().lower() in UNRESTRICTED)
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.search(r"\d+(?:\.\d+)?", value)
+        if match:
+            return float(match.group())
+    return None
+
+
+def parse_age_range(value: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Age bounds from text like "13+", "18-25", "under 18" or "60 and above" """
+    if _unrestricted(value):
+        return None, None
+    if not isinstance(value, str):
+        return _number(value), None
+    text = value.lower()
+    numbers = [float(number) for number in re.findall(r"\d+", text)]
+    if not numbers:
+        return None, None
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    if re.search(r"under|below|less than|younger", text):
+        return None, numbers[0] - 1
+    if re.search(r"up to|upto|or younger|max", text):
+        return None, numbers[0]
+    return numbers[0], None
+
+
+def compile_rule(criteria: Optional[Dict[str, Any]]) -> EligibilityRule:
+    """Parse free-form eligibility_criteria into an EligibilityRule"""
+    criteria = criteria if isinstance(criteria, dict) else {}
+    age_min, age_max = parse_age_range(criteria.get("age"))
+    if "age_minimum" in criteria:
+        age_min = _number(criteria["age_minimum"])
+    if "age_maximum" in criteria:
+        age_max = _number(criteria["age_maximum"])
+
+    income_limit = criteria.get("income_limit")
+    residency = criteria.get("residency")
+    return EligibilityRule(
+        age_min=age_min,
+        age_max=age_max,
+        income_limit=None if _unrestricted(income_limit) else str(income_limit),
+        residency=None if _unrestricted(residency) else str(residency)
+    )
+
+
+def _format_age(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def assess(
+    rule: EligibilityRule,
+    age: Optional[int] = None,
+    income_level: Optional[str] = None,
+    residency: Optional[str] = None
+) -> Tuple[bool, List[str]]:
+    """
+    Check one user against one rule.
+
+    Age bounds make a user ineligible; income and residency limits are
+    reported as barriers to discuss with the service.
+
+    Returns:
+        (eligible, barriers)
+    """
+    eligible = True
+    barriers = []
+    if age is not None and rule.age_min is not None and age < rule.age_min:
+        eligible = False
+        barriers.append(f"Minimum age requirement: {_format_age(rule.age_min)}")
+    if age is not None and rule.age_max is not None and age > rule.age_max:
+        eligible = False
+        barriers.append(f"Maximum age requirement: {_format_age(rule.age_max)}")
+    if income_level and rule.income_limit is not None:
+        if INCOME_RANKS.get(income_level, DEFAULT_INCOME_RANK) > INCOME_LIMIT_RANK:
+            barriers.append(f"Income limit: {rule.income_limit}")
+    if residency and rule.residency is not None:
+        if residency.strip().lower() != rule.residency.strip().lower():
+            barriers.append(f"Residency requirement: {rule.residency}")
+    return eligible, barriers
+
+
+class EligibilityColumns:
+    """
+    Compiled rules for every service in a catalog snapshot, one array per field.
+
+    Args:
+        rules: One EligibilityRule per snapshot row, in row order
+    """
+
+    def __init__(self, rules: Sequence[EligibilityRule]):
+        self.rules = list(rules)
+
+        def bound(value: Optional[float]) -> float:
+            return np.nan if value is None else value
+
+        self.age_min = np.fromiter((bound(rule.age_min) for rule in self.rules), dtype=np.float64, count=len(self.rules))
+        self.age_max = np.fromiter((bound(rule.age_max) for rule in self.rules), dtype=np.float64, count=len(self.rules))
+        self.income_limited = np.fromiter(
+            (rule.income_limit is not None for rule in self.rules), dtype=bool, count=len(self.rules)
+        )
+        self.residency = np.array(
+            [(rule.residency or "").strip().lower() for rule in self.rules], dtype=object
+        )
+
+    @classmethod
+    def from_criteria(cls, criteria: Sequence[Optional[Dict[str, Any]]]) -> "EligibilityColumns":
+        return cls([compile_rule(value) for value in criteria])
+
+    def with_criteria(self, position: int, criteria: Optional[Dict[str, Any]], insert: bool) -> "EligibilityColumns":
+        """Copy with one row's rule replaced, or inserted at position"""
+        rules = list(self.rules)
+        if insert:
+            rules.insert(position, compile_rule(criteria))
+        else:
+            rules[position] = compile_rule(criteria)
+        return EligibilityColumns(rules)
+
+    def evaluate(
+        self,
+        positions: np.ndarray,
+        age: Optional[int] = None,
+        income_level: Optional[str] = None,
+        residency: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate one user against many rows at once.
+
+        Returns:
+            (eligible, has_barriers) boolean arrays aligned with positions
+        """
+        count = len(positions)
+        too_young = np.zeros(count, dtype=bool)
+        too_old = np.zeros(count, dtype=bool)
+        if age is not None:
+            # NaN bounds compare False, so services without them pass
+            too_young = self.age_min[positions] > age
+            too_old = self.age_max[positions] < age
+
+        income_barrier = np.zeros(count, dtype=bool)
+        if income_level and INCOME_RANKS.get(income_level, DEFAULT_INCOME_RANK) > INCOME_LIMIT_RANK:
+            income_barrier = self.income_limited[positions]
+
+        residency_barrier = np.zeros(count, dtype=bool)
+        if residency:
+            required = self.residency[positions]
+            residency_barrier = (required != "") & (required != residency.strip().lower())
+
+        eligible = ~(too_young | too_old)
+        return eligible, ~eligible | income_barrier | residency_barrier
+
+
+def candidate_positions(
+    snapshot: Any,
+    service_ids: Optional[Sequence[int]] = None,
+    category: Optional[str] = None,
+    exact_category: bool = False,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    radius_miles: float = 10.0
+) -> np.ndarray:
+    """
+    Snapshot rows of the active services to evaluate.
+
+    Args:
+        snapshot: CatalogSnapshot to read from
+        service_ids: Only these services
+        category: Category filter
+        exact_category: Match category exactly rather than as a substring
+        latitude, longitude: Only services within radius_miles, nearest first
+        radius_miles: Search radius when a location is given
+    """
+    mask = snapshot.mask(active_only=True, category=category, exact_category=exact_category)
+    if service_ids:
+        mask &= np.isin(snapshot.ids, np.asarray(service_ids, dtype=np.int64))
+    if latitude is not None and longitude is not None:
+        positions, _ = snapshot.nearby_positions(mask, latitude, longitude, radius_miles)
+        return positions
+    return np.flatnonzero(mask)
+
+
+def evaluate_batch(
+    snapshot: Any,
+    positions: np.ndarray,
+    age: Optional[int] = None,
+    income_level: Optional[str] = None,
+    residency: Optional[str] = None,
+    only_eligible: bool = False,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """
+    Check one user against many services.
+
+    Results list services with no barriers first, then eligible services
+    with barriers, then ineligible ones, keeping the candidate order
+    (e.g. by distance) within each group. Barriers are only spelled out
+    for the services returned.
+
+    Returns:
+        Counts of evaluated and eligible services, plus per-service results
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    eligibility = snapshot.eligibility
+    eligible, has_barriers = eligibility.evaluate(positions, age, income_level, residency)
+
+    rank = np.where(eligible, has_barriers.astype(np.int8), 2)
+    order = np.argsort(rank, kind="stable")
+    if only_eligible:
+        order = order[eligible[order]]
+
+    names = snapshot.columns["name"]
+    results = []
+    for index in order[:limit].tolist():
+        position = int(positions[index])
+        barriers = []
+        if has_barriers[index]:
+            _, barriers = assess(eligibility.rules[position], age, income_level, residency)
+        results.append({
+            "service_id": int(snapshot.ids[position]),
+            "service_name": names[position],
+            "category": snapshot.categories[snapshot.category_codes[position]],
+            "eligible": bool(eligible[index]),
+            "barriers": barriers,
+        })
+
+    return {
+        "evaluated": len(positions),
+        "eligible_count": int(eligible.sum()),
+        "results": results,
+    }
@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 from app.config import settings
 
+try:
+    from pgvector.sqlalchemy import Vector
+except ImportError:
+    Vector = None
+
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -28,6 +33,31 @@ class SocialService(Base):
     is_active = Column(Boolean, default=True)
     last_verified = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Supports bounding-box range scans for nearby searches
+        Index("ix_social_services_lat_lon", "latitude", "longitude"),
+        # Natural key used by bulk imports to match existing services
+        Index("ix_social_services_name_address", "name", "address"),
+    )
+
+
+def _embedding_column_type():
+    """Native pgvector column on PostgreSQL when available, JSON array otherwise"""
+    if Vector is not None and settings.DATABASE_URL.startswith("postgresql"):
+        return Vector(settings.EMBEDDING_DIMENSIONS)
+    return JSON
+
+
+class ServiceEmbedding(Base):
+    """Precomputed embedding of a service's descriptive text for semantic search"""
+    __tablename__ = "service_embeddings"
+    
+    service_id = Column(Integer, primary_key=True)
+    model = Column(String(100), index=True)  # Embedding backend that produced the vector
+    content_hash = Column(String(64))  # Hash of the embedded text, to skip unchanged services
+    embedding = Column(_embedding_column_type())
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 
 class UserProfile(Base):
@@ -75,6 +105,45 @@ class ServiceAccess(Base):
     notes = Column(Text)
 
 
+class ToolInvocation(Base):
+    """One agent tool call, recorded with the chat message it answered"""
+    __tablename__ = "tool_invocations"
+    
+    id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, index=True)  # chat_messages.id
+    user_id = Column(String(255), index=True)
+    tool_name = Column(String(100), nullable=False)
+    category = Column(String(50), nullable=True)  # Service category requested, if any
+    arguments = Column(JSON)
+    result_count = Column(Integer, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Category demand and tool usage over a time window
+        Index("ix_tool_invocations_created_category", "created_at", "category"),
+        Index("ix_tool_invocations_tool_created", "tool_name", "created_at"),
+    )
+
+
+class AnalyticsRollup(Base):
+    """Pre-aggregated analytics counter, maintained as messages and accesses are written"""
+    __tablename__ = "analytics_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(10), nullable=False)  # day, hour
+    bucket = Column(DateTime, nullable=False)  # Start of the day/hour
+    metric = Column(String(50), nullable=False)  # messages, accesses, active_user, ...
+    dim1 = Column(String(255), nullable=False, default="")  # e.g. user ID, service ID, category
+    dim2 = Column(String(255), nullable=False, default="")  # e.g. service name
+    value = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket", "metric", "dim1", "dim2", name="uq_analytics_rollups_key"),
+        Index("ix_analytics_rollups_metric_bucket", "metric", "granularity", "bucket"),
+    )
+
+
 def get_db():
     """Dependency for FastAPI"""
     db = SessionLocal()
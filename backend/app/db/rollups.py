@@ -0,0 +1,275 @@
+"""
+Incrementally maintained analytics rollups
+Every flush that writes chat messages, feedback, service accesses or user
+profiles adds to daily (and, for headline counters, hourly) buckets in the
+same transaction, and deletes take their contributions back out. Run
+`python -m app.db.rollups` to rebuild from raw tables.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.db.models import AnalyticsRollup, ChatMessage, ServiceAccess, SocialService, UserProfile
+from app.db.database import SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+DAY = "day"
+HOUR = "hour"
+
+# Counters also kept per hour; dimensioned metrics are daily only
+HOURLY_METRICS = {"messages", "feedback", "helpful", "accesses"}
+
+# (metric, timestamp, dim1, dim2, delta)
+Delta = Tuple[str, datetime, str, str, int]
+RollupKey = Tuple[str, datetime, str, str, str]
+
+_table = AnalyticsRollup.__table__
+
+
+def truncate(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the day or hour containing timestamp"""
+    if granularity == HOUR:
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def message_deltas(message: ChatMessage) -> List[Delta]:
+    timestamp = message.timestamp or datetime.utcnow()
+    deltas = [
+        ("messages", timestamp, "", "", 1),
+        ("active_user", timestamp, message.user_id or "", "", 1),
+    ]
+    deltas.extend(feedback_deltas(timestamp, None, message.helpful))
+    return deltas
+
+
+def feedback_deltas(timestamp: datetime, old: Optional[bool], new: Optional[bool]) -> List[Delta]:
+    """Adjust feedback counters when a message's helpful flag changes"""
+    deltas = []
+    feedback = (new is not None) - (old is not None)
+    helpful = (new is True) - (old is True)
+    if feedback:
+        deltas.append(("feedback", timestamp, "", "", feedback))
+    if helpful:
+        deltas.append(("helpful", timestamp, "", "", helpful))
+    return deltas
+
+
+def access_deltas(access: ServiceAccess, category: Optional[str]) -> List[Delta]:
+    timestamp = access.access_date or datetime.utcnow()
+    deltas = [
+        ("accesses", timestamp, "", "", 1),
+        ("access_by_service", timestamp, str(access.service_id), access.service_name or "", 1),
+        ("access_by_outcome", timestamp, access.outcome or "", "", 1),
+        ("access_by_contact_method", timestamp, access.contact_method or "", "", 1),
+    ]
+    if category:
+        deltas.append(("access_by_category", timestamp, category, "", 1))
+        deltas.append(("category_user", timestamp, category, access.user_id or "", 1))
+    return deltas
+
+
+def profile_deltas(profile: UserProfile) -> List[Delta]:
+    return [("new_users", profile.created_at or datetime.utcnow(), "", "", 1)]
+
+
+def retract(deltas: Iterable[Delta]) -> List[Delta]:
+    """The deltas that undo deltas, for records being deleted"""
+    return [(metric, timestamp, dim1, dim2, -delta) for metric, timestamp, dim1, dim2, delta in deltas]
+
+
+def aggregate(deltas: Iterable[Delta], totals: Optional[Counter] = None) -> Counter:
+    """Expand deltas into per-bucket increments, merging duplicates into totals"""
+    totals = Counter() if totals is None else totals
+    for metric, timestamp, dim1, dim2, delta in deltas:
+        granularities = (DAY, HOUR) if metric in HOURLY_METRICS else (DAY,)
+        for granularity in granularities:
+            totals[(granularity, truncate(timestamp, granularity), metric, dim1, dim2)] += delta
+    return totals
+
+
+def apply(connection: Connection, totals: Dict[RollupKey, int]):
+    """Add increments to the rollup table with an upsert, dropping buckets that fall to zero"""
+    rows = [
+        {"granularity": granularity, "bucket": bucket, "metric": metric, "dim1": dim1, "dim2": dim2, "value": value}
+        for (granularity, bucket, metric, dim1, dim2), value in totals.items()
+        if value
+    ]
+    if not rows:
+        return
+    _add(connection, rows)
+
+    # Distinct counts (users, services) count buckets, so emptied ones must go
+    emptied = [
+        {"g": row["granularity"], "b": row["bucket"], "m": row["metric"], "d1": row["dim1"], "d2": row["dim2"]}
+        for row in rows
+        if row["value"] < 0
+    ]
+    if emptied:
+        connection.execute(
+            _table.delete().where(
+                _table.c.granularity == bindparam("g"),
+                _table.c.bucket == bindparam("b"),
+                _table.c.metric == bindparam("m"),
+                _table.c.dim1 == bindparam("d1"),
+                _table.c.dim2 == bindparam("d2"),
+                _table.c.value <= 0,
+            ),
+            emptied
+        )
+
+
+def _add(connection: Connection, rows: List[Dict]):
+    """Upsert rollup rows, adding their values to existing buckets"""
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["granularity", "bucket", "metric", "dim1", "dim2"],
+            set_={"value": _table.c.value + statement.excluded.value}
+        )
+        connection.execute(statement, rows)
+        return
+
+    # Other databases: update in place, insert when the bucket is new
+    for row in rows:
+        result = connection.execute(
+            update(_table)
+            .where(
+                _table.c.granularity == row["granularity"],
+                _table.c.bucket == row["bucket"],
+                _table.c.metric == row["metric"],
+                _table.c.dim1 == row["dim1"],
+                _table.c.dim2 == row["dim2"],
+            )
+            .values(value=_table.c.value + row["value"])
+        )
+        if result.rowcount == 0:
+            connection.execute(_table.insert(), row)
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_after_flush(session: Session, flush_context):
+    """Fold this flush's analytics writes into the rollups, in the same transaction"""
+    deltas: List[Delta] = []
+    accesses = []
+    removed_accesses = []
+
+    for obj in session.new:
+        if isinstance(obj, ChatMessage):
+            deltas.extend(message_deltas(obj))
+        elif isinstance(obj, ServiceAccess):
+            accesses.append(obj)
+        elif isinstance(obj, UserProfile):
+            deltas.extend(profile_deltas(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, ChatMessage):
+            deltas.extend(retract(message_deltas(obj)))
+        elif isinstance(obj, ServiceAccess):
+            removed_accesses.append(obj)
+        elif isinstance(obj, UserProfile):
+            deltas.extend(retract(profile_deltas(obj)))
+
+    for obj in session.dirty:
+        if isinstance(obj, ChatMessage):
+            history = inspect(obj).attrs.helpful.history
+            if history.has_changes():
+                old = history.deleted[0] if history.deleted else None
+                new = history.added[0] if history.added else None
+                deltas.extend(feedback_deltas(obj.timestamp or datetime.utcnow(), old, new))
+
+    if not deltas and not accesses and not removed_accesses:
+        return
+
+    connection = session.connection()
+    if accesses or removed_accesses:
+        service_ids = {access.service_id for access in accesses + removed_accesses}
+        categories = dict(connection.execute(
+            select(SocialService.id, SocialService.category).where(SocialService.id.in_(service_ids))
+        ).all())
+        for access in accesses:
+            deltas.extend(access_deltas(access, categories.get(access.service_id)))
+        for access in removed_accesses:
+            deltas.extend(retract(access_deltas(access, categories.get(access.service_id))))
+
+    apply(connection, aggregate(deltas))
+
+
+def retract_messages(db: Session, *criteria):
+    """
+    Take the chat messages matching criteria out of the rollups.
+
+    Bulk deletes (e.g. clearing a user's history) bypass the flush hook, so
+    call this in the same transaction, before the delete.
+    """
+    messages = db.execute(
+        select(ChatMessage.timestamp, ChatMessage.user_id, ChatMessage.helpful).where(*criteria)
+    ).all()
+    if messages:
+        deltas = [delta for message in messages for delta in retract(message_deltas(message))]
+        apply(db.connection(), aggregate(deltas))
+
+
+def rebuild_rollups(db: Optional[Session] = None):
+    """
+    Recompute every rollup from the raw tables.
+
+    Args:
+        db: Optional session; a new one is opened if omitted
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        totals = Counter()
+        for message in db.query(ChatMessage).yield_per(1000):
+            aggregate(message_deltas(message), totals)
+        categories = dict(db.query(SocialService.id, SocialService.category).all())
+        for access in db.query(ServiceAccess).yield_per(1000):
+            aggregate(access_deltas(access, categories.get(access.service_id)), totals)
+        for profile in db.query(UserProfile).yield_per(1000):
+            aggregate(profile_deltas(profile), totals)
+
+        connection = db.connection()
+        connection.execute(_table.delete())
+        apply(connection, totals)
+        db.commit()
+        logger.info(f"Rebuilt analytics rollups ({len(totals)} buckets)")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rebuilding analytics rollups: {e}")
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+def backfill_if_empty():
+    """Build rollups for databases that predate them"""
+    db = SessionLocal()
+    try:
+        if db.scalar(select(func.count()).select_from(_table)):
+            return
+        has_history = (
+            db.scalar(select(func.count(ChatMessage.id)))
+            or db.scalar(select(func.count(ServiceAccess.id)))
+        )
+    finally:
+        db.close()
+    if has_history:
+        rebuild_rollups()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    rebuild_rollups()
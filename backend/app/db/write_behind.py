@@ -0,0 +1,224 @@
+"""
+Write-behind buffer for append-only records (chat messages, service access logs)
+Requests enqueue ORM objects and return; a background thread inserts them in
+batches when the buffer fills or the flush interval passes
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import Counter, defaultdict, deque
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.database import SessionLocal
+import atexit
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (record, dependent records, foreign key attribute set on dependents from record.id)
+PendingWrite = Tuple[Any, List[Any], Optional[str]]
+
+
+class WriteBehindBuffer:
+    """
+    Batches inserts of records that nothing reads back immediately.
+
+    Args:
+        batch_size: Flush as soon as this many records are queued
+        flush_interval: Flush queued records at least this often (seconds)
+        max_queue: Above this depth, enqueue flushes in the caller instead
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = settings.WRITE_BEHIND_FLUSH_SECONDS,
+        max_queue: int = settings.WRITE_BEHIND_MAX_QUEUE
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue: deque = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()  # Batches are written one at a time, in order
+        self._pending_users: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write everything still queued"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.flush_interval * 5, 5.0))
+            self._thread = None
+        self.flush()
+
+    def enqueue(self, record: Any, dependents: Optional[List[Any]] = None, link: Optional[str] = None):
+        """
+        Queue a record for insertion.
+
+        Args:
+            record: ORM object to insert
+            dependents: ORM objects inserted after record in the same batch
+            link: Attribute on each dependent that receives record.id
+        """
+        with self._condition:
+            self._queue.append((record, dependents or [], link))
+            user_id = getattr(record, "user_id", None)
+            if user_id:
+                self._pending_users[user_id] += 1
+            depth = len(self._queue)
+            if depth >= self.batch_size:
+                self._condition.notify()
+
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        if depth > self.max_queue:
+            logger.warning(f"Write-behind queue at {depth} records, flushing inline")
+            self.flush()
+
+    def has_pending(self, user_id: str) -> bool:
+        """Whether records for this user are still waiting to be written"""
+        with self._condition:
+            return self._pending_users.get(user_id, 0) > 0
+
+    def flush(self) -> int:
+        """Write everything queued right now; returns the number of records written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    return written
+                written += self._write(batch)
+
+    def _take(self, limit: int) -> List[PendingWrite]:
+        with self._condition:
+            batch = []
+            while self._queue and len(batch) < limit:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._queue) < self.batch_size:
+                    self._condition.wait(timeout=self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def _insert(self, db: Session, batch: List[PendingWrite]) -> int:
+        """Insert a batch and return how many of its records are in the database afterwards"""
+        db.add_all(record for record, _, _ in batch)
+        db.flush()  # Assigns record IDs for the dependents and the check below
+        for record, dependents, link in batch:
+            for dependent in dependents:
+                if link:
+                    setattr(dependent, link, record.id)
+                db.add(dependent)
+        ids_by_model: Dict[Any, List[int]] = defaultdict(list)
+        for record, _, _ in batch:
+            ids_by_model[type(record)].append(record.id)
+        db.commit()
+        # Count only rows that are readable after the commit
+        return sum(
+            db.query(func.count(model.id)).filter(model.id.in_(ids)).scalar()
+            for model, ids in ids_by_model.items()
+        )
+
+    def _write(self, batch: List[PendingWrite]) -> int:
+        started = time.perf_counter()
+        # Read before commit, which expires the records
+        user_ids = [getattr(record, "user_id", None) for record, _, _ in batch]
+        written = 0
+        failed = 0
+        db = SessionLocal()
+        try:
+            written = self._insert(db, batch)
+            failed = len(batch) - written
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batch insert of {len(batch)} records failed, retrying one by one: {e}")
+            # Isolate the bad record so the rest of the batch is kept
+            for item in batch:
+                try:
+                    committed = self._insert(db, [item])
+                except Exception as item_error:
+                    db.rollback()
+                    committed = 0
+                    logger.error(f"Dropping record {item[0]!r}: {item_error}")
+                written += committed
+                failed += 1 - committed
+        finally:
+            db.close()
+        if failed:
+            logger.error(f"{failed} of {len(batch)} records could not be confirmed as written")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            for user_id in user_ids:
+                if user_id:
+                    self._pending_users[user_id] -= 1
+                    if self._pending_users[user_id] <= 0:
+                        del self._pending_users[user_id]
+            self.flushed += written
+            self.failed += failed
+            self.batches += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "enabled": settings.WRITE_BEHIND_ENABLED,
+                "queue_depth": len(self._queue),
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+                "max_flush_ms": round(self.max_flush_ms, 2),
+                "batch_size": self.batch_size,
+                "flush_interval_seconds": self.flush_interval,
+            }
+
+
+# Global write-behind buffer instance
+_buffer_instance = None
+
+
+def get_write_buffer() -> WriteBehindBuffer:
+    """Get or create the global write-behind buffer"""
+    global _buffer_instance
+    if _buffer_instance is None:
+        _buffer_instance = WriteBehindBuffer()
+        # Scripts that never run the app lifespan still get their writes
+        atexit.register(_buffer_instance.stop)
+    return _buffer_instance
@@ -0,0 +1,6 @@
+"""
+Initialize geo module
+"""
+from . import distance, geohash, spatial_index, nearby, locations
+
+__all__ = ['distance', 'geohash', 'spatial_index', 'nearby', 'locations']
@@ -0,0 +1,100 @@
+"""
+Vectorized great-circle distance helpers shared by the API and agent tools
+"""
+
+from typing import Tuple, Union
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+MILES_PER_DEGREE_LAT = 69.0
+
+ArrayLike = Union[float, np.ndarray]
+
+
+def haversine_miles(lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike, lon2: ArrayLike) -> ArrayLike:
+    """
+    Great-circle distance in miles between coordinates.
+
+    Inputs broadcast against each other, so one origin can be measured
+    against an array of points in a single call.
+
+    Returns:
+        A float for scalar inputs, otherwise an array of distances
+    """
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    sin_dlat = np.sin((lat2_rad - lat1_rad) / 2)
+    sin_dlon = np.sin(np.radians(np.subtract(lon2, lon1)) / 2)
+
+    a = sin_dlat**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * sin_dlon**2
+    distance = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return float(distance) if np.ndim(distance) == 0 else distance
+
+
+def distance_matrix(
+    origin_lats: np.ndarray,
+    origin_lons: np.ndarray,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Distances from many origins to many points.
+
+    Returns:
+        Array of shape (len(origins), len(points)) in miles
+    """
+    origin_lats = np.asarray(origin_lats, dtype=np.float64)[:, np.newaxis]
+    origin_lons = np.asarray(origin_lons, dtype=np.float64)[:, np.newaxis]
+    return haversine_miles(origin_lats, origin_lons, np.asarray(lats), np.asarray(lons))
+
+
+def bounding_box(latitude: float, longitude: float, radius_miles: float) -> Tuple[float, float, float, float]:
+    """
+    Lat/lon box that fully contains a search circle.
+
+    Returns:
+        (min_lat, max_lat, min_lon, max_lon), clamped to valid coordinates
+    """
+    lat_span = radius_miles / MILES_PER_DEGREE_LAT
+    cos_lat = np.cos(np.radians(latitude))
+    lon_span = 180.0 if cos_lat < 1e-6 else min(180.0, lat_span / cos_lat)
+
+    return (
+        max(-90.0, latitude - lat_span),
+        min(90.0, latitude + lat_span),
+        max(-180.0, longitude - lon_span),
+        min(180.0, longitude + lon_span),
+    )
+
+
+def within_radius(
+    latitude: float,
+    longitude: float,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    radius_miles: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the points within a radius of an origin.
+
+    A bounding-box mask discards most points before the exact haversine
+    distance is computed for the survivors.
+
+    Returns:
+        (indices, distances) into the input arrays, sorted by distance
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_miles)
+    candidates = np.flatnonzero(
+        (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+    )
+
+    distances = haversine_miles(latitude, longitude, lats[candidates], lons[candidates])
+    inside = distances <= radius_miles
+    candidates = candidates[inside]
+    distances = distances[inside]
+
+    order = np.argsort(distances, kind="stable")
+    return candidates[order], distances[order]
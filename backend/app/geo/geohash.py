@@ -0,0 +1,115 @@
+"""
+Geohash encoding used to quantize coordinates into shareable cache cells
+"""
+
+from typing import Set, Tuple
+from app.geo.distance import haversine_miles
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+Bounds = Tuple[float, float, float, float]  # (min_lat, max_lat, min_lon, max_lon)
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    """Geohash of the cell containing the coordinate"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # Bits alternate starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> Bounds:
+    """(min_lat, max_lat, min_lon, max_lon) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            target[1 - bit] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def center(geohash: str) -> Tuple[float, float]:
+    """(latitude, longitude) of a geohash cell's center"""
+    min_lat, max_lat, min_lon, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(lat_degrees, lon_degrees) spanned by cells of the given precision"""
+    total_bits = 5 * precision
+    lon_bits = math.ceil(total_bits / 2)
+    lat_bits = total_bits - lon_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def half_diagonal_miles(geohash: str) -> float:
+    """Distance from a cell's center to its farthest corner"""
+    min_lat, max_lat, min_lon, max_lon = bounds(geohash)
+    lat, lon = center(geohash)
+    # The corner nearest the equator is the widest one
+    corner_lat = min_lat if abs(min_lat) < abs(max_lat) else max_lat
+    return haversine_miles(lat, lon, corner_lat, max_lon)
+
+
+def covering(area: Bounds, precision: int, max_cells: int) -> Set[str]:
+    """
+    Geohash cells that together cover a bounding box.
+
+    Returns an empty set when more than max_cells would be needed, so the
+    caller can fall back to a coarser tag.
+    """
+    min_lat, max_lat, min_lon, max_lon = area
+    lat_step, lon_step = cell_size(precision)
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+
+    lat_start = math.floor((min_lat + 90.0) / lat_step)
+    lat_end = math.floor((max_lat + 90.0) / lat_step)
+    lon_start = math.floor((min_lon + 180.0) / lon_step)
+    lon_end = math.floor((max_lon + 180.0) / lon_step)
+    if (lat_end - lat_start + 1) * (lon_end - lon_start + 1) > max_cells:
+        return set()
+
+    cells = set()
+    for lat_index in range(lat_start, lat_end + 1):
+        lat = min(-90.0 + (lat_index + 0.5) * lat_step, 90.0)
+        for lon_index in range(lon_start, lon_end + 1):
+            lon = min(-180.0 + (lon_index + 0.5) * lon_step, 180.0)
+            cells.add(encode(lat, lon, precision))
+    return cells
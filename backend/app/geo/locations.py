@@ -0,0 +1,255 @@
+"""
+Precomputed city index for location autocomplete
+Each city's centroid, bounding box and per-category service counts are kept
+up to date on service writes; a prefix trie over the words of each city name
+answers keystroke lookups without touching the services
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import Counter
+from sqlalchemy.orm import Session
+from app.db.models import SocialService
+from app.db.database import SessionLocal
+import heapq
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (city, latitude, longitude, category) contributed by one service
+Placement = Tuple[str, float, float, Optional[str]]
+
+
+def city_from_address(address: str) -> str:
+    """Guess the city from an address (usually the part before the last comma)"""
+    address_parts = address.split(',')
+    return address_parts[-2].strip() if len(address_parts) > 1 else address_parts[0].strip()
+
+
+def _placement(service: Any) -> Optional[Placement]:
+    if not service.is_active or not service.address or not service.latitude or not service.longitude:
+        return None
+    return (city_from_address(service.address), service.latitude, service.longitude, service.category)
+
+
+class _TrieNode:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.values: Set[str] = set()
+
+
+class PrefixTrie:
+    """Maps every prefix of a key to the values stored under keys with that prefix"""
+
+    def __init__(self):
+        self._root = _TrieNode()
+
+    def add(self, key: str, value: str):
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            node.values.add(value)
+
+    def discard(self, key: str, value: str):
+        path = []
+        node = self._root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                return
+            path.append((node, char, child))
+            node = child
+        for parent, char, child in reversed(path):
+            child.values.discard(value)
+            if not child.values and not child.children:
+                del parent.children[char]
+
+    def find(self, prefix: str) -> Set[str]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.values
+
+
+class LocationIndex:
+    """
+    City summaries for active services, searchable by name prefix.
+
+    Every word of a city name is indexed, so "delhi" finds "New Delhi".
+    Queries that are not a word prefix fall back to a substring scan of
+    the city names, which matches the original endpoint's behavior.
+    """
+
+    def __init__(self):
+        self._placements: Dict[int, Placement] = {}
+        self._members: Dict[str, Dict[int, Placement]] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._trie = PrefixTrie()
+        self._lock = threading.RLock()
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    @staticmethod
+    def _words(city: str) -> Set[str]:
+        lowered = city.lower()
+        return {lowered} | set(lowered.split())
+
+    def build(self, db: Optional[Session] = None):
+        """
+        (Re)build the index from all active services.
+
+        Args:
+            db: Optional session to read from; a new one is opened if omitted
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            rows = (
+                db.query(
+                    SocialService.id, SocialService.address, SocialService.latitude,
+                    SocialService.longitude, SocialService.category, SocialService.is_active
+                )
+                .filter(SocialService.is_active == True)
+                .all()
+            )
+            with self._lock:
+                self._placements = {}
+                self._members = {}
+                self._summaries = {}
+                self._trie = PrefixTrie()
+                for row in rows:
+                    self._add(row.id, _placement(row))
+                self._built = True
+            logger.info(f"Location index built with {len(self._members)} cities from {len(rows)} services")
+        finally:
+            if own_session:
+                db.close()
+
+    def ensure_built(self):
+        """Build the index lazily when used outside the app lifespan (e.g. scripts)"""
+        if not self._built:
+            self.build()
+
+    def upsert(self, service: SocialService):
+        """Insert or move a service; inactive or unlocated services are removed"""
+        with self._lock:
+            self._discard(service.id)
+            self._add(service.id, _placement(service))
+
+    def remove(self, service_id: int):
+        """Remove a service from the index if present"""
+        with self._lock:
+            self._discard(service_id)
+
+    def _add(self, service_id: int, placement: Optional[Placement]):
+        if placement is None:
+            return
+        city = placement[0]
+        self._placements[service_id] = placement
+        members = self._members.get(city)
+        if members is None:
+            members = self._members[city] = {}
+            for word in self._words(city):
+                self._trie.add(word, city)
+        members[service_id] = placement
+        self._summaries.pop(city, None)
+
+    def _discard(self, service_id: int):
+        placement = self._placements.pop(service_id, None)
+        if placement is None:
+            return
+        city = placement[0]
+        members = self._members[city]
+        del members[service_id]
+        self._summaries.pop(city, None)
+        if not members:
+            del self._members[city]
+            for word in self._words(city):
+                self._trie.discard(word, city)
+
+    def _summary(self, city: str) -> Dict[str, Any]:
+        """Centroid, bounding box and counts for a city, recomputed only after it changes"""
+        summary = self._summaries.get(city)
+        if summary is None:
+            placements = list(self._members[city].values())
+            lats = [latitude for _, latitude, _, _ in placements]
+            lons = [longitude for _, _, longitude, _ in placements]
+            categories = Counter(category for _, _, _, category in placements if category)
+            summary = {
+                "city": city,
+                "latitude": round(sum(lats) / len(lats), 6),
+                "longitude": round(sum(lons) / len(lons), 6),
+                "bounding_box": {
+                    "min_latitude": min(lats),
+                    "max_latitude": max(lats),
+                    "min_longitude": min(lons),
+                    "max_longitude": max(lons),
+                },
+                "service_count": len(placements),
+                "categories": dict(categories.most_common()),
+            }
+            self._summaries[city] = summary
+        return summary
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Find cities matching a query.
+
+        Args:
+            query: Start of any word in the city name (case insensitive)
+            limit: Maximum number of cities to return
+
+        Returns:
+            City summaries, whole-name prefix matches first, then by service count
+        """
+        self.ensure_built()
+        needle = " ".join(query.lower().split())
+        if not needle:
+            return []
+
+        with self._lock:
+            cities = set(self._trie.find(needle))
+            if not cities:
+                cities = {city for city in self._members if needle in city.lower()}
+            ranked = heapq.nsmallest(
+                limit,
+                cities,
+                key=lambda city: (not city.lower().startswith(needle), -len(self._members[city]), city)
+            )
+            return [dict(self._summary(city)) for city in ranked]
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Summary of the city with exactly this name (case insensitive), if any"""
+        self.ensure_built()
+        needle = " ".join(name.lower().split())
+        if not needle:
+            return None
+
+        with self._lock:
+            for city in self._trie.find(needle):
+                if city.lower() == needle:
+                    return dict(self._summary(city))
+            return None
+
+
+# Global index instance
+_location_index_instance = None
+
+
+def get_location_index() -> LocationIndex:
+    """Get or create the global location index"""
+    global _location_index_instance
+    if _location_index_instance is None:
+        _location_index_instance = LocationIndex()
+    return _location_index_instance
@@ -0,0 +1,106 @@
+"""
+Nearby search entry point shared by the resources API and agent tools
+Dispatches between the in-memory spatial index and SQL bounding-box filtering
+"""
+
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Query
+from app.config import settings
+from app.db import database
+from app.db.models import SocialService
+from app.geo.distance import bounding_box, within_radius
+from app.geo.spatial_index import get_spatial_index, services_for_hits
+import numpy as np
+
+METERS_PER_MILE = 1609.344
+
+
+def radius_filter(query: Query, latitude: float, longitude: float, radius_miles: float) -> Query:
+    """
+    Restrict a SocialService query to the bounding box of a search circle.
+
+    The range predicates use the (latitude, longitude) index; on PostgreSQL
+    with earthdistance an earth_box predicate additionally uses the GiST index.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_miles)
+    query = query.filter(
+        SocialService.latitude.between(min_lat, max_lat),
+        SocialService.longitude.between(min_lon, max_lon)
+    )
+
+    if database.earthdistance_enabled:
+        query = query.filter(
+            text(
+                "earth_box(ll_to_earth(:origin_lat, :origin_lon), :radius_m) "
+                "@> ll_to_earth(social_services.latitude, social_services.longitude)"
+            ).bindparams(
+                origin_lat=latitude,
+                origin_lon=longitude,
+                radius_m=radius_miles * METERS_PER_MILE
+            )
+        )
+
+    return query
+
+
+def sql_radius_hits(
+    query: Query,
+    latitude: float,
+    longitude: float,
+    radius_miles: float
+) -> List[Tuple[int, float]]:
+    """
+    Find services within a radius by filtering in SQL first.
+
+    Only (id, latitude, longitude) tuples for rows inside the bounding box
+    are fetched; exact distances are computed for those survivors.
+
+    Returns:
+        (service_id, distance_miles) pairs sorted by distance
+    """
+    rows = (
+        radius_filter(query, latitude, longitude, radius_miles)
+        .with_entities(SocialService.id, SocialService.latitude, SocialService.longitude)
+        .all()
+    )
+    if not rows:
+        return []
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lats = np.array([row[1] for row in rows], dtype=np.float64)
+    lons = np.array([row[2] for row in rows], dtype=np.float64)
+
+    indices, distances = within_radius(latitude, longitude, lats, lons, radius_miles)
+    return list(zip(ids[indices].tolist(), distances.tolist()))
+
+
+def find_nearby(
+    query: Query,
+    latitude: float,
+    longitude: float,
+    radius_miles: float,
+    limit: Optional[int] = None
+) -> List[Tuple[SocialService, float]]:
+    """
+    Find services matching a query within a radius, nearest first.
+
+    Args:
+        query: A SocialService query with the caller's filters applied
+        latitude: Search origin latitude
+        longitude: Search origin longitude
+        radius_miles: Search radius in miles
+        limit: Maximum number of services to load
+
+    Returns:
+        (service, distance_miles) pairs sorted by distance
+    """
+    if settings.GEO_SEARCH_MODE == "sql":
+        hits = sql_radius_hits(query, latitude, longitude, radius_miles)
+    else:
+        hits = get_spatial_index().query_radius(latitude, longitude, radius_miles)
+
+    if not hits:
+        return []
+
+    return services_for_hits(query, hits, limit=limit)
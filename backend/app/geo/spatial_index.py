@@ -0,0 +1,270 @@
+"""
+In-memory spatial index over service coordinates for nearby searches
+Built once at startup and kept in sync by the resources API write endpoints
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session, Query
+from app.db.models import SocialService
+from app.db.database import SessionLocal
+from app.geo.distance import EARTH_RADIUS_MILES, MILES_PER_DEGREE_LAT, bounding_box, within_radius
+import numpy as np
+import math
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of IDs bound into a single IN (...) clause
+ID_CHUNK_SIZE = 500
+
+Cell = Tuple[int, int]
+CellArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class SpatialIndex:
+    """
+    Grid-bucket index of active services keyed by coordinates.
+
+    The globe is divided into fixed-size lat/lon cells. A radius query only
+    visits the cells overlapping the search bounding box, so its cost depends
+    on local density rather than on the size of the catalog. Each cell keeps
+    its coordinates as NumPy arrays so candidates are measured in one
+    vectorized call.
+    """
+
+    def __init__(self, cell_size_degrees: float = 0.05):
+        """
+        Args:
+            cell_size_degrees: Edge length of a grid cell (0.05 deg is ~3.5 miles)
+        """
+        self.cell_size = cell_size_degrees
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._cell_arrays: Dict[Cell, CellArrays] = {}
+        self._lock = threading.RLock()
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        return (
+            math.floor(latitude / self.cell_size),
+            math.floor(longitude / self.cell_size)
+        )
+
+    def build(self, db: Optional[Session] = None):
+        """
+        (Re)build the index from all active services.
+
+        Args:
+            db: Optional session to read from; a new one is opened if omitted
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            rows = (
+                db.query(SocialService.id, SocialService.latitude, SocialService.longitude)
+                .filter(SocialService.is_active == True)
+                .all()
+            )
+
+            cells: Dict[Cell, Set[int]] = {}
+            points: Dict[int, Tuple[float, float]] = {}
+            for service_id, latitude, longitude in rows:
+                if latitude is None or longitude is None:
+                    continue
+                points[service_id] = (latitude, longitude)
+                cells.setdefault(self._cell(latitude, longitude), set()).add(service_id)
+
+            with self._lock:
+                self._cells = cells
+                self._points = points
+                self._cell_arrays = {}
+                self._built = True
+
+            logger.info(f"Spatial index built with {len(points)} services in {len(cells)} cells")
+        finally:
+            if own_session:
+                db.close()
+
+    def ensure_built(self):
+        """Build the index lazily when used outside the app lifespan (e.g. scripts)"""
+        if not self._built:
+            self.build()
+
+    def upsert(self, service: SocialService):
+        """Insert or move a service; inactive or unlocated services are removed"""
+        if not service.is_active or service.latitude is None or service.longitude is None:
+            self.remove(service.id)
+            return
+
+        with self._lock:
+            self._discard(service.id)
+            cell = self._cell(service.latitude, service.longitude)
+            self._points[service.id] = (service.latitude, service.longitude)
+            self._cells.setdefault(cell, set()).add(service.id)
+            self._cell_arrays.pop(cell, None)
+
+    def remove(self, service_id: int):
+        """Remove a service from the index if present"""
+        with self._lock:
+            self._discard(service_id)
+
+    def _discard(self, service_id: int):
+        point = self._points.pop(service_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        self._cell_arrays.pop(cell, None)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(service_id)
+            if not members:
+                del self._cells[cell]
+
+    def query_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_miles: float
+    ) -> List[Tuple[int, float]]:
+        """
+        Find services within a radius.
+
+        Args:
+            latitude: Search origin latitude
+            longitude: Search origin longitude
+            radius_miles: Search radius in miles
+
+        Returns:
+            (service_id, distance_miles) pairs sorted by distance
+        """
+        self.ensure_built()
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_miles)
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+
+        with self._lock:
+            # For very wide searches walking occupied cells is cheaper than
+            # enumerating every cell in the bounding box
+            if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+                cells = [
+                    cell for cell in self._cells
+                    if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+                ]
+            else:
+                cells = [
+                    (row, col)
+                    for row in range(min_row, max_row + 1)
+                    for col in range(min_col, max_col + 1)
+                    if (row, col) in self._cells
+                ]
+            arrays = [self._arrays_for(cell) for cell in cells]
+
+        if not arrays:
+            return []
+
+        ids = np.concatenate([cell_ids for cell_ids, _, _ in arrays])
+        lats = np.concatenate([cell_lats for _, cell_lats, _ in arrays])
+        lons = np.concatenate([cell_lons for _, _, cell_lons in arrays])
+
+        indices, distances = within_radius(latitude, longitude, lats, lons, radius_miles)
+        return list(zip(ids[indices].tolist(), distances.tolist()))
+
+    def _arrays_for(self, cell: Cell) -> CellArrays:
+        """Coordinate arrays for a cell, rebuilt only after the cell changes"""
+        arrays = self._cell_arrays.get(cell)
+        if arrays is None:
+            members = list(self._cells[cell])
+            arrays = (
+                np.fromiter(members, dtype=np.int64, count=len(members)),
+                np.array([self._points[service_id][0] for service_id in members], dtype=np.float64),
+                np.array([self._points[service_id][1] for service_id in members], dtype=np.float64),
+            )
+            self._cell_arrays[cell] = arrays
+        return arrays
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        max_radius_miles: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the k nearest services by expanding the search radius.
+
+        Args:
+            latitude: Search origin latitude
+            longitude: Search origin longitude
+            k: Number of services to return
+            max_radius_miles: Optional upper bound on distance
+
+        Returns:
+            Up to k (service_id, distance_miles) pairs sorted by distance
+        """
+        self.ensure_built()
+
+        radius = self.cell_size * MILES_PER_DEGREE_LAT
+        limit = max_radius_miles if max_radius_miles is not None else math.pi * EARTH_RADIUS_MILES
+        while True:
+            radius = min(radius, limit)
+            hits = self.query_radius(latitude, longitude, radius)
+            # Every point within `radius` was visited, so the first k are exact
+            if len(hits) >= k or len(hits) == len(self) or radius >= limit:
+                return hits[:k]
+            radius *= 2
+
+
+def services_for_hits(
+    query: Query,
+    hits: List[Tuple[int, float]],
+    limit: Optional[int] = None
+) -> List[Tuple[SocialService, float]]:
+    """
+    Load services for index hits, applying any filters already on the query.
+
+    Args:
+        query: A SocialService query with the caller's filters applied
+        hits: (service_id, distance_miles) pairs from the index, nearest first
+        limit: Stop loading once this many matching services are found
+
+    Returns:
+        (service, distance_miles) pairs in the same order as hits
+    """
+    matches = []
+    for start in range(0, len(hits), ID_CHUNK_SIZE):
+        chunk = hits[start:start + ID_CHUNK_SIZE]
+        services_by_id = {
+            service.id: service
+            for service in query.filter(SocialService.id.in_([service_id for service_id, _ in chunk])).all()
+        }
+        matches.extend(
+            (services_by_id[service_id], distance)
+            for service_id, distance in chunk
+            if service_id in services_by_id
+        )
+        if limit is not None and len(matches) >= limit:
+            return matches[:limit]
+
+    return matches
+
+
+# Global index instance
+_index_instance = None
+
+
+def get_spatial_index() -> SpatialIndex:
+    """Get or create the global spatial index"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = SpatialIndex()
+    return _index_instance
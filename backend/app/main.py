@@ -9,6 +9,12 @@ import logging
 
 from app.config import settings
 from app.db.database import init_db
+from app.geo.spatial_index import get_spatial_index
+from app.geo.locations import get_location_index
+from app.search.trigram import get_trigram_index
+from app.db.write_behind import get_write_buffer
+from app.db.catalog_snapshot import get_catalog
+from app.db.catalog_sync import watch_catalog
 from app.api import chat, resources, analytics
 
 # Setup logging
@@ -23,10 +29,22 @@ async def lifespan(app: FastAPI):
     try:
         init_db()
         logger.info("Database initialized successfully")
+        # Before the builds, so writes made elsewhere during them are picked up
+        watch_catalog()
+        if settings.GEO_SEARCH_MODE == "memory":
+            get_spatial_index().build()
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            get_catalog().build()
+        get_location_index().build()
+        get_trigram_index().build()
+        if settings.WRITE_BEHIND_ENABLED:
+            get_write_buffer().start()
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
     yield
     logger.info("Shutting down application")
+    # Write out any queued chat messages and access logs
+    get_write_buffer().stop()
 
 
 # Initialize FastAPI app
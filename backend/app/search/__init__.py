@@ -0,0 +1,6 @@
+"""
+Initialize search module
+"""
+from . import fulltext, embeddings, semantic, trigram
+
+__all__ = ['fulltext', 'embeddings', 'semantic', 'trigram']
@@ -0,0 +1,108 @@
+"""
+Pluggable text embedding backends for semantic service retrieval
+"""
+
+from typing import List
+from app.config import settings
+import hashlib
+import re
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """Interface for turning text into fixed-size vectors"""
+
+    name = "base"
+
+    def __init__(self, dimensions: int = settings.EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """Google Gemini embeddings via LangChain"""
+
+    name = "gemini"
+
+    def __init__(self, dimensions: int = settings.EMBEDDING_DIMENSIONS):
+        super().__init__(dimensions)
+        # Imported lazily so the local backend works without the Gemini client
+        from app.agents.llm_config import get_embedding_model
+        self.model = get_embedding_model()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic local stand-in for offline development and testing.
+
+    Words and character trigrams are hashed into signed buckets and the
+    vector is L2-normalized, so texts sharing vocabulary score as similar.
+    """
+
+    name = "local-hashing"
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"[^\W_]+", text.lower())
+        trigrams = [
+            padded[i:i + 3]
+            for padded in (f" {word} " for word in words)
+            for i in range(len(padded) - 2)
+        ]
+        return words + trigrams
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float64)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+def create_embedding_backend() -> EmbeddingBackend:
+    """
+    Build the configured embedding backend.
+
+    EMBEDDING_BACKEND may be "gemini" or "local"; when unset, Gemini is used
+    if an API key is configured and the local backend otherwise.
+    """
+    backend = settings.EMBEDDING_BACKEND or ("gemini" if settings.GEMINI_API_KEY else "local")
+    if backend == "gemini":
+        return GeminiEmbeddingBackend()
+    if backend == "local":
+        return HashingEmbeddingBackend()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+# Global backend instance (the Gemini client is reused across queries)
+_embedding_backend_instance = None
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Get or create the global embedding backend"""
+    global _embedding_backend_instance
+    if _embedding_backend_instance is None:
+        _embedding_backend_instance = create_embedding_backend()
+    return _embedding_backend_instance
@@ -0,0 +1,131 @@
+"""
+Full-text keyword search over service name, description and address
+Uses an FTS5 virtual table on SQLite and a tsvector GIN index on PostgreSQL
+"""
+
+from typing import List
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, literal_column, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query
+from app.db.models import SocialService
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "social_services_fts"
+PG_TS_CONFIG = "english"
+PG_DOCUMENT = (
+    "coalesce(social_services.name, '') || ' ' || "
+    "coalesce(social_services.description, '') || ' ' || "
+    "coalesce(social_services.address, '')"
+)
+
+# Kept out of the models metadata so create_all never tries to build it
+_fts_table = Table(FTS_TABLE, MetaData(), Column("rowid", Integer))
+
+# Backend chosen by setup_fulltext: "fts5", "postgres" or None (ilike fallback)
+fulltext_backend = None
+
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, description, address,
+        content='social_services', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS social_services_fts_ai AFTER INSERT ON social_services BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, address)
+        VALUES (new.id, new.name, new.description, new.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS social_services_fts_ad AFTER DELETE ON social_services BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, address)
+        VALUES ('delete', old.id, old.name, old.description, old.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS social_services_fts_au AFTER UPDATE OF name, description, address ON social_services BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, address)
+        VALUES ('delete', old.id, old.name, old.description, old.address);
+        INSERT INTO {FTS_TABLE}(rowid, name, description, address)
+        VALUES (new.id, new.name, new.description, new.address);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def setup_fulltext(engine: Engine):
+    """
+    Create the full-text index for the current database, if supported.
+
+    On SQLite the FTS5 table is kept in sync with social_services by
+    triggers and is populated from existing rows when first created.
+    """
+    global fulltext_backend
+    dialect = engine.dialect.name
+    try:
+        if dialect == "sqlite":
+            if not inspect(engine).has_table(FTS_TABLE):
+                with engine.begin() as conn:
+                    for statement in _SQLITE_SETUP:
+                        conn.execute(text(statement))
+                logger.info("FTS5 index created for social_services")
+            fulltext_backend = "fts5"
+        elif dialect == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_social_services_fts ON social_services "
+                    f"USING gin (to_tsvector('{PG_TS_CONFIG}', {PG_DOCUMENT}))"
+                ))
+            fulltext_backend = "postgres"
+        logger.info(f"Full-text search backend: {fulltext_backend}")
+    except Exception as e:
+        fulltext_backend = None
+        logger.warning(f"Full-text index unavailable, falling back to ilike: {e}")
+
+
+def rebuild_fulltext(engine: Engine):
+    """Repopulate the SQLite FTS5 table from social_services (e.g. after bulk loads)"""
+    if fulltext_backend == "fts5":
+        with engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def tokenize(keywords: str) -> List[str]:
+    """Split free text into search terms, dropping query-syntax characters"""
+    return re.findall(r"[^\W_]+", keywords.lower())
+
+
+def keyword_filter(query: Query, keywords: str) -> Query:
+    """
+    Restrict a SocialService query to rows matching all keywords, best match first.
+
+    Every term is matched as a prefix, so "shel food" finds "Shelter ... food bank".
+    Falls back to the original ilike substring match when no index exists.
+    """
+    terms = tokenize(keywords)
+    if not terms:
+        return query
+
+    if fulltext_backend == "fts5":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return (
+            query.join(_fts_table, _fts_table.c.rowid == SocialService.id)
+            .filter(text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=match))
+            .order_by(func.bm25(text(FTS_TABLE)))
+        )
+
+    if fulltext_backend == "postgres":
+        # Must match the indexed expression exactly for the GIN index to be used
+        document = literal_column(f"to_tsvector('{PG_TS_CONFIG}', {PG_DOCUMENT})")
+        ts_query = func.to_tsquery(
+            literal_column(f"'{PG_TS_CONFIG}'"),
+            " & ".join(f"{term}:*" for term in terms)
+        )
+        return (
+            query.filter(document.op("@@")(ts_query))
+            .order_by(func.ts_rank(document, ts_query).desc())
+        )
+
+    return query.filter(or_(
+        SocialService.name.ilike(f"%{keywords}%"),
+        SocialService.description.ilike(f"%{keywords}%"),
+        SocialService.address.ilike(f"%{keywords}%")
+    ))
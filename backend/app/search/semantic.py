@@ -0,0 +1,208 @@
+"""
+Semantic retrieval over precomputed service embeddings
+Run `python -m app.search.semantic` to (re)embed the service catalog
+"""
+
+from typing import List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy.orm import Session, Query
+from app.db.models import SocialService, ServiceEmbedding, Vector
+from app.db.database import SessionLocal
+from app.geo.spatial_index import services_for_hits
+from app.search.embeddings import EmbeddingBackend, get_embedding_backend
+from app.config import settings
+import hashlib
+import threading
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long the in-process embedding matrix is reused before reloading
+MATRIX_TTL_SECONDS = 300
+
+
+def service_document(service: SocialService) -> str:
+    """Text that represents a service for embedding"""
+    parts = [
+        service.name or "",
+        service.category or "",
+        service.description or "",
+        ", ".join(service.services_provided or []),
+        service.address or "",
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+def embed_services(
+    db: Optional[Session] = None,
+    backend: Optional[EmbeddingBackend] = None,
+    batch_size: int = 64,
+    force: bool = False
+) -> int:
+    """
+    Embed active services whose text changed since they were last embedded.
+
+    Args:
+        db: Optional session; a new one is opened if omitted
+        backend: Embedding backend (defaults to the configured one)
+        batch_size: Number of documents sent to the backend per call
+        force: Re-embed every service even if its text is unchanged
+
+    Returns:
+        Number of services embedded
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    backend = backend or get_embedding_backend()
+    try:
+        existing = dict(
+            db.query(ServiceEmbedding.service_id, ServiceEmbedding.content_hash)
+            .filter(ServiceEmbedding.model == backend.name)
+            .all()
+        )
+
+        pending = []
+        for service in db.query(SocialService).filter(SocialService.is_active == True).yield_per(500):
+            document = service_document(service)
+            content_hash = hashlib.sha256(document.encode("utf-8")).hexdigest()
+            if force or existing.get(service.id) != content_hash:
+                pending.append((service.id, document, content_hash))
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            vectors = backend.embed_documents([document for _, document, _ in batch])
+            for (service_id, _, content_hash), vector in zip(batch, vectors):
+                db.merge(ServiceEmbedding(
+                    service_id=service_id,
+                    model=backend.name,
+                    content_hash=content_hash,
+                    embedding=list(vector),
+                    updated_at=datetime.utcnow()
+                ))
+            db.commit()
+
+        _matrix_cache.invalidate()
+        logger.info(f"Embedded {len(pending)} services with {backend.name}")
+        return len(pending)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error embedding services: {e}")
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+class _EmbeddingMatrix:
+    """
+    Normalized embedding matrix held in memory for databases without pgvector.
+    Reloaded after embed_services runs or when MATRIX_TTL_SECONDS elapse.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._loaded_at = 0.0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def invalidate(self):
+        with self._lock:
+            self._key = None
+
+    def get(self, db: Session, model: str) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._key == model and time.monotonic() - self._loaded_at < MATRIX_TTL_SECONDS:
+                return self._ids, self._matrix
+
+            rows = (
+                db.query(ServiceEmbedding.service_id, ServiceEmbedding.embedding)
+                .filter(ServiceEmbedding.model == model)
+                .all()
+            )
+            if rows:
+                ids = np.array([row[0] for row in rows], dtype=np.int64)
+                matrix = np.array([row[1] for row in rows], dtype=np.float32).reshape(len(rows), -1)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix /= np.where(norms == 0, 1, norms)
+            else:
+                # Nothing embedded for this model yet (e.g. a fresh deploy)
+                ids = np.empty(0, dtype=np.int64)
+                matrix = np.empty((0, settings.EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+            self._ids, self._matrix = ids, matrix
+            self._key = model
+            self._loaded_at = time.monotonic()
+            return ids, matrix
+
+
+_matrix_cache = _EmbeddingMatrix()
+
+
+def semantic_search(
+    db: Session,
+    query: Query,
+    text: str,
+    limit: int = 5,
+    backend: Optional[EmbeddingBackend] = None
+) -> List[Tuple[SocialService, float]]:
+    """
+    Rank services by semantic similarity to free text.
+
+    Uses the pgvector HNSW index on PostgreSQL and a vectorized in-memory
+    scan elsewhere.
+
+    Args:
+        db: Database session
+        query: A SocialService query with the caller's filters applied
+        text: Natural-language description of the need
+        limit: Maximum number of services to return
+        backend: Embedding backend (defaults to the configured one)
+
+    Returns:
+        (service, similarity) pairs, most similar first
+    """
+    backend = backend or get_embedding_backend()
+    vector = backend.embed_query(text)
+
+    if Vector is not None and isinstance(ServiceEmbedding.__table__.c.embedding.type, Vector):
+        distance = ServiceEmbedding.embedding.cosine_distance(vector).label("distance")
+        rows = (
+            query.join(ServiceEmbedding, ServiceEmbedding.service_id == SocialService.id)
+            .filter(ServiceEmbedding.model == backend.name)
+            .add_columns(distance)
+            .order_by(distance)
+            .limit(limit)
+            .all()
+        )
+        return [(service, 1.0 - float(cosine_distance)) for service, cosine_distance in rows]
+
+    ids, matrix = _matrix_cache.get(db, backend.name)
+    if not len(ids):
+        return []
+
+    query_vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(query_vector)
+    if norm > 0:
+        query_vector /= norm
+
+    scores = matrix @ query_vector
+
+    # Rank a shortlist first; fall back to the full ranking only if the
+    # caller's filters reject too many of the shortlisted services
+    shortlist = min(len(ids), max(limit * 20, 200))
+    top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    matches = services_for_hits(query, list(zip(ids[top].tolist(), scores[top].tolist())), limit=limit)
+    if len(matches) < limit and shortlist < len(ids):
+        order = np.argsort(-scores, kind="stable")
+        matches = services_for_hits(query, list(zip(ids[order].tolist(), scores[order].tolist())), limit=limit)
+    return matches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    embed_services()
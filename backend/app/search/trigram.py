@@ -0,0 +1,271 @@
+"""
+Typo-tolerant trigram search over service names and place names
+Names are split into padded character trigrams (as in pg_trgm), so
+"Secundrabad" still shares most trigrams with "Secunderabad". Candidates come
+only from the rarest query trigrams, which bounds the work per lookup
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import Counter
+from sqlalchemy.orm import Session
+from app.db.models import SocialService
+from app.db.database import SessionLocal
+import itertools
+import math
+import re
+import threading
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+SERVICE = "service"
+PLACE = "place"
+
+# Share of the query's trigrams an entry must contain to match
+DEFAULT_THRESHOLD = 0.5
+
+# Entries scored per lookup; queries made only of very common trigrams
+# (stopword-like fragments) are scored on a sample of this size
+MAX_CANDIDATES = 5000
+
+# (kind, key): key is the service ID for services and the display name for places
+Entry = Tuple[str, Any]
+
+
+def normalize(value: str) -> str:
+    """Lowercase, strip accents and keep only letters, digits and single spaces"""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[^\W_]+", stripped))
+
+
+def trigrams(value: str) -> Set[str]:
+    """Padded trigrams of each word in value"""
+    grams = set()
+    for word in normalize(value).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def place_names(address: Optional[str]) -> List[str]:
+    """Locality, city and region parts of an address (the street is skipped)"""
+    if not address:
+        return []
+    parts = address.split(",")
+    # The first part is a street unless it has no house number
+    if len(parts) > 1 and re.search(r"\d", parts[0]):
+        parts = parts[1:]
+    names = []
+    for part in parts:
+        name = " ".join(re.sub(r"\d+", " ", part).split())
+        if len(name) > 1:
+            names.append(name)
+    return names
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams to active service names and place names.
+
+    Services and places have separate postings. A match must contain at
+    least threshold of the query's trigrams; by the pigeonhole principle
+    such an entry appears in the postings of one of the (n - required + 1)
+    rarest query trigrams, so only those postings are scanned for
+    candidates (at most MAX_CANDIDATES) and the common trigrams are only
+    probed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[str, Set[int]]] = {SERVICE: {}, PLACE: {}}
+        self._entries: Dict[int, Entry] = {}
+        self._entry_ids: Dict[Entry, int] = {}
+        self._entry_grams: Dict[int, Set[str]] = {}
+        self._place_counts: Counter = Counter()
+        self._place_services: Dict[str, Set[int]] = {}
+        self._service_places: Dict[int, List[str]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    @property
+    def trigram_count(self) -> int:
+        return sum(len(postings) for postings in self._postings.values())
+
+    def build(self, db: Optional[Session] = None):
+        """
+        (Re)build the index from all active services.
+
+        Args:
+            db: Optional session to read from; a new one is opened if omitted
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            rows = (
+                db.query(SocialService.id, SocialService.name, SocialService.address)
+                .filter(SocialService.is_active == True)
+                .all()
+            )
+            with self._lock:
+                self._reset()
+                for service_id, name, address in rows:
+                    self._add_service(service_id, name, address)
+                self._built = True
+            logger.info(f"Trigram index built with {len(self._entries)} names and {self.trigram_count} trigrams")
+        finally:
+            if own_session:
+                db.close()
+
+    def ensure_built(self):
+        """Build the index lazily when used outside the app lifespan (e.g. scripts)"""
+        if not self._built:
+            self.build()
+
+    def upsert(self, service: SocialService):
+        """Index a service's current name and places; inactive services are removed"""
+        with self._lock:
+            self._remove_service(service.id)
+            if service.is_active:
+                self._add_service(service.id, service.name, service.address)
+
+    def remove(self, service_id: int):
+        """Remove a service and release its place names"""
+        with self._lock:
+            self._remove_service(service_id)
+
+    def _add_entry(self, entry: Entry, text: str):
+        grams = trigrams(text)
+        if not grams:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        self._entry_ids[entry] = entry_id
+        self._entry_grams[entry_id] = grams
+        postings = self._postings[entry[0]]
+        for gram in grams:
+            postings.setdefault(gram, set()).add(entry_id)
+
+    def _remove_entry(self, entry: Entry):
+        entry_id = self._entry_ids.pop(entry, None)
+        if entry_id is None:
+            return
+        del self._entries[entry_id]
+        postings = self._postings[entry[0]]
+        for gram in self._entry_grams.pop(entry_id):
+            entry_ids = postings[gram]
+            entry_ids.discard(entry_id)
+            if not entry_ids:
+                del postings[gram]
+
+    def _add_service(self, service_id: int, name: Optional[str], address: Optional[str]):
+        if name:
+            self._add_entry((SERVICE, service_id), name)
+        places = place_names(address)
+        self._service_places[service_id] = places
+        for place in places:
+            self._place_counts[place] += 1
+            self._place_services.setdefault(place, set()).add(service_id)
+            if self._place_counts[place] == 1:
+                self._add_entry((PLACE, place), place)
+
+    def _remove_service(self, service_id: int):
+        self._remove_entry((SERVICE, service_id))
+        for place in self._service_places.pop(service_id, []):
+            self._place_counts[place] -= 1
+            self._place_services[place].discard(service_id)
+            if self._place_counts[place] <= 0:
+                del self._place_counts[place]
+                del self._place_services[place]
+                self._remove_entry((PLACE, place))
+
+    def search(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        limit: int = 10,
+        threshold: float = DEFAULT_THRESHOLD
+    ) -> List[Dict[str, Any]]:
+        """
+        Find names resembling a possibly misspelled query.
+
+        Args:
+            query: Name or place as the user typed it
+            kind: Only return SERVICE or PLACE entries
+            limit: Maximum number of matches
+            threshold: Minimum share of the query's trigrams a match must contain
+
+        Returns:
+            Matches best first, each with type, id or name, and score (0-1)
+        """
+        self.ensure_built()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        required = max(1, math.ceil(threshold * len(query_grams)))
+
+        with self._lock:
+            scored = []
+            for postings_by_gram in ([self._postings[kind]] if kind else self._postings.values()):
+                postings = sorted(
+                    (postings_by_gram.get(gram, set()) for gram in query_grams),
+                    key=len
+                )
+                candidates: Set[int] = set()
+                for posting in postings[:len(postings) - required + 1]:
+                    room = MAX_CANDIDATES - len(candidates)
+                    if len(posting) > room:
+                        candidates.update(itertools.islice(posting, room))
+                        break
+                    candidates |= posting
+
+                for entry_id in candidates:
+                    shared = sum(1 for posting in postings if entry_id in posting)
+                    if shared < required:
+                        continue
+                    coverage = shared / len(query_grams)
+                    similarity = shared / (len(query_grams) + len(self._entry_grams[entry_id]) - shared)
+                    scored.append((coverage, similarity, self._entries[entry_id]))
+
+            scored.sort(key=lambda match: (match[0], match[1]), reverse=True)
+            results = []
+            for coverage, similarity, (entry_kind, key) in scored[:limit]:
+                result = {"type": entry_kind, "score": round((coverage + similarity) / 2, 3)}
+                if entry_kind == SERVICE:
+                    result["id"] = key
+                else:
+                    result["name"] = key
+                    result["service_count"] = self._place_counts[key]
+                results.append(result)
+            return results
+
+    def place_services(self, name: str) -> Set[int]:
+        """IDs of the active services whose address mentions a place (exact display name)"""
+        self.ensure_built()
+        with self._lock:
+            return set(self._place_services.get(name, ()))
+
+
+# Global index instance
+_trigram_index_instance = None
+
+
+def get_trigram_index() -> TrigramIndex:
+    """Get or create the global trigram index"""
+    global _trigram_index_instance
+    if _trigram_index_instance is None:
+        _trigram_index_instance = TrigramIndex()
+    return _trigram_index_instance